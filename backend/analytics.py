@@ -0,0 +1,225 @@
+"""
+Consumption analytics backed by daily rollup tables.
+
+Every quantity change adds its consumed (decrease) or restocked (increase)
+amount to two rollups in the same transaction:
+
+- ``item_consumption_daily``: one row per (item, UTC day)
+- ``category_consumption_daily``: one row per (category, UTC day)
+
+Each write is one UPSERT per table, and a range query is a single
+``GROUP BY`` over the primary key or day index, whatever the size of the
+per-item JSON histories. Weekly and monthly series are summed from the
+daily rows in SQL.
+
+Changes count towards the category the item had when they happened.
+A deleted item's rows go, its categories keep their totals. Databases that predate the rollups are filled once from the stored
+histories (``backfill``), daily/weekly history aggregates included.
+"""
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from . import models
+from .usage_tracker import UsageTracker, parse_record_date
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = ("day", "week", "month")
+GROUP_BY = ("category", "item", "total")
+
+# Rollup key for items without a category
+NO_CATEGORY = 0
+
+# Longest range one request may cover
+MAX_RANGE_DAYS = 3 * 366
+
+usage_tracker = UsageTracker()
+
+
+def _upsert(db: Session, table, keys: dict, consumed: float, restocked: float, changes: int, **extra):
+    stmt = sqlite_insert(table).values(
+        **keys, **extra, consumed=consumed, restocked=restocked, changes=changes
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={
+            "consumed": table.consumed + consumed,
+            "restocked": table.restocked + restocked,
+            "changes": table.changes + changes,
+            **extra,
+        }
+    )
+    db.execute(stmt)
+
+
+def add_totals(
+    db: Session,
+    item_id: int,
+    category_id: Optional[int],
+    day: date,
+    consumed: float,
+    restocked: float,
+    changes: int = 1
+):
+    """Add to the item's and its category's rollups for ``day``. The caller commits."""
+    _upsert(
+        db, models.ItemConsumptionDaily, {"item_id": item_id, "day": day},
+        consumed, restocked, changes, category_id=category_id
+    )
+    _upsert(
+        db, models.CategoryConsumptionDaily,
+        {"category_id": category_id if category_id is not None else NO_CATEGORY, "day": day},
+        consumed, restocked, changes
+    )
+
+
+def record_change(db: Session, item_id: int, category_id: Optional[int], change: float, when: Optional[datetime] = None):
+    """Roll up one quantity change (new minus old quantity). The caller commits."""
+    if not change:
+        return
+    day = (when or datetime.utcnow()).date()
+    add_totals(db, item_id, category_id, day, max(0.0, -change), max(0.0, change))
+
+
+def daily_totals(records: Iterable[Dict]) -> Dict[date, List[float]]:
+    """
+    {day: [consumed, restocked, changes]} for history records. Aggregates
+    count on their first day (``start``). Undated records are skipped.
+    """
+    totals: Dict[date, List[float]] = defaultdict(lambda: [0.0, 0.0, 0])
+    for record in records:
+        if "period" in record:
+            day = parse_record_date(record.get("start"))
+            consumed, restocked = record.get("consumed") or 0.0, record.get("restocked") or 0.0
+            count = record.get("count") or 1
+        else:
+            day = parse_record_date(record.get("date"))
+            change = record.get("change") or 0.0
+            consumed, restocked, count = max(0.0, -change), max(0.0, change), 1
+        if day is None or not (consumed or restocked):
+            continue
+        entry = totals[day.date()]
+        entry[0] += consumed
+        entry[1] += restocked
+        entry[2] += count
+    return totals
+
+
+def record_history(db: Session, item_id: int, category_id: Optional[int], records: Iterable[Dict]):
+    """Roll up already-dated history records (imports, backfill). The caller commits."""
+    for day, (consumed, restocked, changes) in daily_totals(records).items():
+        add_totals(db, item_id, category_id, day, consumed, restocked, changes)
+
+
+def forget_item(db: Session, item_id: int, from_categories: bool = True):
+    """
+    Delete an item's rollups, and subtract them from its categories' rollups
+    if ``from_categories`` (its history is being replaced, not deleted with
+    the item). The caller commits.
+    """
+    table = models.ItemConsumptionDaily
+    if from_categories:
+        rows = db.execute(
+            select(table.category_id, table.day, table.consumed, table.restocked, table.changes)
+            .where(table.item_id == item_id)
+        ).all()
+        for category_id, day, consumed, restocked, changes in rows:
+            _upsert(
+                db, models.CategoryConsumptionDaily,
+                {"category_id": category_id if category_id is not None else NO_CATEGORY, "day": day},
+                -consumed, -restocked, -changes
+            )
+    db.execute(delete(table).where(table.item_id == item_id))
+
+
+def backfill(db: Session) -> int:
+    """
+    Fill empty rollups from the stored histories. Returns the number of
+    items rolled up (0 if the rollups already had data). The caller commits.
+    """
+    if db.scalar(select(models.CategoryConsumptionDaily.day).limit(1)) is not None:
+        return 0
+    rows = db.execute(
+        select(models.Item.id, models.Item.category_id, models.Item.quantity_history)
+        .where(models.Item.quantity_history.isnot(None))
+    )
+    count = 0
+    for item_id, category_id, history in rows:
+        record_history(db, item_id, category_id, usage_tracker.get_history_as_list(history))
+        count += 1
+    if count:
+        logger.info(f"Rolled up consumption history of {count} items")
+    return count
+
+
+def _period(column, granularity: str):
+    """SQL expression for the first day of the period containing ``column``."""
+    if granularity == "week":
+        return func.date(column, "weekday 0", "-6 days")  # Monday
+    if granularity == "month":
+        return func.strftime("%Y-%m-01", column)
+    return func.date(column)
+
+
+def consumption(
+    db: Session,
+    start: date,
+    end: date,
+    granularity: str = "day",
+    group_by: str = "category",
+    category_id: Optional[int] = None,
+    item_id: Optional[int] = None
+) -> List[dict]:
+    """
+    Consumed and restocked quantity per period in [start, end], one row per
+    (group, period) that had changes, ordered by group then period.
+
+    Args:
+        granularity: 'day', 'week' (starting Monday) or 'month'
+        group_by: 'category', 'item' or 'total'
+        category_id: Only this category
+        item_id: Only this item (implies per-item rows)
+    """
+    if item_id is not None:
+        group_by = "item"
+    if group_by == "item":
+        table = models.ItemConsumptionDaily
+        key = table.item_id
+    else:
+        table = models.CategoryConsumptionDaily
+        key = table.category_id
+
+    period = _period(table.day, granularity).label("period")
+    columns = [period, func.sum(table.consumed), func.sum(table.restocked)]
+    group = [period]
+    if group_by != "total":
+        columns.insert(0, key)
+        group.insert(0, key)
+    stmt = select(*columns).where(table.day >= start, table.day <= end)
+    if category_id is not None:
+        stmt = stmt.where(table.category_id == category_id)
+    if item_id is not None:
+        stmt = stmt.where(table.item_id == item_id)
+    stmt = stmt.group_by(*group).order_by(*group)
+
+    rows = []
+    for row in db.execute(stmt):
+        *keys, period_start, consumed, restocked = row
+        point = {"period": period_start, "consumed": round(consumed, 6), "restocked": round(restocked, 6)}
+        if keys:
+            point[f"{group_by}_id"] = keys[0]
+        rows.append(point)
+    return rows
+
+
+def default_range(start: Optional[date], end: Optional[date], days: int = 30) -> Tuple[date, date]:
+    """Fill in a missing bound: the last ``days`` days up to today (UTC)."""
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=days - 1)
+    return start, end
@@ -1,6 +1,6 @@
 from datetime import datetime, timedelta
 from typing import Optional
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 import bcrypt
@@ -15,6 +15,10 @@ SECRET_KEY = os.environ.get("SECRET_KEY", "your-secret-key-please-change-it")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 1 week
 
+def get_secret_key() -> str:
+    # Read at call time so a .env loaded by create_app() is honoured
+    return os.environ.get("SECRET_KEY", SECRET_KEY)
+
 # Password Hashing
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
@@ -61,7 +65,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, get_secret_key(), algorithm=ALGORITHM)
     return encoded_jwt
 
 async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
@@ -71,7 +75,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, get_secret_key(), algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
@@ -85,3 +89,25 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     
     return user
 
+def username_from_token(token: str) -> Optional[str]:
+    """Username in a valid token, or None. No database lookup."""
+    try:
+        payload = jwt.decode(token, get_secret_key(), algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    return payload.get("sub")
+
+def username_from_scope(scope) -> Optional[str]:
+    """Username in an ASGI request's bearer token, or None (for middleware)."""
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                return username_from_token(token.strip())
+    return None
+
+async def get_current_admin(request: Request, current_user: User = Depends(get_current_user)):
+    """Current user, if listed in the ``admin_usernames`` setting (403 otherwise)."""
+    if current_user.username not in request.app.state.settings.admin_usernames:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin only")
+    return current_user
@@ -0,0 +1,341 @@
+"""
+Backtest usage-prediction strategies on recorded quantity histories.
+
+Each item's history is replayed: at every check (from the ``min_points``-th
+on) a strategy sees only the records up to that point and predicts a daily
+usage rate. The predicted depletion is ``quantity / rate`` days later. The
+actual depletion is when the consumption recorded after that point (restocks
+ignored) adds up to the quantity on hand. Points whose stock had not run
+out by the end of the history cannot be scored and are skipped.
+
+Per strategy the report gives the number of scored points, coverage (the
+share of them the strategy made a prediction for), absolute error, RMSE
+and bias of the depletion date in days, the share within 3 days, and the
+time spent predicting.
+
+Items are read from the database (or generated with ``--synthetic``) and
+replayed in parallel on a process pool, one batch of items per task.
+
+Usage:
+    python -m backend.backtest [--strategies ml segmented user_rate average] [--workers 4]
+    python -m backend.backtest --synthetic 500 --months 6
+"""
+import argparse
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterator, List, Optional
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from . import database, models
+from .ml_predictor import MIN_DATA_POINTS, MLPredictor, SegmentedPredictor, calculate_daily_usage
+from .usage_tracker import UsageTracker, consumed_in, parse_record_date
+
+DEFAULT_BATCH_SIZE = 50
+
+# Absolute error counted as a hit
+HIT_DAYS = 3.0
+
+_tracker = UsageTracker()
+# Per-process predictors, created on first use
+_predictors: Dict[str, MLPredictor] = {}
+
+
+def _rate(predictor: type, history: List[Dict]) -> Optional[float]:
+    instance = _predictors.get(predictor.__name__)
+    if instance is None:
+        instance = _predictors[predictor.__name__] = predictor()
+    return instance.predict_usage_rate(history)
+
+
+def _user_rate(item: Dict) -> Optional[float]:
+    if item.get("usage_rate") is None:
+        return None
+    return calculate_daily_usage(item["usage_rate"], item.get("usage_period") or "daily")
+
+
+def ml_strategy(history: List[Dict], item: Dict) -> Optional[float]:
+    """What the app stores with ML_PREDICTOR=linear: the ML rate, else the user's rate."""
+    rate = _rate(MLPredictor, history)
+    return rate if rate is not None else _user_rate(item)
+
+
+def ml_only_strategy(history: List[Dict], item: Dict) -> Optional[float]:
+    return _rate(MLPredictor, history)
+
+
+def segmented_strategy(history: List[Dict], item: Dict) -> Optional[float]:
+    """What the app stores with ML_PREDICTOR=segmented."""
+    rate = _rate(SegmentedPredictor, history)
+    return rate if rate is not None else _user_rate(item)
+
+
+def segmented_only_strategy(history: List[Dict], item: Dict) -> Optional[float]:
+    return _rate(SegmentedPredictor, history)
+
+
+def user_rate_strategy(history: List[Dict], item: Dict) -> Optional[float]:
+    return _user_rate(item)
+
+
+def average_strategy(history: List[Dict], item: Dict) -> Optional[float]:
+    """Total consumption over the time covered (UsageTracker.calculate_average_usage)."""
+    if len(history) < 2:
+        return None
+    first = parse_record_date(history[0].get("start") or history[0].get("date"))
+    last = parse_record_date(history[-1].get("date"))
+    if first is None or last is None or last <= first:
+        return None
+    return sum(consumed_in(r) for r in history[1:]) / ((last - first).total_seconds() / 86400)
+
+
+# Strategy name -> fn(history so far, item fields) -> daily rate or None
+STRATEGIES: Dict[str, Callable[[List[Dict], Dict], Optional[float]]] = {
+    "ml": ml_strategy,
+    "ml_only": ml_only_strategy,
+    "segmented": segmented_strategy,
+    "segmented_only": segmented_only_strategy,
+    "user_rate": user_rate_strategy,
+    "average": average_strategy,
+}
+
+
+def actual_depletion_days(times: List[float], consumed: List[float], index: int, quantity: float) -> Optional[float]:
+    """
+    Days after ``times[index]`` until the consumption recorded after it adds
+    up to ``quantity``, interpolating within the record that crosses it.
+    None if the history ends first.
+
+    Args:
+        times: Record times in days, ascending
+        consumed: Quantity consumed in each record
+    """
+    if quantity <= 0:
+        return 0.0
+    total = 0.0
+    for j in range(index + 1, len(times)):
+        if consumed[j] <= 0:
+            continue
+        if total + consumed[j] >= quantity:
+            # Consumption is spread evenly over the interval the record closes
+            fraction = (quantity - total) / consumed[j]
+            return times[j - 1] - times[index] + fraction * (times[j] - times[j - 1])
+        total += consumed[j]
+    return None
+
+
+def replay_item(item: Dict, strategies: List[str], min_points: int = MIN_DATA_POINTS, step: int = 1) -> Dict:
+    """
+    Replay one item. Returns {strategy: {"errors": [...], "missed": n, "seconds": s}}
+    where errors are predicted minus actual depletion in days.
+    """
+    history = [r for r in item["history"] if parse_record_date(r.get("date")) is not None]
+    if history:
+        origin = parse_record_date(history[0]["date"])
+        times = [(parse_record_date(r["date"]) - origin).total_seconds() / 86400 for r in history]
+    else:
+        times = []
+    consumed = [consumed_in(r) for r in history]
+    results = {name: {"errors": [], "missed": 0, "seconds": 0.0} for name in strategies}
+
+    for index in range(max(0, min_points - 1), len(history), step):
+        quantity = history[index].get("quantity")
+        if quantity is None:
+            continue
+        actual = actual_depletion_days(times, consumed, index, quantity)
+        if actual is None:
+            continue  # Not depleted within the recorded history
+        prefix = history[:index + 1]
+        for name in strategies:
+            started = time.perf_counter()
+            rate = STRATEGIES[name](prefix, item)
+            result = results[name]
+            result["seconds"] += time.perf_counter() - started
+            if not rate or rate <= 0:
+                result["missed"] += 1
+            else:
+                result["errors"].append(quantity / rate - actual)
+    return results
+
+
+def replay_batch(args: tuple) -> Dict:
+    """Replay a batch of items and merge their results. Runs inside a worker process."""
+    items, strategies, min_points, step = args
+    merged = {name: {"errors": [], "missed": 0, "seconds": 0.0} for name in strategies}
+    for item in items:
+        for name, result in replay_item(item, strategies, min_points, step).items():
+            merged[name]["errors"].extend(result["errors"])
+            merged[name]["missed"] += result["missed"]
+            merged[name]["seconds"] += result["seconds"]
+    return merged
+
+
+def summarize(result: Dict) -> Dict:
+    errors = result["errors"]
+    scored = len(errors) + result["missed"]
+    predictions = len(errors)
+    summary = {
+        "points": scored,
+        "coverage": round(predictions / scored, 4) if scored else 0.0,
+        "mae_days": None,
+        "median_abs_days": None,
+        "rmse_days": None,
+        "bias_days": None,
+        "within_3d": None,
+        "runtime_s": round(result["seconds"], 4),
+        "us_per_prediction": round(result["seconds"] / scored * 1e6, 1) if scored else None,
+    }
+    if errors:
+        absolute = [abs(e) for e in errors]
+        summary.update({
+            "mae_days": round(statistics.fmean(absolute), 3),
+            "median_abs_days": round(statistics.median(absolute), 3),
+            "rmse_days": round(math.sqrt(statistics.fmean(e * e for e in errors)), 3),
+            "bias_days": round(statistics.fmean(errors), 3),
+            "within_3d": round(sum(a <= HIT_DAYS for a in absolute) / len(errors), 4),
+        })
+    return summary
+
+
+def iter_batches(items: List[Dict], batch_size: int) -> Iterator[List[Dict]]:
+    for i in range(0, len(items), batch_size):
+        yield items[i:i + batch_size]
+
+
+def backtest(
+    items: List[Dict],
+    strategies: Optional[List[str]] = None,
+    workers: Optional[int] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    min_points: int = MIN_DATA_POINTS,
+    step: int = 1
+) -> Dict:
+    """
+    Replay ``items`` (dicts with history, usage_rate, usage_period) with each
+    strategy on ``workers`` processes (0 runs in this process).
+
+    Returns:
+        {"items", "elapsed_s", "strategies": {name: summary}}
+    """
+    strategies = list(strategies or STRATEGIES)
+    unknown = [name for name in strategies if name not in STRATEGIES]
+    if unknown:
+        raise ValueError(f"Unknown strategies: {', '.join(unknown)}")
+
+    started = time.perf_counter()
+    merged = {name: {"errors": [], "missed": 0, "seconds": 0.0} for name in strategies}
+    tasks = [(batch, strategies, min_points, step) for batch in iter_batches(items, batch_size)]
+    if workers == 0:
+        results = map(replay_batch, tasks)
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        results = pool.map(replay_batch, tasks)
+    try:
+        for result in results:
+            for name in strategies:
+                merged[name]["errors"].extend(result[name]["errors"])
+                merged[name]["missed"] += result[name]["missed"]
+                merged[name]["seconds"] += result[name]["seconds"]
+    finally:
+        if workers != 0:
+            pool.shutdown()
+
+    return {
+        "items": len(items),
+        "elapsed_s": round(time.perf_counter() - started, 3),
+        "strategies": {name: summarize(merged[name]) for name in strategies},
+    }
+
+
+def load_items(session_factory=None) -> List[Dict]:
+    """Items with a history, as plain dicts, in id order."""
+    session_factory = session_factory or database.SessionLocal
+    stmt = (
+        select(models.Item.id, models.Item.quantity_history, models.Item.usage_rate, models.Item.usage_period)
+        .where(models.Item.quantity_history.isnot(None))
+        .order_by(models.Item.id)
+    )
+    with session_factory() as db:
+        return [
+            {
+                "id": item_id,
+                "history": _tracker.get_history_as_list(history),
+                "usage_rate": usage_rate,
+                "usage_period": usage_period,
+            }
+            for item_id, history, usage_rate, usage_period in db.execute(stmt)
+        ]
+
+
+def synthetic_items(count: int, months: int = 6, seed: int = 0) -> List[Dict]:
+    """
+    Histories from the load-test generator. Each item gets a user rate off
+    by up to 50% from its real average, like a rough guess.
+    """
+    from .benchmarks.load_test import make_history
+
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    items = []
+    for i in range(count):
+        history = make_history(rng, start, 30 * months, float(rng.choice((1, 2, 3, 5))))
+        actual = average_strategy(history, {})
+        items.append({
+            "id": i + 1,
+            "history": history,
+            "usage_rate": round(actual * rng.uniform(0.5, 1.5), 3) if actual else None,
+            "usage_period": "daily",
+        })
+    return items
+
+
+def _print_table(report: Dict):
+    columns = ("points", "coverage", "mae_days", "median_abs_days", "rmse_days", "bias_days", "within_3d", "runtime_s")
+    print(f"{'strategy':<16}" + "".join(f"{c:>16}" for c in columns))
+    for name, summary in report["strategies"].items():
+        cells = "".join(f"{'-' if summary[c] is None else summary[c]:>16}" for c in columns)
+        print(f"{name:<16}{cells}")
+    print(f"{report['items']} items in {report['elapsed_s']} s")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Backtest usage-prediction strategies on recorded histories")
+    parser.add_argument("--database-url", help="Defaults to the app database")
+    parser.add_argument("--synthetic", type=int, metavar="ITEMS", help="Generate this many items instead")
+    parser.add_argument("--months", type=int, default=6, help="History length of synthetic items")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--strategies", nargs="+", choices=list(STRATEGIES), default=list(STRATEGIES))
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (0 = in process)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Items per task")
+    parser.add_argument("--min-points", type=int, default=MIN_DATA_POINTS, help="Records before the first prediction")
+    parser.add_argument("--step", type=int, default=1, help="Predict at every n-th record")
+    parser.add_argument("--output", help="Also write the report to a JSON file")
+    args = parser.parse_args(argv)
+
+    if args.synthetic:
+        items = synthetic_items(args.synthetic, args.months, args.seed)
+    else:
+        engine = create_engine(args.database_url) if args.database_url else database.engine
+        items = load_items(sessionmaker(autocommit=False, autoflush=False, bind=engine))
+
+    report = backtest(items, args.strategies, args.workers, args.batch_size, args.min_points, args.step)
+    _print_table(report)
+    if args.output:
+        directory = os.path.dirname(args.output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
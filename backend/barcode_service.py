@@ -4,6 +4,7 @@ Identifies products from images and suggests category, name, and unit.
 """
 import os
 import base64
+import time
 from typing import Optional
 from io import BytesIO
 
@@ -14,6 +15,7 @@ try:
 except ImportError:
     GEMINI_AVAILABLE = False
 
+from . import metrics, tracing
 from .schemas import BarcodeIdentifyResponse
 
 
@@ -34,6 +36,7 @@ class BarcodeService:
         # Use gemini-2.5-flash for multimodal (image) support
         self.model = genai.GenerativeModel('gemini-2.5-flash')
     
+    @tracing.traced(kind=tracing.SPAN_KIND_CLIENT)
     async def identify_product(self, image_base64: str) -> BarcodeIdentifyResponse:
         """
         Identify a product from its image using Gemini AI.
@@ -74,7 +77,14 @@ Se não conseguir identificar o produto, responda:
 }"""
             
             # Call Gemini API
-            response = self.model.generate_content([prompt, image])
+            start = time.perf_counter()
+            try:
+                response = self.model.generate_content([prompt, image])
+            except Exception:
+                metrics.GEMINI_CALLS.inc("error")
+                raise
+            finally:
+                metrics.GEMINI_DURATION.observe(time.perf_counter() - start)
             
             # Parse response
             response_text = response.text.strip()
@@ -91,6 +101,7 @@ Se não conseguir identificar o produto, responda:
                 data = json.loads(response_text)
                 
                 if data.get("product_name"):
+                    metrics.GEMINI_CALLS.inc("identified")
                     return BarcodeIdentifyResponse(
                         success=True,
                         product_name=data.get("product_name"),
@@ -99,12 +110,14 @@ Se não conseguir identificar o produto, responda:
                         barcode=data.get("barcode")
                     )
                 else:
+                    metrics.GEMINI_CALLS.inc("not_identified")
                     return BarcodeIdentifyResponse(
                         success=False,
                         error="Não foi possível identificar o produto na imagem"
                     )
             
             except json.JSONDecodeError:
+                metrics.GEMINI_CALLS.inc("invalid_response")
                 return BarcodeIdentifyResponse(
                     success=False,
                     error=f"Erro ao processar resposta: {response_text[:100]}"
@@ -0,0 +1,103 @@
+"""
+Barcode normalization and indexed lookup.
+
+Scanners, spreadsheets and the Gemini scanner report the same product code
+in different shapes ("7 891000 100103", "0789100010010-3", UPC-A vs
+EAN-13). Items store the raw ``barcode`` as entered plus a normalized
+``barcode_normalized`` key with a unique index, which is what lookups use.
+"""
+import logging
+import re
+from typing import Optional
+
+from sqlalchemy import event, inspect, text
+from sqlalchemy.orm import Session
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+UNIQUE_INDEX = "ix_items_barcode_normalized"
+
+_SEPARATORS = re.compile(r"[\s\-.]")
+_GTIN_LENGTHS = (8, 12, 13, 14)
+
+
+def normalize_barcode(code: Optional[str]) -> Optional[str]:
+    """
+    Canonical lookup key for a barcode.
+
+    Numeric GTINs (EAN-8, UPC-A, EAN-13, GTIN-14) are zero-padded to 14
+    digits, so a UPC-A and its EAN-13 form share a key. Other symbologies
+    (Code 128, QR payloads...) are upper-cased with separators removed.
+
+    Returns:
+        The key, or None for empty input
+    """
+    if code is None:
+        return None
+    compact = _SEPARATORS.sub("", str(code)).upper()
+    if not compact:
+        return None
+    if compact.isdigit() and len(compact) in _GTIN_LENGTHS:
+        return compact.zfill(14)
+    return compact
+
+
+@event.listens_for(models.Item, "before_insert")
+def _normalize_new_barcode(mapper, connection, target):
+    target.barcode_normalized = normalize_barcode(target.barcode)
+
+
+@event.listens_for(models.Item, "before_update")
+def _maintain_normalized_barcode(mapper, connection, target):
+    # Only when the barcode itself changed: legacy duplicates left NULL by
+    # backfill_normalized_barcodes must survive unrelated updates
+    if inspect(target).attrs.barcode.history.has_changes():
+        target.barcode_normalized = normalize_barcode(target.barcode)
+
+
+def find_item_by_barcode(db: Session, code: Optional[str]) -> Optional[models.Item]:
+    """Single indexed lookup on the normalized barcode."""
+    key = normalize_barcode(code)
+    if key is None:
+        return None
+    return db.query(models.Item).filter(models.Item.barcode_normalized == key).first()
+
+
+def backfill_normalized_barcodes(db: Session) -> int:
+    """
+    Fill ``barcode_normalized`` on databases created before the column
+    existed, then create its unique index.
+
+    When several items share a barcode the oldest keeps the key; the others
+    are left unindexed (and logged) so the index can be created.
+
+    Returns:
+        Number of items updated
+    """
+    pending = db.query(models.Item.id, models.Item.barcode).filter(
+        models.Item.barcode.isnot(None),
+        models.Item.barcode_normalized.is_(None)
+    ).order_by(models.Item.id).all()
+
+    taken = {key for (key,) in db.query(models.Item.barcode_normalized).filter(
+        models.Item.barcode_normalized.isnot(None)
+    )}
+    updated = 0
+    for item_id, barcode in pending:
+        key = normalize_barcode(barcode)
+        if key is None:
+            continue
+        if key in taken:
+            logger.warning("Item %s shares barcode %s with another item; not indexed", item_id, barcode)
+            continue
+        taken.add(key)
+        db.query(models.Item).filter(models.Item.id == item_id).update(
+            {models.Item.barcode_normalized: key}, synchronize_session=False
+        )
+        updated += 1
+
+    # ALTER TABLE ADD COLUMN doesn't create the index declared on the model
+    db.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS {UNIQUE_INDEX} ON items (barcode_normalized)"))
+    return updated
@@ -0,0 +1,102 @@
+"""
+Cold-start benchmark for the AInventory backend.
+
+Each run starts a fresh interpreter and measures:
+- import_s: time to ``import backend.main``
+- startup_s: time for the lifespan handler (schema + seed)
+- first_request_s: time for the first login + ``GET /items``
+
+Usage:
+    python -m backend.benchmarks.cold_start --runs 5 --output data/cold_start.jsonl
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Runs inside the child interpreter; prints one JSON object
+CHILD_SCRIPT = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import backend.main as main
+t1 = time.perf_counter()
+from fastapi.testclient import TestClient
+client = TestClient(main.app)
+t2 = time.perf_counter()
+client.__enter__()
+t3 = time.perf_counter()
+token = client.post("/token", data={"username": "admin", "password": "admin"}).json()["access_token"]
+response = client.get("/items", headers={"Authorization": f"Bearer {token}"})
+t4 = time.perf_counter()
+client.__exit__(None, None, None)
+print(json.dumps({
+    "import_s": t1 - t0,
+    "startup_s": t3 - t2,
+    "first_request_s": t4 - t3,
+    "status": response.status_code,
+    "sklearn_loaded": "sklearn" in sys.modules,
+}))
+"""
+
+
+def run_once() -> dict:
+    """
+    Run one cold start in a fresh interpreter with a throwaway data directory.
+    """
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ)
+        env["PYTHONPATH"] = REPO_ROOT + os.pathsep + env.get("PYTHONPATH", "")
+        result = subprocess.run(
+            [sys.executable, "-c", CHILD_SCRIPT],
+            cwd=workdir,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def summarize(samples: list) -> dict:
+    """
+    Reduce a list of runs to median/min/max per phase.
+    """
+    summary = {"runs": len(samples), "timestamp": datetime.utcnow().isoformat()}
+    for key in ("import_s", "startup_s", "first_request_s"):
+        values = [s[key] for s in samples]
+        summary[key] = {
+            "median": round(statistics.median(values), 4),
+            "min": round(min(values), 4),
+            "max": round(max(values), 4),
+        }
+    summary["sklearn_loaded"] = any(s["sklearn_loaded"] for s in samples)
+    return summary
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Measure backend cold-start latency")
+    parser.add_argument("--runs", type=int, default=5, help="Number of fresh interpreters")
+    parser.add_argument("--output", help="Append the summary as a JSON line to this file")
+    args = parser.parse_args(argv)
+
+    samples = [run_once() for _ in range(args.runs)]
+    summary = summarize(samples)
+    print(json.dumps(summary, indent=2))
+
+    if args.output:
+        directory = os.path.dirname(args.output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.output, "a") as f:
+            f.write(json.dumps(summary) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
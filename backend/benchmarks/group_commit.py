@@ -0,0 +1,135 @@
+"""
+Write throughput of quantity updates with and without group commit.
+
+Runs ``--writes`` quantity updates from ``--concurrency`` concurrent tasks
+against a SQLite file:
+
+- ``per-write``: every update in its own transaction, as without a coalescer
+- ``coalesced``: through ``WriteCoalescer`` at each ``--durability`` level
+
+Each update records history and bumps the items version, like ``PUT
+/items/{id}``. Reported as writes per second and the average batch size.
+
+Usage:
+    python -m backend.benchmarks.group_commit --writes 2000 --concurrency 64
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
+
+from .. import database, models, versioning
+from ..usage_tracker import UsageTracker
+from ..write_coalescer import DURABILITY_LEVELS, WriteCoalescer
+
+tracker = UsageTracker()
+
+
+def _setup(path: str, items: int):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    database.init_db(engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with SessionLocal() as db:
+        db.add_all([models.Item(name=f"Item {i}", current_quantity=50.0, minimum_quantity=1.0) for i in range(items)])
+        db.commit()
+
+    @contextmanager
+    def session_scope():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    return engine, session_scope
+
+
+def _update(db, item_id: int, quantity: float):
+    item = db.get(models.Item, item_id)
+    item.quantity_history = tracker.add_quantity_record(item.quantity_history, quantity, item.current_quantity)
+    item.current_quantity = quantity
+
+
+async def _drive(submit, writes: int, concurrency: int, items: int) -> float:
+    counter = iter(range(writes))
+
+    async def worker():
+        for n in counter:
+            await submit(n % items + 1, float(n % 40))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start
+
+
+async def run_per_write(path: str, writes: int, concurrency: int, items: int) -> dict:
+    engine, session_scope = _setup(path, items)
+
+    def write(item_id, quantity):
+        with session_scope() as db:
+            _update(db, item_id, quantity)
+            versioning.bump_version(db, versioning.ITEMS)
+            db.commit()
+
+    elapsed = await _drive(lambda i, q: run_in_threadpool(write, i, q), writes, concurrency, items)
+    engine.dispose()
+    return {"mode": "per-write", "writes_per_s": round(writes / elapsed, 1), "avg_batch": 1.0}
+
+
+async def run_coalesced(path: str, writes: int, concurrency: int, items: int, durability: str, window_ms: float) -> dict:
+    engine, session_scope = _setup(path, items)
+    batches = []
+    coalescer = WriteCoalescer(
+        session_scope, window_ms=window_ms, durability=durability,
+        before_commit=lambda db: (batches.append(1), versioning.bump_version(db, versioning.ITEMS))
+    )
+
+    def submit(item_id, quantity):
+        return coalescer.submit(lambda db: _update(db, item_id, quantity))
+
+    elapsed = await _drive(submit, writes, concurrency, items)
+    await coalescer.close()
+    engine.dispose()
+    return {
+        "mode": f"coalesced ({durability})",
+        "writes_per_s": round(writes / elapsed, 1),
+        "avg_batch": round(writes / max(1, len(batches)), 1),
+    }
+
+
+async def run(writes: int, concurrency: int, items: int, durabilities, window_ms: float) -> list:
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        results.append(await run_per_write(os.path.join(workdir, "per-write.db"), writes, concurrency, items))
+        for durability in durabilities:
+            path = os.path.join(workdir, f"coalesced-{durability}.db")
+            results.append(await run_coalesced(path, writes, concurrency, items, durability, window_ms))
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare per-write commits with group commit")
+    parser.add_argument("--writes", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64, help="Concurrent writers")
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--window-ms", type=float, default=2.0, help="Coalescing window")
+    parser.add_argument("--durability", nargs="+", choices=DURABILITY_LEVELS, default=list(DURABILITY_LEVELS))
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run(args.writes, args.concurrency, args.items, args.durability, args.window_ms))
+    base = results[0]["writes_per_s"]
+    print(f"{'mode':<22} {'writes/s':>10} {'avg batch':>10} {'speedup':>8}")
+    for r in results:
+        print(f"{r['mode']:<22} {r['writes_per_s']:>10.1f} {r['avg_batch']:>10.1f} {r['writes_per_s'] / base:>7.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+"""
+Micro-benchmarks for the prediction and history functions every request hits,
+with JSON baselines to catch performance regressions.
+
+Cases (each on synthetic histories of every ``--sizes`` length):
+- predict_usage_rate / get_prediction_confidence (MLPredictor)
+- segmented_predict_usage_rate (SegmentedPredictor)
+- parse_history_points (the date-parsing path of every fit)
+- add_quantity_record / get_history_as_list / needs_check_reminder (UsageTracker)
+- calculate_suggested_quantity (sms_service; size-independent)
+
+Timings are per call: the best of ``--repeat`` rounds (the least noisy
+estimate) and the median.
+
+Usage:
+    python -m backend.benchmarks.hot_paths --save-baseline
+    python -m backend.benchmarks.hot_paths --threshold 1.5   # exit 1 on regression
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from ..ml_predictor import MLPredictor, SegmentedPredictor, parse_history_points
+from ..sms_service import calculate_suggested_quantity
+from ..usage_tracker import UsageTracker
+
+DEFAULT_SIZES = (5, 100, 1000, 10000)
+DEFAULT_BASELINE = os.path.join("data", "benchmarks", "hot_paths.json")
+DEFAULT_THRESHOLD = 1.5
+# Differences below this are timer noise, whatever the ratio
+DEFAULT_MIN_DELTA_US = 1.0
+
+
+def make_history(n: int, seed: int = 0) -> List[Dict]:
+    """
+    Synthetic daily history, oldest first: noisy consumption with a restock
+    whenever stock runs low. Dates are ISO strings, as stored.
+    """
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1, 8, 0, 0)
+    quantity = 20.0
+    history = []
+    for day in range(n):
+        old = quantity
+        quantity = max(0.0, quantity - rng.uniform(0.2, 1.5))
+        if quantity < 2.0:
+            quantity += 20.0
+        history.append({
+            "date": (start + timedelta(days=day, minutes=rng.randint(0, 600))).isoformat(),
+            "quantity": round(quantity, 2),
+            "change": round(quantity - old, 2)
+        })
+    return history
+
+
+def cases(sizes) -> Dict[str, Callable[[], object]]:
+    """Benchmark name -> zero-argument callable."""
+    predictor = MLPredictor()
+    segmented = SegmentedPredictor()
+    tracker = UsageTracker()
+    selected = {
+        "calculate_suggested_quantity": lambda: calculate_suggested_quantity(
+            current_qty=1.0, min_qty=4.0, usage_rate=2.5, usage_period="weekly", acquisition_difficulty=5
+        )
+    }
+    for n in sizes:
+        history = make_history(n)
+        history_json = json.dumps(history)
+        selected.update({
+            f"predict_usage_rate[n={n}]": lambda h=history: predictor.predict_usage_rate(h),
+            f"get_prediction_confidence[n={n}]": lambda h=history: predictor.get_prediction_confidence(h),
+            f"segmented_predict_usage_rate[n={n}]": lambda h=history: segmented.predict_usage_rate(h),
+            f"parse_history_points[n={n}]": lambda h=history: parse_history_points(h),
+            f"add_quantity_record[n={n}]": lambda j=history_json: tracker.add_quantity_record(j, 5.0, 4.0),
+            f"get_history_as_list[n={n}]": lambda j=history_json: tracker.get_history_as_list(j),
+            f"needs_check_reminder[n={n}]": lambda j=history_json: tracker.needs_check_reminder(j),
+        })
+    return selected
+
+
+def measure(fn: Callable[[], object], repeat: int = 5, min_time: float = 0.05) -> dict:
+    """
+    Time ``fn`` per call. The loop count grows until one round takes at
+    least ``min_time`` seconds, then ``repeat`` rounds are timed.
+    """
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or loops >= 1_000_000:
+            break
+        loops *= 10 if elapsed < min_time / 10 else 2
+
+    rounds = [elapsed / loops]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        rounds.append((time.perf_counter() - start) / loops)
+    return {
+        "loops": loops,
+        "min_us": round(min(rounds) * 1e6, 3),
+        "median_us": round(statistics.median(rounds) * 1e6, 3),
+    }
+
+
+def run(sizes=DEFAULT_SIZES, repeat: int = 5, min_time: float = 0.05, only: Optional[str] = None) -> dict:
+    results = {}
+    for name, fn in cases(sizes).items():
+        if only and only not in name:
+            continue
+        results[name] = measure(fn, repeat, min_time)
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "ml_backend": type(MLPredictor().backend).__name__,
+        "results": results,
+    }
+
+
+def compare(
+    current: dict,
+    baseline: dict,
+    threshold: float = DEFAULT_THRESHOLD,
+    min_delta_us: float = DEFAULT_MIN_DELTA_US
+) -> List[dict]:
+    """
+    Cases whose best time grew by more than ``threshold`` times the
+    baseline (and by at least ``min_delta_us``). Cases missing from either
+    side are skipped.
+    """
+    regressions = []
+    for name, result in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            continue
+        if result["min_us"] > base["min_us"] * threshold and result["min_us"] - base["min_us"] >= min_delta_us:
+            regressions.append({
+                "case": name,
+                "baseline_us": base["min_us"],
+                "current_us": result["min_us"],
+                "ratio": round(result["min_us"] / base["min_us"], 2),
+            })
+    return regressions
+
+
+def _print_table(current: dict, baseline: Optional[dict]):
+    base_results = (baseline or {}).get("results", {})
+    print(f"{'case':<40} {'best us':>12} {'median us':>12} {'baseline':>12} {'ratio':>7}")
+    for name, result in current["results"].items():
+        base = base_results.get(name)
+        base_text = f"{base['min_us']:>12.3f}" if base else f"{'-':>12}"
+        ratio = f"{result['min_us'] / base['min_us']:>7.2f}" if base and base["min_us"] else f"{'-':>7}"
+        print(f"{name:<40} {result['min_us']:>12.3f} {result['median_us']:>12.3f} {base_text} {ratio}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark prediction/history hot paths against a JSON baseline")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="History lengths")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed rounds per case")
+    parser.add_argument("--min-time", type=float, default=0.05, help="Minimum seconds per round")
+    parser.add_argument("--only", help="Run only cases whose name contains this text")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="Write this run as the new baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed slowdown ratio")
+    parser.add_argument("--min-delta-us", type=float, default=DEFAULT_MIN_DELTA_US, help="Ignore smaller slowdowns")
+    parser.add_argument("--output", help="Also write this run's results to a JSON file")
+    args = parser.parse_args(argv)
+
+    current = run(args.sizes, args.repeat, args.min_time, args.only)
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    _print_table(current, baseline)
+
+    for path in filter(None, [args.output, args.baseline if args.save_baseline else None]):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(current, f, indent=2)
+        print(f"Wrote {path}")
+
+    if baseline is None or args.save_baseline:
+        return 0
+    regressions = compare(current, baseline, args.threshold, args.min_delta_us)
+    for r in regressions:
+        print(f"REGRESSION {r['case']}: {r['baseline_us']} us -> {r['current_us']} us ({r['ratio']}x)")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,482 @@
+"""
+End-to-end load test: a synthetic household and a driver replaying a
+realistic request mix, reporting throughput and latency percentiles per
+endpoint.
+
+The generator builds an inventory of N items across categories with months
+of quantity history (irregular checks, noisy consumption, restocks).
+Virtual users then log in and loop over a weighted mix:
+
+- dashboard: ``GET /items`` + ``GET /categories`` (with ETags, like the frontend)
+- prediction: ``GET /items/{id}/purchase-prediction``
+- update: ``PUT /items/{id}`` with a consumed or restocked quantity
+- shopping_list: ``GET /shopping-list``
+- barcode: ``POST /barcode/identify`` by known barcode, or by image (Gemini)
+
+Textbelt and Gemini are replaced by local fakes with configurable latency.
+The SMS fake sits at the HTTP transport and the Gemini fake replaces the
+model, so the real service code still runs. ``run`` drives the app
+in-process through ASGI; ``serve`` starts a local uvicorn with the same
+fakes for ``run --url``.
+
+Usage:
+    python -m backend.benchmarks.load_test run --items 300 --users 20 --duration 30
+    python -m backend.benchmarks.load_test serve --items 300 --port 8001
+    python -m backend.benchmarks.load_test run --url http://127.0.0.1:8001 --users 50 --duration 60
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import types
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from io import BytesIO
+from typing import Dict, List, Optional
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from .. import auth, barcode_service, database, models, sms_service, versioning
+from ..database import get_db
+from ..settings import Settings
+from ..usage_tracker import UsageTracker
+
+USERNAME = "loadtest"
+PASSWORD = "loadtest"
+
+DEFAULT_MIX = {"dashboard": 30, "prediction": 25, "update": 25, "shopping_list": 15, "barcode": 5}
+
+CATALOG = {
+    "Alimentos": ("🍎", ["Arroz", "Feijão", "Macarrão", "Café", "Açúcar", "Leite", "Óleo", "Farinha"], "kg"),
+    "Limpeza": ("🧹", ["Detergente", "Sabão em pó", "Desinfetante", "Esponja", "Água sanitária"], "un"),
+    "Higiene": ("🧼", ["Sabonete", "Pasta de dente", "Shampoo", "Papel higiênico", "Desodorante"], "un"),
+    "Medicamentos": ("💊", ["Dipirona", "Paracetamol", "Curativo", "Soro fisiológico"], "un"),
+    "Pet": ("🐕", ["Ração", "Areia", "Petisco"], "kg"),
+    "Bebidas": ("🥤", ["Água", "Suco", "Refrigerante", "Chá"], "L"),
+}
+
+
+# === Household generator ===
+
+def _ean13(number: int) -> str:
+    digits = f"789{number:09d}"
+    total = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(digits))
+    return digits + str((10 - total % 10) % 10)
+
+
+def make_history(rng: random.Random, start: datetime, days: int, minimum: float) -> List[Dict]:
+    """
+    Quantity checks every 1-4 days over ``days``, consuming at a per-item
+    rate with noise and restocking to a target when stock runs low.
+    """
+    daily_rate = rng.lognormvariate(-0.5, 0.8)
+    target = max(minimum * 3, daily_rate * 30)
+    quantity = round(target * rng.uniform(0.5, 1.0), 2)
+    history = []
+    day = 0.0
+    while True:
+        elapsed = rng.choice((1, 1, 2, 3, 4)) + rng.random() * 0.2
+        day += elapsed
+        if day >= days:
+            break
+        old = quantity
+        quantity = max(0.0, round(quantity - daily_rate * elapsed * rng.uniform(0.5, 1.5), 2))
+        if quantity <= minimum and rng.random() < 0.8:
+            quantity = round(quantity + target, 2)
+        history.append({
+            "date": (start + timedelta(days=day)).isoformat(),
+            "quantity": quantity,
+            "change": round(quantity - old, 2)
+        })
+    return history
+
+
+def generate_household(db: Session, items: int = 200, months: int = 3, seed: int = 0) -> List[int]:
+    """
+    Create the load-test user, categories and ``items`` items with
+    ``months`` of history and stored predictions. Returns the item ids.
+    """
+    from ..main import refresh_item_prediction
+    from ..ml_predictor import get_predictor
+
+    rng = random.Random(seed)
+    tracker = UsageTracker()
+    predictor = get_predictor()
+
+    if not db.query(models.User).filter(models.User.username == USERNAME).first():
+        db.add(models.User(
+            username=USERNAME, hashed_password=auth.get_password_hash(PASSWORD),
+            display_name="Load test", phone_number="+5511999990000"
+        ))
+
+    categories = {c.name: c for c in db.query(models.Category).all()}
+    for name, (icon, _, _) in CATALOG.items():
+        if name not in categories:
+            categories[name] = models.Category(name=name, icon=icon, color="#%06X" % rng.randrange(0x1000000))
+            db.add(categories[name])
+    db.flush()
+
+    now = datetime.utcnow()
+    start = now - timedelta(days=30 * months)
+    created = []
+    names = list(CATALOG)
+    for i in range(items):
+        category_name = names[i % len(names)]
+        _, products, unit = CATALOG[category_name]
+        minimum = float(rng.choice((1, 2, 3, 5)))
+        history = make_history(rng, start, 30 * months, minimum)
+        item = models.Item(
+            name=f"{products[(i // len(names)) % len(products)]} {i + 1}",
+            category_id=categories[category_name].id,
+            current_quantity=history[-1]["quantity"] if history else minimum * 2,
+            minimum_quantity=minimum,
+            unit=unit,
+            barcode=_ean13(i + 1),
+            acquisition_difficulty=rng.choice((0, 0, 5, 10)),
+            usage_period="daily",
+            quantity_history=tracker.append_records(None, history),
+            last_checked_at=datetime.fromisoformat(history[-1]["date"]) if history else None
+        )
+        refresh_item_prediction(item, predictor)
+        created.append(item)
+    db.add_all(created)
+    versioning.bump_version(db, versioning.ITEMS, versioning.CATEGORIES)
+    db.commit()
+    return [item.id for item in created]
+
+
+# === External service fakes ===
+
+class FakeGeminiModel:
+    """Stands in for ``genai.GenerativeModel``: blocks like the real client, then answers."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def generate_content(self, parts):
+        time.sleep(self.latency)
+        return types.SimpleNamespace(text=json.dumps({
+            "product_name": "Produto Teste", "suggested_category": "Alimentos",
+            "suggested_unit": "un", "barcode": None
+        }))
+
+
+@contextmanager
+def fake_external_services(sms_latency: float = 0.3, gemini_latency: float = 1.0):
+    """
+    Route Textbelt calls to an in-process transport and give BarcodeService
+    a fake model, so load tests never reach the network.
+    """
+    async def textbelt(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(sms_latency)
+        return httpx.Response(200, json={"success": True, "quotaRemaining": 1000})
+
+    transport = httpx.MockTransport(textbelt)
+    fake_httpx = types.SimpleNamespace(AsyncClient=lambda **kwargs: httpx.AsyncClient(transport=transport, **kwargs))
+
+    def fake_init(service):
+        service.api_key = "load-test"
+        service.model = FakeGeminiModel(gemini_latency)
+
+    fakes = [
+        (sms_service, "httpx", fake_httpx),
+        (barcode_service.BarcodeService, "__init__", fake_init),
+    ]
+    saved = [(owner, name, getattr(owner, name)) for owner, name, _ in fakes]
+    try:
+        for owner, name, value in fakes:
+            setattr(owner, name, value)
+        yield
+    finally:
+        for owner, name, value in saved:
+            setattr(owner, name, value)
+
+
+def _sample_image() -> str:
+    from PIL import Image
+    buffer = BytesIO()
+    Image.new("RGB", (64, 64), (200, 120, 40)).save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+# === Load driver ===
+
+class Stats:
+    """Latencies (seconds) and errors per endpoint label."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def record(self, label: str, elapsed: float, ok: bool):
+        self.latencies[label].append(elapsed)
+        if not ok:
+            self.errors[label] += 1
+
+    @property
+    def requests(self) -> int:
+        return sum(len(v) for v in self.latencies.values())
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(q / 100 * len(sorted_values) + 0.5 - 1e-9)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(stats: Stats, elapsed: float) -> dict:
+    endpoints = {}
+    for label in sorted(stats.latencies):
+        values = sorted(stats.latencies[label])
+        endpoints[label] = {
+            "count": len(values),
+            "errors": stats.errors.get(label, 0),
+            "rps": round(len(values) / elapsed, 2),
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p95_ms": round(percentile(values, 95) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2),
+            "max_ms": round(values[-1] * 1000, 2),
+        }
+    return {
+        "duration_s": round(elapsed, 2),
+        "requests": stats.requests,
+        "errors": sum(stats.errors.values()),
+        "throughput_rps": round(stats.requests / elapsed, 2) if elapsed else 0.0,
+        "endpoints": endpoints,
+    }
+
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, token: str, inventory: Dict[int, dict],
+                 stats: Stats, rng: random.Random, image: str, use_etags: bool = True):
+        self.client = client
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.inventory = inventory
+        self.stats = stats
+        self.rng = rng
+        self.image = image
+        self.use_etags = use_etags
+        self.etags: Dict[str, str] = {}
+
+    async def request(self, label: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        headers = dict(self.headers)
+        if method == "GET" and self.use_etags and url in self.etags:
+            headers["If-None-Match"] = self.etags[url]
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers=headers, **kwargs)
+        except httpx.HTTPError:
+            self.stats.record(label, time.perf_counter() - start, False)
+            return None
+        self.stats.record(label, time.perf_counter() - start, response.status_code < 400)
+        if method == "GET" and "etag" in response.headers:
+            self.etags[url] = response.headers["etag"]
+        return response
+
+    async def dashboard(self):
+        await self.request("GET /items", "GET", "/items")
+        await self.request("GET /categories", "GET", "/categories")
+
+    async def prediction(self):
+        item_id = self.rng.choice(list(self.inventory))
+        await self.request("GET /items/{item_id}/purchase-prediction", "GET", f"/items/{item_id}/purchase-prediction")
+
+    async def update(self):
+        item_id = self.rng.choice(list(self.inventory))
+        item = self.inventory[item_id]
+        quantity = max(0.0, item["current_quantity"] - self.rng.choice((0.5, 1.0, 2.0)))
+        if quantity < item["minimum_quantity"] and self.rng.random() < 0.3:
+            quantity += item["minimum_quantity"] * 4
+        item["current_quantity"] = round(quantity, 2)
+        await self.request("PUT /items/{item_id}", "PUT", f"/items/{item_id}", json={"current_quantity": item["current_quantity"]})
+
+    async def shopping_list(self):
+        await self.request("GET /shopping-list", "GET", "/shopping-list")
+
+    async def barcode(self):
+        if self.rng.random() < 0.7:
+            item = self.inventory[self.rng.choice(list(self.inventory))]
+            await self.request("POST /barcode/identify (index)", "POST", "/barcode/identify", json={"barcode": item["barcode"]})
+        else:
+            await self.request("POST /barcode/identify (gemini)", "POST", "/barcode/identify", json={"image_base64": self.image})
+
+
+async def _login(client: httpx.AsyncClient) -> str:
+    response = await client.post("/token", data={"username": USERNAME, "password": PASSWORD})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def drive(
+    client: httpx.AsyncClient,
+    users: int = 10,
+    duration: float = 10.0,
+    max_requests: Optional[int] = None,
+    mix: Optional[Dict[str, int]] = None,
+    think_ms: float = 0.0,
+    use_etags: bool = True,
+    seed: int = 0
+) -> dict:
+    """
+    Run ``users`` concurrent virtual users until ``duration`` seconds pass
+    (or ``max_requests`` requests were made) and summarize the latencies.
+    """
+    mix = mix or DEFAULT_MIX
+    actions, weights = zip(*mix.items())
+    tokens = [await _login(client) for _ in range(users)]
+    listing = await client.get("/items", headers={"Authorization": f"Bearer {tokens[0]}"})
+    listing.raise_for_status()
+    inventory = {item["id"]: item for item in listing.json()}
+    if not inventory:
+        raise RuntimeError("The server has no items; generate a household first")
+
+    image = _sample_image()
+    stats = Stats()
+    deadline = time.perf_counter() + duration
+
+    async def run_user(index: int):
+        rng = random.Random(seed * 1000 + index)
+        user = VirtualUser(client, tokens[index], inventory, stats, rng, image, use_etags)
+        while time.perf_counter() < deadline and (max_requests is None or stats.requests < max_requests):
+            action = rng.choices(actions, weights)[0]
+            await getattr(user, action)()
+            if think_ms:
+                await asyncio.sleep(rng.expovariate(1000.0 / think_ms))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run_user(i) for i in range(users)))
+    return summarize(stats, time.perf_counter() - start)
+
+
+# === App setup ===
+
+def build_app(db_path: str, items: int, months: int, seed: int = 0, rate_limiting: bool = False):
+    """
+    App on its own SQLite file, with the household generated on first use.
+    Rate limiting is off by default: every virtual user logs in as the same user.
+    """
+    from ..main import create_app
+
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def override_get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = create_app(Settings(
+        frontend_dir=None, seed_on_startup=False, slow_query_log=None, rate_limiting=rate_limiting
+    ))
+    app.dependency_overrides[get_db] = override_get_db
+
+    def populate():
+        database.init_db(engine)
+        with SessionLocal() as db:
+            if db.query(models.Item).count() == 0:
+                generate_household(db, items, months, seed)
+
+    return app, populate
+
+
+async def run_in_process(args) -> dict:
+    with tempfile.TemporaryDirectory() as workdir, fake_external_services(args.sms_latency, args.gemini_latency):
+        app, populate = build_app(os.path.join(workdir, "inventory.db"), args.items, args.months, args.seed, args.rate_limit)
+        populate()
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+                return await _drive_from_args(client, args)
+
+
+async def run_against_url(args) -> dict:
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60.0) as client:
+        return await _drive_from_args(client, args)
+
+
+async def _drive_from_args(client: httpx.AsyncClient, args) -> dict:
+    return await drive(
+        client, users=args.users, duration=args.duration, max_requests=args.max_requests,
+        think_ms=args.think_ms, use_etags=not args.no_etags, seed=args.seed
+    )
+
+
+def serve(args):
+    import uvicorn
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix="ainventory-load-"), "inventory.db")
+    with fake_external_services(args.sms_latency, args.gemini_latency):
+        app, populate = build_app(db_path, args.items, args.months, args.seed, args.rate_limit)
+        populate()
+        print(f"Serving {db_path} on http://{args.host}:{args.port} (user {USERNAME}/{PASSWORD})")
+        uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+def print_report(report: dict):
+    print(f"{report['requests']} requests in {report['duration_s']} s: "
+          f"{report['throughput_rps']} req/s, {report['errors']} errors")
+    print(f"{'endpoint':<44} {'count':>7} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for label, row in report["endpoints"].items():
+        print(f"{label:<44} {row['count']:>7} {row['rps']:>8} {row['p50_ms']:>9} "
+              f"{row['p95_ms']:>9} {row['p99_ms']:>9} {row['errors']:>7}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Load-test the backend with a synthetic household")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def household_options(command):
+        command.add_argument("--items", type=int, default=200, help="Items in the generated household")
+        command.add_argument("--months", type=int, default=3, help="Months of quantity history per item")
+        command.add_argument("--seed", type=int, default=0)
+        command.add_argument("--sms-latency", type=float, default=0.3, help="Fake Textbelt latency (s)")
+        command.add_argument("--gemini-latency", type=float, default=1.0, help="Fake Gemini latency (s)")
+        command.add_argument("--rate-limit", action="store_true", help="Keep admission control on (429s count as errors)")
+
+    run = commands.add_parser("run", help="Drive load and report latency per endpoint")
+    household_options(run)
+    run.add_argument("--url", help="Target a running server (see 'serve') instead of an in-process app")
+    run.add_argument("--users", type=int, default=10, help="Concurrent virtual users")
+    run.add_argument("--duration", type=float, default=10.0, help="Seconds to run")
+    run.add_argument("--max-requests", type=int, help="Stop after this many requests")
+    run.add_argument("--think-ms", type=float, default=0.0, help="Mean pause between a user's requests")
+    run.add_argument("--no-etags", action="store_true", help="Don't send If-None-Match")
+    run.add_argument("--output", help="Write the report as JSON")
+
+    server = commands.add_parser("serve", help="Run uvicorn on a generated household with fake SMS/Gemini")
+    household_options(server)
+    server.add_argument("--db", help="SQLite file (default: a new temporary file)")
+    server.add_argument("--host", default="127.0.0.1")
+    server.add_argument("--port", type=int, default=8001)
+
+    args = parser.parse_args(argv)
+    if args.command == "serve":
+        serve(args)
+        return 0
+
+    report = asyncio.run(run_against_url(args) if args.url else run_in_process(args))
+    print_report(report)
+    if args.output:
+        directory = os.path.dirname(args.output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""
+Per-item serialization cost of list responses, before and after the fast path.
+
+- fastapi_default: what FastAPI does for ``response_model=List[...]``:
+  validate each object, convert to JSON-able primitives, stdlib json.dumps
+- fast_path: backend.serialization (validate once, pydantic-core JSON / orjson)
+
+Usage:
+    python -m backend.benchmarks.serialization --sizes 100 1000 10000
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+
+from .. import models, schemas, serialization
+
+
+def make_items(n: int, history_points: int = 30) -> list:
+    """Transient ORM items with categories and a JSON history, no database."""
+    categories = [models.Category(id=i, name=f"Cat {i}", icon="🍎", color="#FF5733") for i in range(5)]
+    now = datetime(2024, 6, 1)
+    history = json.dumps([
+        {"date": (now - timedelta(days=d)).isoformat(), "quantity": 10.0 - d * 0.1, "change": -0.1}
+        for d in range(history_points)
+    ])
+    items = []
+    for i in range(n):
+        category = categories[i % len(categories)]
+        items.append(models.Item(
+            id=i + 1, name=f"Item {i}", category_id=category.id, category=category,
+            current_quantity=5.0, minimum_quantity=2.0, unit="un", notes="note",
+            barcode=f"789{i:010d}", created_at=now, updated_at=now,
+            acquisition_difficulty=0, usage_rate=1.0, usage_period="daily",
+            notification_enabled=False, quantity_history=history
+        ))
+    return items
+
+
+def make_shopping_rows(n: int) -> list:
+    return [
+        {
+            "id": i, "name": f"Item {i}", "current_quantity": 0.5, "minimum_quantity": 2.0,
+            "unit": "un", "needed": 1.5, "urgency": "attention", "acquisition_difficulty": 0,
+            "purchase_by": "2024-06-03T10:00:00", "days_remaining": 0.5
+        }
+        for i in range(n)
+    ]
+
+
+def fastapi_default(model, rows) -> bytes:
+    validated = [model.model_validate(row, from_attributes=True) for row in rows]
+    return json.dumps(jsonable_encoder(validated)).encode()
+
+
+def _per_item_us(fn, rows, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(rows)
+        best = min(best, time.perf_counter() - start)
+    return best / len(rows) * 1e6
+
+
+def run(sizes, repeat: int = 5) -> list:
+    results = []
+    for n in sizes:
+        items = make_items(n)
+        shopping = make_shopping_rows(n)
+        results.append({
+            "endpoint": "/items",
+            "n": n,
+            "fastapi_default_us_per_item": round(_per_item_us(lambda r: fastapi_default(schemas.Item, r), items, repeat), 2),
+            "fast_path_us_per_item": round(_per_item_us(lambda r: serialization.dump_orm_list(schemas.Item, r), items, repeat), 2),
+        })
+        results.append({
+            "endpoint": "/shopping-list",
+            "n": n,
+            "fastapi_default_us_per_item": round(_per_item_us(lambda r: fastapi_default(schemas.ShoppingListItem, r), shopping, repeat), 2),
+            "fast_path_us_per_item": round(_per_item_us(serialization.dump_json, shopping, repeat), 2),
+        })
+    for row in results:
+        row["speedup"] = round(row["fastapi_default_us_per_item"] / row["fast_path_us_per_item"], 1)
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark list response serialization")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.sizes, args.repeat), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
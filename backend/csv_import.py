@@ -0,0 +1,368 @@
+"""
+CSV bulk import of items.
+
+Rows are mapped onto ``schemas.ItemCreate`` (English or Portuguese
+headers, ',' or ';' delimiters, decimal commas). Categories are resolved
+by name with one query and existing items are matched by barcode, then by
+name, against an index preloaded in memory. The import is planned first,
+which gives the create/update/skip diff for dry runs, and then applied in
+chunked transactions.
+
+Stored predictions are not refreshed here; run ``python -m backend.recompute``
+after large imports.
+
+Usage:
+    python -m backend.csv_import items.csv [--dry-run] [--chunk-size 500]
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+import time
+import unicodedata
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pydantic import ValidationError
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from . import analytics, barcodes, database, models, schemas, versioning
+from .usage_tracker import UsageTracker
+
+DEFAULT_CHUNK_SIZE = 500
+
+# Header aliases -> ItemCreate field ("category" is resolved to category_id)
+COLUMN_ALIASES = {
+    "name": "name", "nome": "name", "item": "name", "produto": "name",
+    "category": "category", "categoria": "category",
+    "current_quantity": "current_quantity", "quantity": "current_quantity",
+    "quantidade": "current_quantity", "estoque": "current_quantity",
+    "minimum_quantity": "minimum_quantity", "minimum": "minimum_quantity",
+    "minimo": "minimum_quantity", "quantidade_minima": "minimum_quantity",
+    "unit": "unit", "unidade": "unit",
+    "notes": "notes", "notas": "notes", "observacoes": "notes",
+    "barcode": "barcode", "ean": "barcode", "codigo_de_barras": "barcode", "codigo_barras": "barcode",
+    "acquisition_difficulty": "acquisition_difficulty", "difficulty": "acquisition_difficulty",
+    "dificuldade": "acquisition_difficulty",
+    "usage_rate": "usage_rate", "consumo": "usage_rate",
+    "usage_period": "usage_period", "periodo": "usage_period",
+}
+
+# Fields compared when deciding between update and skip
+COMPARED_FIELDS = tuple(f for f in schemas.ItemBase.model_fields)
+
+NEW_CATEGORY_ICON = "📦"
+NEW_CATEGORY_COLOR = "#888888"
+
+usage_tracker = UsageTracker()
+
+
+def normalize_text(value: str) -> str:
+    """Case- and accent-insensitive key ("Feijão  Preto" -> "feijao preto")."""
+    decomposed = unicodedata.normalize("NFKD", value)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.casefold().split())
+
+
+def _header_key(header: str) -> str:
+    return normalize_text(header).replace(" ", "_")
+
+
+@dataclass
+class RowAction:
+    row: int
+    action: str  # create, update, skip, error
+    name: Optional[str] = None
+    item_id: Optional[int] = None
+    values: Dict = field(default_factory=dict)
+    changes: Dict = field(default_factory=dict)
+    error: Optional[str] = None
+
+    def to_result(self) -> schemas.ImportRowResult:
+        return schemas.ImportRowResult(
+            row=self.row, action=self.action, name=self.name,
+            item_id=self.item_id, changes=self.changes, error=self.error
+        )
+
+
+@dataclass
+class ImportPlan:
+    actions: List[RowAction] = field(default_factory=list)
+    new_categories: List[str] = field(default_factory=list)
+
+    def count(self, action: str) -> int:
+        return sum(1 for a in self.actions if a.action == action)
+
+
+def read_rows(text: str):
+    """
+    Yield (row_number, {field: raw value}) from CSV text.
+    Row numbers are 1-based data rows (the header is row 0).
+    """
+    sample = text[:4096]
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.reader(io.StringIO(text), dialect)
+    try:
+        headers = next(reader)
+    except StopIteration:
+        return
+    fields = [COLUMN_ALIASES.get(_header_key(h)) for h in headers]
+    decimal_comma = getattr(dialect, "delimiter", ",") != ","
+
+    for number, values in enumerate(reader, start=1):
+        if not any(v.strip() for v in values):
+            continue
+        row = {}
+        for name, value in zip(fields, values):
+            if name is None:
+                continue
+            value = value.strip()
+            if decimal_comma and name in ("current_quantity", "minimum_quantity", "usage_rate"):
+                value = value.replace(",", ".")
+            row[name] = value
+        yield number, row
+
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in error.errors())
+
+
+def plan_import(db: Session, rows, create_categories: bool = True) -> ImportPlan:
+    """
+    Match rows against existing data and decide create/update/skip per row.
+    Performs two read queries in total, however many rows there are.
+
+    New items are validated as ``ItemCreate``; matched items as
+    ``ItemUpdate``, so a sheet with only name and quantity can update counts.
+    A row whose barcode belongs to another item than the one its name
+    matches is an error rather than a write that would break the unique
+    barcode index.
+    """
+    plan = ImportPlan()
+    categories = {normalize_text(c.name): c.id for c in db.query(models.Category.id, models.Category.name)}
+
+    # One pass over existing items builds both match indexes. by_barcode is
+    # keyed like the unique index, so it also tells who owns a barcode
+    by_barcode: Dict[str, dict] = {}
+    by_name: Dict[str, dict] = {}
+    columns = [models.Item.id, models.Item.barcode_normalized] + [getattr(models.Item, f) for f in COMPARED_FIELDS]
+    for row in db.query(*columns):
+        existing = row._asdict()
+        key = existing.pop("barcode_normalized")
+        if key:
+            by_barcode[key] = existing
+        by_name.setdefault(normalize_text(existing["name"] or ""), existing)
+
+    seen: Dict[str, int] = {}
+    for number, raw in rows:
+        category_name = raw.pop("category", "")
+        values = {k: v for k, v in raw.items() if v != ""}
+        name = values.get("name")
+        barcode = barcodes.normalize_barcode(values.get("barcode"))
+        if not name and not barcode:
+            plan.actions.append(RowAction(number, "error", error="row has neither name nor barcode"))
+            continue
+
+        match_keys = [f"barcode:{barcode}"] if barcode else []
+        if name:
+            match_keys.append(f"name:{normalize_text(name)}")
+        duplicate_of = next((seen[k] for k in match_keys if k in seen), None)
+        if duplicate_of is not None:
+            plan.actions.append(RowAction(number, "skip", name, error=f"duplicate of row {duplicate_of}"))
+            continue
+        for key in match_keys:
+            seen[key] = number
+
+        owner = by_barcode.get(barcode) if barcode else None
+        named = by_name.get(normalize_text(name)) if name else None
+        if owner is not None and named is not None and owner is not named:
+            # Writing it would fail the unique barcode index
+            plan.actions.append(RowAction(
+                number, "error", name,
+                error=f"barcode belongs to item {owner['id']} but name matches item {named['id']}"
+            ))
+            continue
+        existing = owner if owner is not None else named
+
+        # Resolve the category; new ones get created when the plan is applied
+        category_key = normalize_text(category_name)
+        if category_key and category_key not in categories:
+            if not create_categories:
+                plan.actions.append(RowAction(number, "error", name, error=f"unknown category {category_name!r}"))
+                continue
+            categories[category_key] = None
+            plan.new_categories.append(category_name)
+        if not category_key and existing is None:
+            plan.actions.append(RowAction(number, "error", name, error="missing category"))
+            continue
+
+        try:
+            if existing is None:
+                data = schemas.ItemCreate(category_id=0, **values).model_dump(exclude_unset=True)
+            else:
+                data = schemas.ItemUpdate(**values).model_dump(exclude_unset=True)
+        except ValidationError as e:
+            plan.actions.append(RowAction(number, "error", name, error=_validation_message(e)))
+            continue
+        if category_key:
+            data["category_id"] = categories[category_key]
+
+        if existing is None:
+            plan.actions.append(RowAction(number, "create", data["name"], values={**data, "_category": category_key}))
+            continue
+
+        changes = {key: value for key, value in data.items() if existing.get(key) != value}
+        if "category_id" in data and data["category_id"] is None:
+            changes["category_id"] = None  # New category
+        action = "update" if changes else "skip"
+        plan.actions.append(RowAction(
+            number, action, existing["name"], existing["id"],
+            values={**changes, "_category": category_key}, changes=changes
+        ))
+
+    return plan
+
+
+def apply_plan(db: Session, plan: ImportPlan, chunk_size: int = DEFAULT_CHUNK_SIZE, progress=None) -> Dict:
+    """
+    Write a plan in chunked transactions.
+
+    Returns:
+        Stats dict with elapsed_s and rows_per_s
+    """
+    started = time.perf_counter()
+
+    category_ids = {}
+    if plan.new_categories:
+        new = [
+            models.Category(name=name, icon=NEW_CATEGORY_ICON, color=NEW_CATEGORY_COLOR)
+            for name in plan.new_categories
+        ]
+        db.add_all(new)
+        db.flush()
+        category_ids = {normalize_text(c.name): c.id for c in new}
+        versioning.bump_version(db, versioning.CATEGORIES)
+        db.commit()
+
+    def resolve(values: dict) -> dict:
+        values = dict(values)
+        key = values.pop("_category")
+        if values.get("category_id") is None and "category_id" in values:
+            values["category_id"] = category_ids[key]
+        return values
+
+    writes = [a for a in plan.actions if a.action in ("create", "update")]
+    done = 0
+    for start in range(0, len(writes), chunk_size):
+        chunk = writes[start:start + chunk_size]
+
+        update_ids = [a.item_id for a in chunk if a.action == "update"]
+        existing = {
+            i.id: i for i in db.query(models.Item).filter(models.Item.id.in_(update_ids))
+        } if update_ids else {}
+
+        created = []
+        for action in chunk:
+            values = resolve(action.values)
+            if action.action == "create":
+                item = models.Item(**values)
+                db.add(item)
+                created.append((action, item))
+                continue
+
+            item = existing[action.item_id]
+            if "current_quantity" in values and values["current_quantity"] != item.current_quantity:
+                # A spreadsheet count is a quantity check, like PUT /items/{id}
+                item.quantity_history = usage_tracker.add_quantity_record(
+                    item.quantity_history, item.current_quantity, values["current_quantity"]
+                )
+                item.last_checked_at = datetime.utcnow()
+                analytics.record_change(
+                    db, item.id, item.category_id, values["current_quantity"] - (item.current_quantity or 0.0)
+                )
+            for key, value in values.items():
+                setattr(item, key, value)
+
+        versioning.bump_version(db, versioning.ITEMS)
+        db.commit()
+        for action, item in created:
+            action.item_id = item.id
+
+        done += len(chunk)
+        if progress:
+            elapsed = time.perf_counter() - started
+            progress({"written": done, "total": len(writes), "rows_per_s": done / elapsed if elapsed else 0.0})
+
+    elapsed = time.perf_counter() - started
+    return {"elapsed_s": round(elapsed, 3), "rows_per_s": round(done / elapsed, 1) if elapsed else 0.0}
+
+
+def import_csv(
+    db: Session,
+    text: str,
+    dry_run: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    create_categories: bool = True,
+    progress=None
+) -> schemas.CsvImportResult:
+    """
+    Plan (and unless dry_run, apply) a CSV import.
+    """
+    started = time.perf_counter()
+    plan = plan_import(db, read_rows(text), create_categories=create_categories)
+    if not dry_run:
+        apply_plan(db, plan, chunk_size=chunk_size, progress=progress)
+
+    elapsed = time.perf_counter() - started
+    return schemas.CsvImportResult(
+        dry_run=dry_run,
+        created=plan.count("create"),
+        updated=plan.count("update"),
+        skipped=plan.count("skip"),
+        errors=plan.count("error"),
+        categories_created=plan.new_categories,
+        rows=[a.to_result() for a in plan.actions],
+        elapsed_s=round(elapsed, 3),
+        rows_per_s=round(len(plan.actions) / elapsed, 1) if elapsed else 0.0
+    )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Import items from a CSV file")
+    parser.add_argument("path", help="CSV file ('-' for stdin)")
+    parser.add_argument("--dry-run", action="store_true", help="Only print the create/update/skip diff")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--no-create-categories", action="store_true")
+    parser.add_argument("--database-url", help="Defaults to the app database")
+    args = parser.parse_args(argv)
+
+    text = sys.stdin.read() if args.path == "-" else open(args.path, encoding="utf-8-sig").read()
+    engine = create_engine(args.database_url) if args.database_url else database.engine
+    database.init_db(engine)
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+    def report(stats):
+        print(f"{stats['written']}/{stats['total']} rows - {stats['rows_per_s']:.0f} rows/s", file=sys.stderr, flush=True)
+
+    try:
+        result = import_csv(
+            db, text,
+            dry_run=args.dry_run,
+            chunk_size=args.chunk_size,
+            create_categories=not args.no_create_categories,
+            progress=report
+        )
+    finally:
+        db.close()
+    print(json.dumps(result.model_dump(), indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
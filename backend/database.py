@@ -1,13 +1,12 @@
-from sqlalchemy import create_engine
+from contextlib import contextmanager
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./data/inventory.db"
 
-# Ensure directory exists
-os.makedirs("./data", exist_ok=True)
-
+# Engines connect lazily, so building one here does no I/O
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
@@ -21,3 +20,59 @@ def get_db():
         yield db
     finally:
         db.close()
+
+@contextmanager
+def app_session(app):
+    """
+    Session from the app's ``get_db`` provider, honouring dependency_overrides.
+    For code that runs outside a request's dependency scope (lifespan,
+    streaming responses, background work).
+    """
+    provider = app.dependency_overrides.get(get_db, get_db)
+    db_gen = provider()
+    try:
+        yield next(db_gen)
+    finally:
+        db_gen.close()
+
+def init_db(bind=None):
+    """
+    Create the SQLite data directory (if any), all tables and the search index.
+    Called from the app lifespan, never at import time.
+    """
+    from . import search
+
+    bind = bind if bind is not None else engine
+    url = bind.url
+    if url.get_backend_name() == "sqlite" and url.database and url.database != ":memory:":
+        directory = os.path.dirname(url.database)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+    Base.metadata.create_all(bind=bind)
+    add_missing_columns(bind)
+    search.install(bind)
+
+def add_missing_columns(bind):
+    """
+    Add columns that exist on the models but not in the database.
+    create_all() only creates missing tables, so databases created by an
+    older release would otherwise never get new (nullable) columns.
+    ALTER TABLE doesn't create the indexes declared on those columns, so
+    they are created here too.
+    """
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            added = set()
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=bind.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                added.add(column.name)
+            for index in table.indexes:
+                if added & {c.name for c in index.columns}:
+                    index.create(conn, checkfirst=True)
@@ -0,0 +1,232 @@
+"""
+In-process pub/sub of inventory changes, streamed to clients over SSE.
+
+Changes are captured from the ORM session itself (``after_flush``) and
+published only once the transaction commits, so every write path - API
+endpoints, CSV/NDJSON imports - emits events and rolled-back work never
+does. Event types:
+
+- item.created / item.updated / item.deleted
+- item.low_stock / item.restocked (``is_low_stock`` transitions)
+- category.created / category.updated / category.deleted
+- items.bulk: one event instead of many for large commits (reload)
+- resync: the client missed events and should reload
+
+Each subscriber has a bounded queue. A client that falls behind is not
+allowed to grow memory: its queue is replaced by a single ``resync``
+event and its stream ends, so it reconnects and reloads. A small replay
+buffer lets a reconnecting client resume from ``Last-Event-ID``.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from typing import AsyncIterator, List, Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = 100  # Per-client backlog before it is dropped
+REPLAY_SIZE = 256  # Recent events kept for Last-Event-ID resumes
+BULK_THRESHOLD = 50  # Item events per commit before collapsing into items.bulk
+HEARTBEAT_SECONDS = 15.0
+
+ITEM_FIELDS = (
+    "id", "name", "category_id", "current_quantity", "minimum_quantity",
+    "unit", "barcode", "is_low_stock"
+)
+CATEGORY_FIELDS = ("id", "name", "icon", "color")
+
+_PENDING_KEY = "pending_events"
+
+
+class Subscription:
+    """One connected client: a bounded queue fed from any thread."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int = QUEUE_SIZE):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.closed = False
+
+    def offer(self, event: dict):
+        """Enqueue on the subscriber's loop; overflow drops the client."""
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.close_with_resync()
+
+    def close_with_resync(self):
+        self.closed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait({"type": "resync", "reason": "slow consumer"})
+
+
+class EventBroker:
+    """
+    Fan-out of published events to subscriptions.
+
+    ``publish`` may be called from any thread (sync endpoints run in the
+    threadpool); delivery is scheduled on each subscriber's event loop.
+    """
+
+    def __init__(self, queue_size: int = QUEUE_SIZE, replay_size: int = REPLAY_SIZE):
+        self.queue_size = queue_size
+        self._subscriptions: set = set()
+        self._recent: deque = deque(maxlen=replay_size)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def subscribe(self, last_event_id: Optional[int] = None) -> Subscription:
+        """
+        Register a client on the running loop. With ``last_event_id``, events
+        after it are replayed, or a resync is queued if they are gone.
+        """
+        subscription = Subscription(asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscriptions.add(subscription)
+            if last_event_id is not None:
+                missed = [e for e in self._recent if e["id"] > last_event_id]
+                oldest = self._recent[0]["id"] if self._recent else None
+                if oldest is not None and oldest > last_event_id + 1:
+                    subscription.offer({"type": "resync", "reason": "events expired"})
+                else:
+                    for event in missed:
+                        subscription.offer(event)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscriptions)
+
+    def recent(self) -> List[dict]:
+        with self._lock:
+            return list(self._recent)
+
+    def publish(self, events: List[dict]):
+        with self._lock:
+            stamped = []
+            for event in events:
+                event = {**event, "id": next(self._ids)}
+                self._recent.append(event)
+                stamped.append(event)
+            subscriptions = list(self._subscriptions)
+
+        for subscription in subscriptions:
+            for event in stamped:
+                try:
+                    subscription.loop.call_soon_threadsafe(subscription.offer, event)
+                except RuntimeError:
+                    # The subscriber's loop is gone (server shutting down)
+                    self.unsubscribe(subscription)
+                    break
+
+    def drop_slow(self, subscription: Subscription):
+        self.dropped += 1
+        self.unsubscribe(subscription)
+        logger.info("Dropped slow event subscriber (%d dropped so far)", self.dropped)
+
+
+broker = EventBroker()
+
+
+def format_sse(event: dict) -> bytes:
+    lines = []
+    if "id" in event:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event['type']}")
+    lines.append("data: " + json.dumps(event, default=_json_default, separators=(",", ":")))
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+async def sse_stream(
+    subscription: Subscription,
+    broker: EventBroker = broker,
+    heartbeat: float = HEARTBEAT_SECONDS
+) -> AsyncIterator[bytes]:
+    """
+    Encode a subscription as an SSE byte stream. Ends after a resync event
+    from an overflow; the caller's disconnect cancels it otherwise.
+    """
+    try:
+        yield b"retry: 3000\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            yield format_sse(event)
+            if subscription.closed and subscription.queue.empty():
+                broker.drop_slow(subscription)
+                return
+    finally:
+        broker.unsubscribe(subscription)
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _snapshot(obj, fields) -> dict:
+    return {f: getattr(obj, f, None) for f in fields}
+
+
+# Session hooks: collect during flush, publish after commit
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session: Session, flush_context):
+    pending = session.info.setdefault(_PENDING_KEY, [])
+    for obj in session.new:
+        if isinstance(obj, models.Item):
+            pending.append({"type": "item.created", "data": _snapshot(obj, ITEM_FIELDS)})
+        elif isinstance(obj, models.Category):
+            pending.append({"type": "category.created", "data": _snapshot(obj, CATEGORY_FIELDS)})
+    for obj in session.dirty:
+        if isinstance(obj, models.Item) and session.is_modified(obj):
+            pending.append({"type": "item.updated", "data": _snapshot(obj, ITEM_FIELDS)})
+            low_stock = inspect(obj).attrs.is_low_stock.history
+            if low_stock.added and low_stock.deleted and low_stock.added[0] != low_stock.deleted[0]:
+                kind = "item.low_stock" if obj.is_low_stock else "item.restocked"
+                pending.append({"type": kind, "data": _snapshot(obj, ITEM_FIELDS)})
+        elif isinstance(obj, models.Category) and session.is_modified(obj):
+            pending.append({"type": "category.updated", "data": _snapshot(obj, CATEGORY_FIELDS)})
+    for obj in session.deleted:
+        if isinstance(obj, models.Item):
+            pending.append({"type": "item.deleted", "data": {"id": obj.id}})
+        elif isinstance(obj, models.Category):
+            pending.append({"type": "category.deleted", "data": {"id": obj.id}})
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_changes(session: Session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    item_events = sum(1 for e in pending if e["type"].startswith("item."))
+    if item_events > BULK_THRESHOLD:
+        # An import: one reload beats thousands of patches
+        pending = [e for e in pending if not e["type"].startswith("item.")]
+        pending.append({"type": "items.bulk", "count": item_events})
+    broker.publish(pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session: Session):
+    session.info.pop(_PENDING_KEY, None)
@@ -1,53 +1,43 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from typing import List
-from datetime import datetime, timedelta
+from sqlalchemy import or_
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, selectinload
+from typing import List, Optional
+from datetime import date, datetime, timedelta
 
-# Load environment variables from .env file
-from dotenv import load_dotenv
-load_dotenv()
-
-from . import models, schemas, database, auth
-from .database import engine, get_db
+from . import models, schemas, database, auth, versioning, serialization, transfer, csv_import, search, barcodes, events, metrics, profiler, request_profiling, tracing, rate_limit, write_coalescer, analytics
+from .database import get_db
+from .settings import Settings, load_env_file
+from .response_cache import ResponseCache, SQLiteCacheTier, cached_json_response
 from .ml_predictor import (
-    MLPredictor, 
+    MLPredictor,
+    get_predictor,
     calculate_daily_usage, 
     get_buffer_days,
     calculate_days_remaining,
     calculate_purchase_date,
-    predict_purchase_urgency
+    predict_purchase_urgency,
+    predict_item_fields
 )
-from .usage_tracker import UsageTracker
+from .usage_tracker import UsageTracker, CHECK_REMINDER_DAYS
 
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import RedirectResponse
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 import os
+import hmac
 import json
+import zlib
 
-# Create tables
-models.Base.metadata.create_all(bind=engine)
-
-app = FastAPI(title="AInventory")
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Serve static files
-frontend_path = os.path.join(os.path.dirname(__file__), "..", "frontend")
-app.mount("/static", StaticFiles(directory=frontend_path), name="static")
+router = APIRouter(route_class=metrics.InstrumentedRoute)
 
 # Initialize services
-ml_predictor = MLPredictor()
 usage_tracker = UsageTracker()
 
-@app.get("/")
+@router.get("/")
 async def read_index():
     return RedirectResponse(url="/static/index.html")
 
@@ -62,14 +52,11 @@ def seed_categories(db: Session):
             models.Category(name="Pet", icon="🐕", color="#FFBD33"),
         ]
         db.add_all(categories)
+        versioning.bump_version(db, versioning.CATEGORIES)
         db.commit()
 
-@app.on_event("startup")
-def startup_event():
-    db = next(get_db())
-    seed_categories(db)
-    
-    # Seed Admin User
+# Seed Admin User if missing
+def seed_admin_user(db: Session):
     if not db.query(models.User).filter(models.User.username == "admin").first():
         hashed_pw = auth.get_password_hash("admin")
         admin_user = models.User(
@@ -80,8 +67,136 @@ def startup_event():
         db.add(admin_user)
         db.commit()
 
+# Fill denormalized columns for rows written before they existed
+def backfill_item_columns(db: Session):
+    db.query(models.Item).filter(models.Item.is_low_stock.is_(None)).update(
+        {models.Item.is_low_stock: models.Item.current_quantity < models.Item.minimum_quantity},
+        synchronize_session=False
+    )
+    pending = db.query(models.Item.id, models.Item.quantity_history).filter(
+        models.Item.last_checked_at.is_(None),
+        models.Item.quantity_history.isnot(None)
+    ).all()
+    for item_id, history in pending:
+        db.query(models.Item).filter(models.Item.id == item_id).update(
+            {models.Item.last_checked_at: usage_tracker.get_last_check_date(history)},
+            synchronize_session=False
+        )
+    if barcodes.backfill_normalized_barcodes(db) or pending:
+        versioning.bump_version(db, versioning.ITEMS)
+    analytics.backfill(db)
+    db.commit()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Create the schema and seed defaults once the server starts.
+
+    Sessions come from the app's ``get_db`` provider (honouring
+    ``dependency_overrides``), so tests never touch ``./data``.
+    """
+    settings: Settings = app.state.settings
+    with database.app_session(app) as db:
+        database.init_db(db.get_bind())
+        backfill_item_columns(db)
+        if settings.seed_on_startup:
+            seed_categories(db)
+            seed_admin_user(db)
+    metrics.REGISTRY.configure(settings.metrics_dir)
+    profiler.configure_slow_query_log(settings.slow_query_log)
+    yield
+    if app.state.write_coalescer is not None:
+        await app.state.write_coalescer.close()
+    metrics.REGISTRY.flush()
+
+def create_app(settings: Optional[Settings] = None) -> FastAPI:
+    """
+    Build the FastAPI application.
+
+    Building the app does no I/O: the database is initialised by the
+    lifespan handler and heavy modules are imported on first use.
+    """
+    if settings is None:
+        settings = Settings.from_env()
+
+    app = FastAPI(title="AInventory", lifespan=lifespan)
+    app.state.settings = settings
+    app.state.ml_predictor = get_predictor(settings.ml_predictor)
+    
+    # Versioned response cache for hot read endpoints (0 bytes disables it)
+    if settings.response_cache_bytes > 0:
+        shared = None
+        if settings.response_cache_path:
+            shared = SQLiteCacheTier(settings.response_cache_path, settings.response_cache_shared_bytes)
+        app.state.response_cache = ResponseCache(settings.response_cache_bytes, shared=shared)
+    else:
+        app.state.response_cache = None
+
+    # Group commit of quantity-only updates (0 ms disables it)
+    if settings.write_coalesce_ms > 0:
+        app.state.write_coalescer = write_coalescer.WriteCoalescer(
+            lambda: database.app_session(app),
+            window_ms=settings.write_coalesce_ms,
+            max_batch=settings.write_coalesce_max_batch,
+            durability=settings.write_durability,
+            before_commit=lambda db: versioning.bump_version(db, versioning.ITEMS)
+        )
+    else:
+        app.state.write_coalescer = None
+
+    app.state.profile_store = request_profiling.ProfileStore(
+        settings.profile_dir, settings.profile_max_files, settings.profile_max_age_days
+    )
+    if settings.request_profiling:
+        app.add_middleware(
+            request_profiling.RequestProfilingMiddleware,
+            store=app.state.profile_store,
+            admin_usernames=settings.admin_usernames
+        )
+    app.add_middleware(
+        profiler.QueryProfilerMiddleware,
+        debug_headers=settings.sql_debug_headers,
+        slow_query_ms=settings.slow_query_ms,
+        slow_request_ms=settings.slow_request_ms
+    )
+    app.state.trace_buffer = tracing.RingBufferExporter(settings.trace_buffer_size)
+    if settings.tracing:
+        exporters = [app.state.trace_buffer]
+        if settings.trace_file:
+            exporters.append(tracing.JsonlExporter(settings.trace_file))
+        app.add_middleware(tracing.TracingMiddleware, exporters=exporters)
+    # Admission control runs before everything except CORS, so 429s are cheap but still readable by browsers
+    if settings.rate_limiting:
+        app.state.rate_limiter = rate_limit.RateLimiter(
+            {
+                rate_limit.READS: settings.rate_limit_reads,
+                rate_limit.WRITES: settings.rate_limit_writes,
+                rate_limit.BARCODE: settings.rate_limit_barcode,
+                rate_limit.LOGIN: settings.rate_limit_login,
+            },
+            settings.max_concurrent_writes,
+            rate_limit.SQLiteBucketStore(settings.rate_limit_path) if settings.rate_limit_path else None
+        )
+        app.add_middleware(rate_limit.RateLimitMiddleware, limiter=app.state.rate_limiter)
+    else:
+        app.state.rate_limiter = None
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=list(settings.cors_origins),
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    # Serve static files
+    if settings.frontend_dir:
+        app.mount("/static", StaticFiles(directory=settings.frontend_dir, check_dir=False), name="static")
+
+    app.include_router(router)
+    return app
+
 # === Authentication Endpoint ===
-@app.post("/token", response_model=auth.Token)
+@router.post("/token", response_model=auth.Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     user = db.query(models.User).filter(models.User.username == form_data.username).first()
     if not user or not auth.verify_password(form_data.password, user.hashed_password):
@@ -96,11 +211,11 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
-@app.get("/users/me", response_model=schemas.User)
+@router.get("/users/me", response_model=schemas.User)
 async def read_users_me(current_user: models.User = Depends(auth.get_current_user)):
     return current_user
 
-@app.put("/users/me", response_model=schemas.User)
+@router.put("/users/me", response_model=schemas.User)
 async def update_user_me(user_update: schemas.UserUpdate, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user)):
     # Update fields
     if user_update.display_name is not None:
@@ -122,53 +237,178 @@ async def update_user_me(user_update: schemas.UserUpdate, db: Session = Depends(
 
 # === Protected Endpoints ===
 
+# Fields that feed the stored prediction columns
+PREDICTION_INPUT_FIELDS = {"current_quantity", "usage_rate", "usage_period", "acquisition_difficulty"}
+
+def get_ml_predictor(request: Request) -> MLPredictor:
+    """The usage predictor chosen by ``Settings.ml_predictor``."""
+    return request.app.state.ml_predictor
+
+def refresh_item_prediction(db_item: models.Item, predictor: MLPredictor):
+    """Recompute the stored prediction columns for one item."""
+    fields = predict_item_fields(
+        predictor,
+        usage_tracker.get_history_as_list(db_item.quantity_history),
+        db_item.current_quantity,
+        db_item.acquisition_difficulty,
+        db_item.usage_rate,
+        db_item.usage_period
+    )
+    for key, value in fields.items():
+        setattr(db_item, key, value)
+
 # Items Endpoints
-@app.get("/items", response_model=List[schemas.Item])
-def read_items(db: Session = Depends(get_db), current_user: auth.User = Depends(auth.get_current_user)):
-    return db.query(models.Item).all()
+@router.get("/items", response_model=List[schemas.Item])
+def read_items(request: Request, db: Session = Depends(get_db), current_user: auth.User = Depends(auth.get_current_user)):
+    headers, not_modified = versioning.conditional_headers(request, db, (versioning.ITEMS, versioning.CATEGORIES))
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    
+    # Validated once and serialized by pydantic-core (see serialization.py);
+    # categories are loaded in one extra query instead of one per item
+    query = db.query(models.Item).options(selectinload(models.Item.category))
+    return cached_json_response(
+        request, headers, lambda: serialization.dump_orm_list(schemas.Item, query.all())
+    )
+
+@router.get("/items/search", response_model=List[schemas.Item])
+def search_items(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+    current_user: auth.User = Depends(auth.get_current_user)
+):
+    """Ranked prefix search over name, notes, barcode and category (accent-insensitive)."""
+    items, total = search.search_items(db, q, limit=limit, offset=offset)
+    response.headers["X-Total-Count"] = str(total)
+    return items
 
-@app.get("/items/{item_id}", response_model=schemas.Item)
+@router.get("/items/by-barcode/{code}", response_model=schemas.Item)
+def read_item_by_barcode(code: str, db: Session = Depends(get_db), current_user: auth.User = Depends(auth.get_current_user)):
+    """Look an item up by barcode (any common formatting of the same code)."""
+    db_item = barcodes.find_item_by_barcode(db, code)
+    if not db_item:
+        raise HTTPException(status_code=404, detail="Item not found")
+    return db_item
+
+def ensure_barcode_available(db: Session, barcode: Optional[str], item_id: Optional[int] = None):
+    """Raise 409 if another item already uses this barcode."""
+    owner = barcodes.find_item_by_barcode(db, barcode)
+    if owner is not None and owner.id != item_id:
+        raise HTTPException(status_code=409, detail=f"Barcode already used by item {owner.id} ({owner.name})")
+
+@router.get("/items/{item_id}", response_model=schemas.Item)
 def read_item(item_id: int, db: Session = Depends(get_db), current_user: auth.User = Depends(auth.get_current_user)):
     db_item = db.query(models.Item).filter(models.Item.id == item_id).first()
     if not db_item:
         raise HTTPException(status_code=404, detail="Item not found")
     return db_item
 
-@app.post("/items", response_model=schemas.Item)
-def create_item(item: schemas.ItemCreate, db: Session = Depends(get_db), current_user: auth.User = Depends(auth.get_current_user)):
+@router.post("/items", response_model=schemas.Item)
+def create_item(item: schemas.ItemCreate, db: Session = Depends(get_db), predictor: MLPredictor = Depends(get_ml_predictor), current_user: auth.User = Depends(auth.get_current_user)):
+    ensure_barcode_available(db, item.barcode)
     db_item = models.Item(**item.model_dump())
+    refresh_item_prediction(db_item, predictor)
     db.add(db_item)
+    versioning.bump_version(db, versioning.ITEMS)
     db.commit()
     db.refresh(db_item)
     return db_item
 
-@app.put("/items/{item_id}", response_model=schemas.Item)
-async def update_item(item_id: int, item_update: schemas.ItemUpdate, db: Session = Depends(get_db), current_user: auth.User = Depends(auth.get_current_user)):
-    from .sms_service import send_sms, calculate_suggested_quantity, format_low_stock_message
+def record_quantity_change(db: Session, db_item: models.Item, new_qty: float):
+    """
+    Set the item's quantity, tracking the change for ML learning and the
+    consumption rollups (no commit).
+    """
+    if db_item.current_quantity != new_qty:
+        db_item.quantity_history = usage_tracker.add_quantity_record(
+            db_item.quantity_history,
+            db_item.current_quantity,
+            new_qty
+        )
+        db_item.last_checked_at = datetime.utcnow()
+        analytics.record_change(db, db_item.id, db_item.category_id, new_qty - (db_item.current_quantity or 0.0))
+    db_item.current_quantity = new_qty
+
+def coalesced_quantity_update(item_id: int, new_qty: float, predictor: MLPredictor):
+    """
+    (apply, finish) pair for the write coalescer: the same change as
+    ``update_item`` makes for a quantity-only update. The result is
+    (previous quantity, serialized item), or None if the item is gone.
+    """
+    def apply(db: Session):
+        db_item = db.query(models.Item).filter(models.Item.id == item_id).first()
+        if not db_item:
+            return None
+        old_qty = db_item.current_quantity
+        record_quantity_change(db, db_item, new_qty)
+        refresh_item_prediction(db_item, predictor)
+        return old_qty, db_item
+
+    def finish(applied):
+        if applied is None:
+            return None
+        old_qty, db_item = applied
+        return old_qty, schemas.Item.model_validate(db_item, from_attributes=True)
+
+    return apply, finish
+
+@router.put("/items/{item_id}", response_model=schemas.Item)
+async def update_item(item_id: int, item_update: schemas.ItemUpdate, request: Request, db: Session = Depends(get_db), current_user: auth.User = Depends(auth.get_current_user)):
+    update_data = item_update.model_dump(exclude_unset=True)
+    predictor = request.app.state.ml_predictor
+    
+    # Quantity-only updates (stock counts) are group-committed with concurrent ones
+    coalescer = request.app.state.write_coalescer
+    if coalescer is not None and update_data.keys() == {"current_quantity"}:
+        # These skip the concurrent-write cap, so don't hold a pooled connection while waiting
+        db.close()
+        with tracing.span("WriteCoalescer.submit"):
+            outcome = await coalescer.submit(*coalesced_quantity_update(item_id, update_data["current_quantity"], predictor))
+        if outcome is None:
+            raise HTTPException(status_code=404, detail="Item not found")
+        old_qty, item = outcome
+        if item.current_quantity < item.minimum_quantity <= old_qty:
+            db_item = db.query(models.Item).filter(models.Item.id == item_id).first()
+            if db_item:
+                await notify_low_stock(db, db_item, old_qty, current_user)
+        return item
+    
+    # Only updates that are not coalesced count against the concurrent-write cap
+    if not rate_limit.acquire_write_slot(request):
+        db.close()
+        raise HTTPException(status_code=429, detail=rate_limit.BUSY, headers={"Retry-After": "1"})
     
     db_item = db.query(models.Item).filter(models.Item.id == item_id).first()
     if not db_item:
         raise HTTPException(status_code=404, detail="Item not found")
     
-    update_data = item_update.model_dump(exclude_unset=True)
+    if update_data.get("barcode"):
+        ensure_barcode_available(db, update_data["barcode"], item_id)
     old_qty = db_item.current_quantity
     
-    # Track quantity changes for ML learning
     if "current_quantity" in update_data:
-        new_qty = update_data["current_quantity"]
-        if old_qty != new_qty:
-            db_item.quantity_history = usage_tracker.add_quantity_record(
-                db_item.quantity_history,
-                old_qty,
-                new_qty
-            )
+        record_quantity_change(db, db_item, update_data["current_quantity"])
     
     for key, value in update_data.items():
         setattr(db_item, key, value)
     
+    if PREDICTION_INPUT_FIELDS & update_data.keys():
+        refresh_item_prediction(db_item, predictor)
+    
+    versioning.bump_version(db, versioning.ITEMS)
     db.commit()
     db.refresh(db_item)
     
+    await notify_low_stock(db, db_item, old_qty, current_user)
+    return db_item
+
+async def notify_low_stock(db: Session, db_item: models.Item, old_qty: float, current_user: models.User):
+    """Text the user when an update takes the item below its minimum."""
+    from .sms_service import send_sms, calculate_suggested_quantity, format_low_stock_message
+    
     # Check if item dropped below minimum and send SMS
     new_qty = db_item.current_quantity
     if new_qty < db_item.minimum_quantity and old_qty >= db_item.minimum_quantity:
@@ -202,25 +442,33 @@ async def update_item(item_id: int, item_update: schemas.ItemUpdate, db: Session
                 sms_sent = await send_sms(user_phone, message, item_id=db_item.id)
                 if sms_sent:
                     db_item.last_sms_sent_at = datetime.utcnow()
+                    versioning.bump_version(db, versioning.ITEMS)
                     db.commit()
-    
-    return db_item
 
-@app.delete("/items/{item_id}")
+@router.delete("/items/{item_id}")
 def delete_item(item_id: int, db: Session = Depends(get_db), current_user: auth.User = Depends(auth.get_current_user)):
     db_item = db.query(models.Item).filter(models.Item.id == item_id).first()
     if not db_item:
         raise HTTPException(status_code=404, detail="Item not found")
     db.delete(db_item)
+    # Ids can be reused: the item's rollups go, its category keeps the totals
+    analytics.forget_item(db, item_id, from_categories=False)
+    versioning.bump_version(db, versioning.ITEMS)
     db.commit()
     return {"message": "Item deleted"}
 
 # Categories Endpoints
-@app.get("/categories", response_model=List[schemas.Category])
-def read_categories(db: Session = Depends(get_db), current_user: auth.User = Depends(auth.get_current_user)):
-    return db.query(models.Category).all()
+@router.get("/categories", response_model=List[schemas.Category])
+def read_categories(request: Request, db: Session = Depends(get_db), current_user: auth.User = Depends(auth.get_current_user)):
+    headers, not_modified = versioning.conditional_headers(request, db, (versioning.CATEGORIES,))
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    
+    return cached_json_response(
+        request, headers, lambda: serialization.dump_orm_list(schemas.Category, db.query(models.Category).all())
+    )
 
-@app.post("/categories", response_model=schemas.Category)
+@router.post("/categories", response_model=schemas.Category)
 def create_category(category: schemas.CategoryCreate, db: Session = Depends(get_db), current_user: auth.User = Depends(auth.get_current_user)):
     # Check if exists
     if db.query(models.Category).filter(models.Category.name == category.name).first():
@@ -228,13 +476,14 @@ def create_category(category: schemas.CategoryCreate, db: Session = Depends(get_
     
     db_category = models.Category(**category.model_dump())
     db.add(db_category)
+    versioning.bump_version(db, versioning.CATEGORIES)
     db.commit()
     db.refresh(db_category)
     return db_category
 
 # Purchase Prediction Endpoint
-@app.get("/items/{item_id}/purchase-prediction", response_model=schemas.PurchasePrediction)
-def get_purchase_prediction(item_id: int, db: Session = Depends(get_db), current_user: auth.User = Depends(auth.get_current_user)):
+@router.get("/items/{item_id}/purchase-prediction", response_model=schemas.PurchasePrediction)
+def get_purchase_prediction(item_id: int, db: Session = Depends(get_db), predictor: MLPredictor = Depends(get_ml_predictor), current_user: auth.User = Depends(auth.get_current_user)):
     """Calculate when item needs to be purchased based on usage patterns."""
     item = db.query(models.Item).filter(models.Item.id == item_id).first()
     if not item:
@@ -242,8 +491,9 @@ def get_purchase_prediction(item_id: int, db: Session = Depends(get_db), current
     
     # Try ML prediction first
     history = usage_tracker.get_history_as_list(item.quantity_history)
-    ml_usage_rate = ml_predictor.predict_usage_rate(history)
-    confidence = ml_predictor.get_prediction_confidence(history)
+    prediction = predictor.fit(history)
+    ml_usage_rate = prediction.rate if prediction else None
+    confidence = prediction.confidence if prediction else 0.0
     
     needs_tracking = ml_usage_rate is None and item.usage_rate is None
     
@@ -283,15 +533,28 @@ def get_purchase_prediction(item_id: int, db: Session = Depends(get_db), current
     )
 
 # Shopping List Endpoint
-@app.get("/shopping-list", response_model=List[schemas.ShoppingListItem])
-def get_shopping_list(db: Session = Depends(get_db), current_user: auth.User = Depends(auth.get_current_user)):
-    items = db.query(models.Item).filter(models.Item.current_quantity < models.Item.minimum_quantity).all()
+@router.get("/shopping-list", response_model=List[schemas.ShoppingListItem])
+def get_shopping_list(request: Request, db: Session = Depends(get_db), current_user: auth.User = Depends(auth.get_current_user)):
+    # purchase_by is relative to today, so the validators roll over daily
+    headers, not_modified = versioning.conditional_headers(
+        request, db, (versioning.ITEMS,), salt=datetime.utcnow().date().isoformat()
+    )
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    
+    # Rows are built here with the ShoppingListItem fields, so skip re-validation
+    return cached_json_response(
+        request, headers, lambda: serialization.dump_json(build_shopping_list(db, request.app.state.ml_predictor))
+    )
+
+def build_shopping_list(db: Session, predictor: MLPredictor) -> List[dict]:
+    items = db.query(models.Item).filter(models.Item.is_low_stock.is_(True)).all()
     shopping_list = []
     
     for item in items:
         # Get prediction data
         history = usage_tracker.get_history_as_list(item.quantity_history)
-        ml_usage_rate = ml_predictor.predict_usage_rate(history)
+        ml_usage_rate = predictor.predict_usage_rate(history)
         
         if ml_usage_rate is not None:
             daily_usage = ml_usage_rate
@@ -324,14 +587,186 @@ def get_shopping_list(db: Session = Depends(get_db), current_user: auth.User = D
     
     return shopping_list
 
+# Consumption analytics (see analytics.py)
+@router.get("/analytics/consumption", response_model=List[schemas.ConsumptionPoint])
+def get_consumption(
+    request: Request,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    granularity: str = Query("day", pattern="^(day|week|month)$"),
+    group_by: str = Query("category", pattern="^(category|item|total)$"),
+    category_id: Optional[int] = None,
+    item_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: auth.User = Depends(auth.get_current_user)
+):
+    """Consumed and restocked quantity per day, week or month (default: the last 30 days)."""
+    start, end = analytics.default_range(start, end)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if (end - start).days > analytics.MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range is limited to {analytics.MAX_RANGE_DAYS} days")
+    
+    # Rollups change only with item writes; the default range also moves daily
+    headers, not_modified = versioning.conditional_headers(
+        request, db, (versioning.ITEMS,), salt=datetime.utcnow().date().isoformat()
+    )
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    
+    return cached_json_response(request, headers, lambda: serialization.dump_json(analytics.consumption(
+        db, start, end, granularity, group_by, category_id=category_id, item_id=item_id
+    )))
+
+# CSV bulk import
+MAX_CSV_IMPORT_BYTES = 10 * 1024 * 1024
+
+@router.post("/items/import-csv", response_model=schemas.CsvImportResult)
+async def import_items_csv(
+    request: Request,
+    dry_run: bool = False,
+    create_categories: bool = True,
+    db: Session = Depends(get_db),
+    current_user: auth.User = Depends(auth.get_current_user)
+):
+    """Create/update items from a CSV body (text/csv); dry_run returns the diff only."""
+    body = await request.body()
+    if len(body) > MAX_CSV_IMPORT_BYTES:
+        raise HTTPException(status_code=413, detail="CSV too large")
+    try:
+        text = body.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        text = body.decode("latin-1")  # Spreadsheets exported on Windows
+    
+    return await run_in_threadpool(
+        csv_import.import_csv, db, text, dry_run=dry_run, create_categories=create_categories
+    )
+
+# Export / import (NDJSON)
+@router.get("/export")
+def export_inventory(request: Request, compress: Optional[str] = None, current_user: auth.User = Depends(auth.get_current_user)):
+    """Stream categories, items and history as NDJSON (compress=gzip for .ndjson.gz)."""
+    gzip = compress == "gzip"
+    filename = "inventory.ndjson.gz" if gzip else "inventory.ndjson"
+    
+    def stream():
+        # Own session: the response outlives the request's dependencies
+        with database.app_session(request.app) as db:
+            yield from transfer.iter_export_chunks(db, compress=gzip)
+    
+    return StreamingResponse(
+        stream(),
+        media_type="application/gzip" if gzip else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.post("/import")
+async def import_inventory(request: Request, current_user: auth.User = Depends(auth.get_current_user)):
+    """Import an NDJSON (optionally gzipped) export, upserting in batched transactions."""
+    importer = transfer.NDJSONImporter()
+    gzip = True if request.headers.get("content-encoding") == "gzip" else None
+    with database.app_session(request.app) as db:
+        try:
+            async for batch in transfer.iter_line_batches(request.stream(), gzip=gzip):
+                await run_in_threadpool(importer.apply_batch, db, batch)
+        except (ValueError, zlib.error) as e:
+            raise HTTPException(status_code=400, detail=f"Import stopped: {e}. Summary: {importer.summary()}")
+        except SQLAlchemyError as e:
+            # The failed batch was rolled back; earlier batches stay committed
+            raise HTTPException(
+                status_code=409,
+                detail=f"Import stopped: database error ({type(e).__name__}), batch rolled back. Summary: {importer.summary()}"
+            )
+    return importer.summary()
+
+# Prometheus metrics (see metrics.py)
+@router.get("/metrics", include_in_schema=False)
+def read_metrics(request: Request):
+    settings = request.app.state.settings
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if settings.metrics_token and not hmac.compare_digest(
+        request.headers.get("authorization", ""), f"Bearer {settings.metrics_token}"
+    ):
+        raise HTTPException(status_code=401, detail="Invalid metrics token", headers={"WWW-Authenticate": "Bearer"})
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+# Request profiles (see request_profiling.py)
+@router.get("/admin/profiles")
+def list_profiles(request: Request, current_user: auth.User = Depends(auth.get_current_admin)):
+    return request.app.state.profile_store.list()
+
+@router.get("/admin/profiles/{name}")
+def download_profile(name: str, request: Request, current_user: auth.User = Depends(auth.get_current_admin)):
+    path = request.app.state.profile_store.path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, filename=name, media_type="application/octet-stream")
+
+# Recent request traces (see tracing.py), as an OTLP/JSON document
+@router.get("/admin/traces")
+def list_traces(
+    request: Request,
+    limit: int = Query(20, ge=1, le=500),
+    min_duration_ms: float = Query(0.0, ge=0),
+    trace_id: Optional[str] = None,
+    current_user: auth.User = Depends(auth.get_current_admin)
+):
+    traces = request.app.state.trace_buffer.traces(limit, min_duration_ms, trace_id)
+    return tracing.to_otlp(traces)
+
+# Live change stream (Server-Sent Events)
+@router.get("/events")
+async def stream_events(
+    last_event_id: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    current_user: auth.User = Depends(auth.get_current_user)
+):
+    """
+    Push item/category changes and low-stock transitions as they commit.
+    See events.py for the event types.
+    """
+    # Streams stay open for hours; don't pin a pooled connection to each one
+    db.close()
+    try:
+        resume_from = int(last_event_id) if last_event_id else None
+    except ValueError:
+        resume_from = None
+    subscription = events.broker.subscribe(last_event_id=resume_from)
+    return StreamingResponse(
+        events.sse_stream(subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # Barcode identification endpoint 
-@app.post("/barcode/identify", response_model=schemas.BarcodeIdentifyResponse)
-async def identify_barcode(request: schemas.BarcodeIdentifyRequest, current_user: auth.User = Depends(auth.get_current_user)):
-    """Identify product from barcode image using Gemini AI."""
+@router.post("/barcode/identify", response_model=schemas.BarcodeIdentifyResponse)
+async def identify_barcode(request: schemas.BarcodeIdentifyRequest, db: Session = Depends(get_db), current_user: auth.User = Depends(auth.get_current_user)):
+    """
+    Identify a product. A barcode we already stock resolves from the
+    inventory index with no image processing or Gemini call; anything else
+    is identified from the image using Gemini AI.
+    """
+    known = barcodes.find_item_by_barcode(db, request.barcode)
+    if known:
+        return schemas.BarcodeIdentifyResponse(
+            success=True,
+            product_name=known.name,
+            suggested_category=known.category.name if known.category else None,
+            suggested_unit=known.unit,
+            barcode=known.barcode,
+            item_id=known.id
+        )
+    if not request.image_base64:
+        return schemas.BarcodeIdentifyResponse(success=False, barcode=request.barcode, error="Barcode not found in inventory")
+    
     try:
         from .barcode_service import BarcodeService
         service = BarcodeService()
         result = await service.identify_product(request.image_base64)
+        if result.success and result.barcode:
+            known = barcodes.find_item_by_barcode(db, result.barcode)
+            result.item_id = known.id if known else None
         return result
     except ImportError:
         return schemas.BarcodeIdentifyResponse(
@@ -345,33 +780,60 @@ async def identify_barcode(request: schemas.BarcodeIdentifyRequest, current_user
         )
 
 # Items needing attention (for notifications)
-@app.get("/items/alerts/needed")
-def get_items_needing_attention(db: Session = Depends(get_db), current_user: auth.User = Depends(auth.get_current_user)):
+@router.get("/items/alerts/needed")
+def get_items_needing_attention(request: Request, db: Session = Depends(get_db), current_user: auth.User = Depends(auth.get_current_user)):
     """Get items that need quantity check or are running low."""
-    items = db.query(models.Item).all()
-    alerts = []
+    # Check reminders are day-granular, so an hourly bucket is fresh enough
+    headers, not_modified = versioning.conditional_headers(
+        request, db, (versioning.ITEMS,), salt=datetime.utcnow().strftime("%Y-%m-%dT%H")
+    )
+    if not_modified:
+        return Response(status_code=304, headers=headers)
     
-    for item in items:
-        # Check if needs quantity update
-        needs_check = usage_tracker.needs_check_reminder(item.quantity_history)
-        
-        # Check stock level
-        is_low = item.current_quantity < item.minimum_quantity
-        is_critical = item.current_quantity <= 0
-        
-        if needs_check or is_low:
-            alerts.append({
-                "id": item.id,
-                "name": item.name,
-                "needs_quantity_check": needs_check,
-                "is_low_stock": is_low,
-                "is_critical": is_critical,
-                "current_quantity": item.current_quantity,
-                "unit": item.unit
-            })
+    return cached_json_response(
+        request, headers, lambda: serialization.dump_json(build_attention_alerts(db))
+    )
+
+def build_attention_alerts(db: Session) -> List[dict]:
+    # Same rule as UsageTracker.needs_check_reminder, evaluated in SQL
+    check_cutoff = datetime.utcnow() - timedelta(days=CHECK_REMINDER_DAYS)
+    needs_check = or_(
+        models.Item.last_checked_at.is_(None),
+        models.Item.last_checked_at <= check_cutoff
+    )
+    rows = db.query(
+        models.Item.id,
+        models.Item.name,
+        models.Item.current_quantity,
+        models.Item.unit,
+        models.Item.is_low_stock,
+        needs_check.label("needs_check")
+    ).filter(or_(models.Item.is_low_stock.is_(True), needs_check)).all()
     
-    return alerts
+    return [
+        {
+            "id": row.id,
+            "name": row.name,
+            "needs_quantity_check": bool(row.needs_check),
+            "is_low_stock": bool(row.is_low_stock),
+            "is_critical": row.current_quantity <= 0,
+            "current_quantity": row.current_quantity,
+            "unit": row.unit
+        }
+        for row in rows
+    ]
+
+def create_app_from_env() -> FastAPI:
+    """
+    Entrypoint factory: loads .env, then builds the app from the environment.
+    ``uvicorn backend.main:create_app_from_env --factory``
+    """
+    load_env_file()
+    return create_app(Settings.from_env())
+
+# Built from the process environment only; .env is read by the entrypoints
+app = create_app()
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run(create_app_from_env(), host="0.0.0.0", port=8000)
@@ -0,0 +1,457 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+Collectors are plain counters, gauges and histograms keyed by label
+values; each holds one lock around O(1) dictionary updates, so recording
+costs about a microsecond and never blocks on I/O.
+
+Multiple workers: when ``METRICS_DIR`` is set, each process writes a JSON
+snapshot of its collectors to ``<dir>/<pid>.json`` (at most every
+``FLUSH_INTERVAL`` seconds from a background thread, and on shutdown).
+``/metrics`` in any worker
+merges all snapshots: counters and histograms are summed; gauges are
+summed over live processes only. Snapshots of exited workers are folded
+into ``<dir>/archive.json`` and removed, so the directory holds one file
+per live worker and totals never go backwards.
+"""
+import bisect
+import contextvars
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+from fastapi.exceptions import RequestValidationError
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 5.0
+# Counters and histograms of exited workers (see Registry.collect)
+ARCHIVE_FILE = "archive.json"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+EXTERNAL_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), registry: "Registry" = None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _key(self, labels: Sequence) -> Tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        return tuple(str(v) for v in labels)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            values = [[list(k), v if not isinstance(v, list) else list(v)] for k, v in self._values.items()]
+        return {"kind": self.kind, "help": self.help, "labelnames": list(self.labelnames), "values": values}
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1.0):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, *labels, amount: float = 1.0):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, *labels, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def value(self, *labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+
+class Histogram(Metric):
+    """Values are [per-bucket counts..., +Inf count, sum] (non-cumulative)."""
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets: Sequence[float] = LATENCY_BUCKETS, registry=None):
+        super().__init__(name, help, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def count(self, *labels) -> int:
+        counts = self._values.get(self._key(labels))
+        return sum(counts[:-1]) if counts else 0
+
+    def snapshot(self) -> dict:
+        data = super().snapshot()
+        data["buckets"] = list(self.buckets)
+        return data
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self.shared_dir: Optional[str] = None
+        self._last_flush = 0.0
+        self._flush_lock = threading.Lock()
+
+    def register(self, metric: Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+
+    def snapshot(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "metrics": {name: metric.snapshot() for name, metric in self._metrics.items()}
+        }
+
+    def clear(self):
+        for metric in self._metrics.values():
+            metric.clear()
+
+    # Multi-worker aggregation
+
+    def configure(self, shared_dir: Optional[str]):
+        self.shared_dir = shared_dir
+        if shared_dir:
+            os.makedirs(shared_dir, exist_ok=True)
+
+    def flush(self):
+        """Write this process' snapshot to the shared directory (atomic)."""
+        if not self.shared_dir:
+            return
+        self._last_flush = time.monotonic()
+        path = os.path.join(self.shared_dir, f"{os.getpid()}.json")
+        tmp = f"{path}.tmp"
+        # A background flush and the shutdown/collect flush share the tmp file
+        with self._flush_lock:
+            try:
+                with open(tmp, "w") as f:
+                    json.dump(self.snapshot(), f)
+                os.replace(tmp, path)
+            except OSError as e:
+                logger.warning(f"Could not write metrics snapshot: {e}")
+
+    def maybe_flush(self):
+        """
+        Periodic flush from the request path. The write runs on a background
+        thread so the event loop never waits on the file system.
+        """
+        if self.shared_dir and time.monotonic() - self._last_flush >= FLUSH_INTERVAL:
+            self._last_flush = time.monotonic()
+            threading.Thread(target=self.flush, name="metrics-flush", daemon=True).start()
+
+    def collect(self) -> dict:
+        """This process' metrics, merged with other workers' when shared."""
+        if not self.shared_dir:
+            return self.snapshot()["metrics"]
+        self.flush()
+        archive_path = os.path.join(self.shared_dir, ARCHIVE_FILE)
+        snapshots, dead = [], []
+        for path in glob.glob(os.path.join(self.shared_dir, "*.json")):
+            if path == archive_path:
+                continue
+            snapshot = _read_snapshot(path)
+            if snapshot is None:
+                continue  # Being replaced or removed
+            if _pid_alive(snapshot.get("pid", -1)):
+                snapshots.append(snapshot)
+            else:
+                dead.append(path)
+        if dead:
+            self._archive(dead)
+        archive = _read_snapshot(archive_path)
+        if archive is not None:
+            snapshots.append(archive)
+        return merge_snapshots(snapshots)
+
+    def _archive(self, paths: List[str]):
+        """Fold exited workers' snapshots into the archive and remove them."""
+        archive_path = os.path.join(self.shared_dir, ARCHIVE_FILE)
+        try:
+            with open(os.path.join(self.shared_dir, "archive.lock"), "w") as lock:
+                # Workers may collect at the same time: fold each file exactly once
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                snapshots = [s for s in [_read_snapshot(archive_path)] if s is not None]
+                folded = []
+                for path in paths:
+                    snapshot = _read_snapshot(path)
+                    if snapshot is not None:
+                        snapshots.append(snapshot)
+                        folded.append(path)
+                if not folded:
+                    return
+                tmp = f"{archive_path}.tmp"
+                with open(tmp, "w") as f:
+                    json.dump({"archived": True, "metrics": merge_snapshots(snapshots)}, f)
+                os.replace(tmp, archive_path)
+                for path in folded:
+                    os.remove(path)
+        except OSError as e:
+            logger.warning(f"Could not archive metrics snapshots: {e}")
+
+    def render(self) -> str:
+        return render(self.collect())
+
+
+def _read_snapshot(path: str) -> Optional[dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _pid_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def merge_snapshots(snapshots: List[dict]) -> dict:
+    merged: Dict[str, dict] = {}
+    for snapshot in snapshots:
+        alive = not snapshot.get("archived") and _pid_alive(snapshot.get("pid", -1))
+        for name, data in snapshot["metrics"].items():
+            if data["kind"] == "gauge" and not alive:
+                continue
+            target = merged.setdefault(name, {**data, "values": {}})
+            values = target["values"]
+            for labels, value in data["values"]:
+                key = tuple(labels)
+                if isinstance(value, list):
+                    current = values.get(key)
+                    values[key] = [a + b for a, b in zip(current, value)] if current else list(value)
+                else:
+                    values[key] = values.get(key, 0.0) + value
+    for data in merged.values():
+        data["values"] = [[list(k), v] for k, v in data["values"].items()]
+    return merged
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def render(metrics: dict) -> str:
+    """Prometheus text format (version 0.0.4)."""
+    lines = []
+    for name in sorted(metrics):
+        data = metrics[name]
+        lines.append(f"# HELP {name} {data['help']}")
+        lines.append(f"# TYPE {name} {data['kind']}")
+        names = data["labelnames"]
+        for labels, value in sorted(data["values"], key=lambda v: v[0]):
+            if data["kind"] != "histogram":
+                lines.append(f"{name}{_labels(names, labels)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(data["buckets"] + ["+Inf"], value[:-1]):
+                cumulative += count
+                le = bound if bound == "+Inf" else _number(bound)
+                bucket_labels = _labels(names, labels, 'le="%s"' % le)
+                lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{name}_sum{_labels(names, labels)} {repr(float(value[-1]))}")
+            lines.append(f"{name}_count{_labels(names, labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# HTTP
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+HTTP_DURATION = Histogram(
+    "http_request_duration_seconds", "Time until the response starts, by route", ("method", "route")
+)
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "Requests being handled, by route", ("method", "route"))
+
+# Database
+DB_QUERIES = Counter("db_queries_total", "SQL statements executed, by verb", ("verb",))
+DB_QUERY_DURATION = Histogram("db_query_duration_seconds", "SQL statement duration", ("verb",), buckets=DB_BUCKETS)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request", "SQL statements per request, by route", ("route",), buckets=COUNT_BUCKETS
+)
+DB_TIME_PER_REQUEST = Histogram(
+    "db_time_per_request_seconds", "Total SQL time per request, by route", ("route",), buckets=DB_BUCKETS
+)
+
+# Domain
+ML_FITS = Counter("ml_fits_total", "Usage model fits, by outcome (fitted, insufficient_data, error)", ("outcome",))
+ML_FIT_DURATION = Histogram("ml_fit_duration_seconds", "Usage model fit duration", buckets=DB_BUCKETS)
+SMS_SENDS = Counter("sms_send_total", "SMS send attempts, by outcome (sent, failed, error, rate_limited)", ("outcome",))
+SMS_DURATION = Histogram("sms_send_duration_seconds", "Textbelt call latency", buckets=EXTERNAL_BUCKETS)
+GEMINI_CALLS = Counter("gemini_requests_total", "Gemini product identification calls, by outcome", ("outcome",))
+GEMINI_DURATION = Histogram("gemini_request_duration_seconds", "Gemini call latency", buckets=EXTERNAL_BUCKETS)
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total",
+    "Cache lookups (cache=response: hit/shared_hit/miss; cache=conditional: not_modified/modified)",
+    ("cache", "result")
+)
+COALESCED_BATCH_SIZE = Histogram(
+    "write_coalescer_batch_size", "Writes committed together by the write coalescer", buckets=COUNT_BUCKETS
+)
+RATE_LIMITED = Counter(
+    "rate_limited_requests_total",
+    "Requests rejected with 429, by route class and reason (rate, concurrency)",
+    ("route_class", "reason")
+)
+
+
+# Per-request DB accounting
+
+class RequestStats:
+    """
+    SQL issued during one request. A single instance per request is shared
+    by the route metrics and the SQL profiler (profiler.QueryProfile
+    extends it), whichever starts first.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+    def record(self, statement: str, elapsed: float):
+        self.queries += 1
+        self.db_time += elapsed
+
+
+current_request_stats: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar(
+    "current_request_stats", default=None
+)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_start = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_query_start", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+    DB_QUERIES.inc(verb)
+    DB_QUERY_DURATION.observe(elapsed, verb)
+    stats = current_request_stats.get()
+    if stats is not None:
+        stats.record(statement, elapsed)
+
+
+class InstrumentedRoute(APIRoute):
+    """
+    APIRoute that records latency, status, in-flight requests and DB usage
+    under the route's path template (bounded label cardinality).
+    """
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        route = self.path_format
+
+        async def instrumented_handler(request):
+            method = request.method
+            # Reuse the profiler's stats when it is running; count this handler's share
+            stats = current_request_stats.get()
+            token = None
+            if stats is None:
+                stats = RequestStats()
+                token = current_request_stats.set(stats)
+            queries_before, db_time_before = stats.queries, stats.db_time
+            HTTP_IN_FLIGHT.inc(method, route)
+            status = "500"
+            start = time.perf_counter()
+            try:
+                response = await handler(request)
+                status = str(response.status_code)
+                return response
+            except HTTPException as e:
+                status = str(e.status_code)
+                raise
+            except RequestValidationError:
+                status = "422"
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                if token is not None:
+                    current_request_stats.reset(token)
+                HTTP_IN_FLIGHT.dec(method, route)
+                HTTP_REQUESTS.inc(method, route, status)
+                HTTP_DURATION.observe(elapsed, method, route)
+                DB_QUERIES_PER_REQUEST.observe(stats.queries - queries_before, route)
+                DB_TIME_PER_REQUEST.observe(stats.db_time - db_time_before, route)
+                REGISTRY.maybe_flush()
+
+        return instrumented_handler
@@ -1,17 +1,26 @@
 """
-ML-based usage prediction module using scikit-learn.
+ML-based usage prediction module using linear regression.
 Provides accurate predictions for when items need to be purchased.
+The regression itself is delegated to a pluggable backend (see regression.py).
+
+Two predictors, chosen per deployment with ``Settings.ml_predictor``
+(ML_PREDICTOR, see get_predictor):
+- ``linear`` (MLPredictor): one regression over all quantities
+- ``segmented`` (SegmentedPredictor): consumption slope within the
+  stretches between restocks, weighted towards recent data
 """
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict
-import json
+import logging
+import math
+import os
+
+logger = logging.getLogger(__name__)
 
-try:
-    from sklearn.linear_model import LinearRegression
-    import numpy as np
-    ML_AVAILABLE = True
-except ImportError:
-    ML_AVAILABLE = False
+from . import metrics, tracing
+from .regression import get_regression_backend
+from .usage_tracker import parse_record_date
 
 
 # Buffer days based on acquisition difficulty
@@ -24,6 +33,9 @@ DIFFICULTY_BUFFER = {
 # Minimum data points required for ML prediction
 MIN_DATA_POINTS = 5
 
+# Recency weighting of SegmentedPredictor: a point's weight halves every this many days
+DEFAULT_HALF_LIFE_DAYS = 60.0
+
 
 def calculate_daily_usage(usage_rate: float, period: str) -> float:
     """
@@ -103,79 +115,132 @@ def calculate_purchase_date(
     return datetime.utcnow() + timedelta(days=purchase_in_days)
 
 
+@dataclass(frozen=True)
+class UsagePrediction:
+    """
+    Immutable result of one regression fit over an item's history.
+    """
+    rate: float        # Predicted daily usage (never negative)
+    intercept: float   # Fitted quantity at the first history date
+    r2: float          # Coefficient of determination of the fit
+    n: int             # Number of data points used
+    confidence: float  # 0-1 score from R² and data quantity
+
+
+def _parse_date(date_str: str) -> datetime:
+    try:
+        return datetime.fromisoformat(date_str.replace("Z", "+00:00"))
+    except ValueError:
+        return datetime.strptime(date_str[:10], "%Y-%m-%d")
+
+
+def parse_history_points(history: List[Dict]) -> List[tuple]:
+    """
+    Convert history records to (days_from_start, quantity) pairs.
+    Daily/weekly aggregates count as one point (their last quantity).
+    Records without a date or quantity are skipped.
+    """
+    data_points = []
+    base_date = None
+    
+    for entry in history:
+        date_str = entry.get("date")
+        quantity = entry.get("quantity")
+        
+        if date_str and quantity is not None:
+            date = _parse_date(date_str)
+            if base_date is None:
+                base_date = date
+            data_points.append(((date - base_date).days, quantity))
+    
+    return data_points
+
+
 class MLPredictor:
     """
     Machine Learning based usage predictor using Linear Regression.
     Learns from historical quantity data to predict daily usage rate.
+    
+    The predictor holds no per-fit state: every call to ``fit`` returns its
+    own ``UsagePrediction``, so one instance can be shared across threads.
     """
     
-    def __init__(self):
-        if ML_AVAILABLE:
-            self.model = LinearRegression()
-        else:
-            self.model = None
+    def __init__(self, backend_name: Optional[str] = None):
+        """
+        Args:
+            backend_name: Regression backend ('numpy', 'python', 'sklearn'
+                          or 'auto'); defaults to the ML_BACKEND env variable
+        """
+        self.backend_name = backend_name
+        self._backend = None
+    
+    @property
+    def backend(self):
+        """Regression backend, resolved on first use (backends are stateless)."""
+        if self._backend is None:
+            self._backend = get_regression_backend(self.backend_name)
+        return self._backend
     
-    def predict_usage_rate(self, history: List[Dict]) -> Optional[float]:
+    @tracing.traced()
+    def fit(self, history: List[Dict]) -> Optional[UsagePrediction]:
         """
-        Predict daily usage rate from historical data.
+        Fit the usage model to an item's history.
         
         Args:
             history: List of dicts with 'date' and 'quantity' keys
         
         Returns:
-            Predicted daily usage rate, or None if insufficient data
+            UsagePrediction, or None if there is insufficient data
         """
-        if not ML_AVAILABLE or not history:
-            return None
-        
-        if len(history) < MIN_DATA_POINTS:
+        if not history or len(history) < MIN_DATA_POINTS:
+            metrics.ML_FITS.inc("insufficient_data")
             return None
         
         try:
-            # Parse dates and quantities
-            data_points = []
-            base_date = None
-            
-            for entry in history:
-                date_str = entry.get("date")
-                quantity = entry.get("quantity")
-                
-                if date_str and quantity is not None:
-                    try:
-                        date = datetime.fromisoformat(date_str.replace("Z", "+00:00"))
-                        if isinstance(date, str):
-                            date = datetime.strptime(date_str[:10], "%Y-%m-%d")
-                    except:
-                        date = datetime.strptime(date_str[:10], "%Y-%m-%d")
-                    
-                    if base_date is None:
-                        base_date = date
-                    
-                    days_from_start = (date - base_date).days
-                    data_points.append((days_from_start, quantity))
-            
+            data_points = parse_history_points(history)
             if len(data_points) < MIN_DATA_POINTS:
+                metrics.ML_FITS.inc("insufficient_data")
                 return None
             
-            # Prepare data for sklearn
-            X = np.array([[dp[0]] for dp in data_points])
-            y = np.array([dp[1] for dp in data_points])
-            
-            # Fit linear regression
-            self.model.fit(X, y)
-            
-            # The negative slope is the usage rate (quantity decreases over time)
-            slope = self.model.coef_[0]
-            
-            # Usage rate is the negative of slope (positive value for consumption)
-            usage_rate = -slope
-            
-            # Ensure non-negative usage rate
-            return max(0.0, usage_rate)
-        
+            tracing.set_attribute("ml.data_points", len(data_points))
+            with metrics.ML_FIT_DURATION.time():
+                fit = self.backend.fit(
+                    [dp[0] for dp in data_points],
+                    [dp[1] for dp in data_points]
+                )
         except Exception as e:
-            print(f"ML prediction error: {e}")
+            logger.warning(f"ML prediction error: {e}")
+            metrics.ML_FITS.inc("error")
             return None
+        metrics.ML_FITS.inc("fitted")
+        
+        # Usage rate is the negative of slope (quantity decreases over time)
+        rate = max(0.0, -fit.slope)
+        
+        # Weight by data quantity (more data = higher confidence)
+        data_factor = min(1.0, len(data_points) / 30)  # Max at 30 days of data
+        confidence = max(0.0, fit.r2 * data_factor)
+        
+        return UsagePrediction(
+            rate=rate,
+            intercept=fit.intercept,
+            r2=fit.r2,
+            n=len(data_points),
+            confidence=confidence
+        )
+    
+    def predict_usage_rate(self, history: List[Dict]) -> Optional[float]:
+        """
+        Predict daily usage rate from historical data.
+        
+        Args:
+            history: List of dicts with 'date' and 'quantity' keys
+        
+        Returns:
+            Predicted daily usage rate, or None if insufficient data
+        """
+        result = self.fit(history)
+        return result.rate if result else None
     
     def get_prediction_confidence(self, history: List[Dict]) -> float:
         """
@@ -185,46 +250,185 @@ class MLPredictor:
         Returns:
             Confidence score between 0 and 1
         """
-        if not ML_AVAILABLE or not history or len(history) < MIN_DATA_POINTS:
-            return 0.0
+        result = self.fit(history)
+        return result.confidence if result else 0.0
+
+
+class SegmentedPredictor(MLPredictor):
+    """
+    Restock-aware usage predictor.
+    
+    A restock (a record with a positive ``change``, or an aggregate with
+    ``restocked``) starts a new segment. The rate is the common slope of
+    all segments, each with its own level (pooled within-segment least
+    squares), so restocks no longer bend the fit. Points are weighted by
+    recency with a half-life of ``half_life_days``.
+    
+    The fit is one streaming pass over the records with constant memory:
+    each segment keeps weighted sums and adds its centered totals when the
+    next one starts. Weights grow with time (2^(t/half-life)) instead of
+    decaying from the newest point, which gives the same fit without
+    knowing the last date in advance. No regression backend is used.
+    """
+    
+    def __init__(self, backend_name: Optional[str] = None, half_life_days: float = DEFAULT_HALF_LIFE_DAYS):
+        """
+        Args:
+            backend_name: Unused (kept so predictors are interchangeable)
+            half_life_days: Age in days at which a point counts half
+        """
+        super().__init__(backend_name)
+        self.half_life_days = half_life_days
+    
+    @tracing.traced()
+    def fit(self, history: List[Dict]) -> Optional[UsagePrediction]:
+        """
+        Fit the segmented usage model to an item's history.
         
-        try:
-            # Same data preparation as predict_usage_rate
-            data_points = []
-            base_date = None
-            
-            for entry in history:
-                date_str = entry.get("date")
-                quantity = entry.get("quantity")
-                
-                if date_str and quantity is not None:
-                    try:
-                        date = datetime.fromisoformat(date_str.replace("Z", "+00:00"))
-                    except:
-                        date = datetime.strptime(date_str[:10], "%Y-%m-%d")
-                    
-                    if base_date is None:
-                        base_date = date
-                    
-                    days_from_start = (date - base_date).days
-                    data_points.append((days_from_start, quantity))
-            
-            if len(data_points) < MIN_DATA_POINTS:
-                return 0.0
-            
-            X = np.array([[dp[0]] for dp in data_points])
-            y = np.array([dp[1] for dp in data_points])
-            
-            self.model.fit(X, y)
-            r2_score = self.model.score(X, y)
+        Args:
+            history: List of dicts with 'date', 'quantity' and 'change' keys
+        
+        Returns:
+            UsagePrediction, or None if fewer than MIN_DATA_POINTS points
+            fall in segments of two or more
+        """
+        if not history or len(history) < MIN_DATA_POINTS:
+            metrics.ML_FITS.inc("insufficient_data")
+            return None
+        
+        with metrics.ML_FIT_DURATION.time():
+            growth = math.log(2) / self.half_life_days
+            origin = None
+            # Pooled centered sums of all closed segments
+            sxx = sxy = syy = 0.0
+            # Current segment: start time, then weighted sums relative to it
+            seg_t0 = 0.0
+            sw = swt = swq = swtt = swtq = swqq = 0.0
+            seg_n = 0
+            used = 0
+            last_mean = None
             
-            # Weight by data quantity (more data = higher confidence)
-            data_factor = min(1.0, len(data_points) / 30)  # Max at 30 days of data
+            def close_segment():
+                nonlocal sxx, sxy, syy, used, last_mean
+                if seg_n >= 2:
+                    sxx += swtt - swt * swt / sw
+                    sxy += swtq - swt * swq / sw
+                    syy += swqq - swq * swq / sw
+                    used += seg_n
+                if seg_n:
+                    last_mean = (seg_t0 + swt / sw, swq / sw)
             
-            return max(0.0, r2_score * data_factor)
+            for record in history:
+                date = parse_record_date(record.get("date"))
+                quantity = record.get("quantity")
+                if date is None or quantity is None:
+                    continue
+                if origin is None:
+                    origin = date
+                t = (date - origin).total_seconds() / 86400
+                restocked = record.get("restocked") if "period" in record else record.get("change")
+                if restocked is not None and restocked > 0 and seg_n:
+                    close_segment()
+                    seg_t0 = t
+                    sw = swt = swq = swtt = swtq = swqq = 0.0
+                    seg_n = 0
+                w = math.exp(growth * t)
+                dt = t - seg_t0
+                sw += w
+                swt += w * dt
+                swq += w * quantity
+                swtt += w * dt * dt
+                swtq += w * dt * quantity
+                swqq += w * quantity * quantity
+                seg_n += 1
+            close_segment()
         
-        except Exception:
-            return 0.0
+        # Single-point segments carry no slope, so only ``used`` points count
+        if used < MIN_DATA_POINTS or sxx <= 0:
+            metrics.ML_FITS.inc("insufficient_data")
+            return None
+        metrics.ML_FITS.inc("fitted")
+        tracing.set_attribute("ml.data_points", used)
+        
+        slope = sxy / sxx
+        r2 = sxy * sxy / (sxx * syy) if syy > 0 else 1.0
+        mean_t, mean_q = last_mean
+        
+        # Only points in segments of two or more carry slope information
+        data_factor = min(1.0, used / 30)
+        return UsagePrediction(
+            rate=max(0.0, -slope),
+            intercept=mean_q - slope * mean_t,
+            r2=r2,
+            n=used,
+            confidence=max(0.0, r2 * data_factor)
+        )
+
+
+# Predictor name -> class (ML_PREDICTOR)
+PREDICTORS = {
+    "linear": MLPredictor,
+    "segmented": SegmentedPredictor,
+}
+
+
+def get_predictor(name: Optional[str] = None, backend_name: Optional[str] = None) -> MLPredictor:
+    """
+    Return a new usage predictor.
+    
+    Args:
+        name: 'linear' or 'segmented'. Defaults to the ML_PREDICTOR
+              environment variable, then 'linear'.
+        backend_name: Regression backend for the linear predictor
+    """
+    name = (name or os.getenv("ML_PREDICTOR") or "linear").lower()
+    if name not in PREDICTORS:
+        raise ValueError(f"Unknown predictor: {name}")
+    return PREDICTORS[name](backend_name=backend_name)
+
+
+def predict_item_fields(
+    predictor: MLPredictor,
+    history: List[Dict],
+    current_quantity: float,
+    acquisition_difficulty: int,
+    usage_rate: Optional[float],
+    usage_period: Optional[str]
+) -> Dict:
+    """
+    Compute the stored prediction columns for one item.
+    Uses the ML rate when available, falling back to the user-provided rate.
+    
+    Returns:
+        Dict with predicted_usage_rate, prediction_confidence,
+        predicted_purchase_date and prediction_updated_at
+    """
+    prediction = predictor.fit(history)
+    
+    if prediction is not None:
+        daily_usage = prediction.rate
+        confidence = prediction.confidence
+    elif usage_rate is not None:
+        daily_usage = calculate_daily_usage(usage_rate, usage_period or "daily")
+        confidence = 0.5  # Medium confidence for user-provided data
+    else:
+        daily_usage = None
+        confidence = 0.0
+    
+    purchase_date = None
+    if daily_usage:
+        purchase_date = calculate_purchase_date(
+            current_quantity or 0.0,
+            daily_usage,
+            acquisition_difficulty or 0
+        )
+    
+    return {
+        "predicted_usage_rate": daily_usage,
+        "prediction_confidence": confidence,
+        "predicted_purchase_date": purchase_date,
+        "prediction_updated_at": datetime.utcnow()
+    }
 
 
 def predict_purchase_urgency(
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Date, DateTime, Boolean, Index, event
 from sqlalchemy.orm import relationship
 from .database import Base
 from datetime import datetime
@@ -24,6 +24,7 @@ class Item(Base):
     unit = Column(String, default="un") # un, kg, L, g, ml, pacotes
     notes = Column(String, nullable=True)
     barcode = Column(String, nullable=True)
+    barcode_normalized = Column(String, nullable=True, unique=True, index=True)  # See barcodes.py
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -38,6 +39,16 @@ class Item(Base):
     # ML learning - JSON array of {date, quantity, change}
     quantity_history = Column(String, nullable=True)
     
+    # Denormalized for indexed alert queries (see /items/alerts/needed)
+    last_checked_at = Column(DateTime, nullable=True, index=True)  # Date of the last history record
+    is_low_stock = Column(Boolean, default=False, index=True)  # current_quantity < minimum_quantity
+    
+    # Stored prediction, refreshed on quantity updates and by backend.recompute
+    predicted_usage_rate = Column(Float, nullable=True)  # Daily usage (ML or user-provided)
+    prediction_confidence = Column(Float, nullable=True)
+    predicted_purchase_date = Column(DateTime, nullable=True)
+    prediction_updated_at = Column(DateTime, nullable=True)
+    
     # Notification preferences
     notification_enabled = Column(Boolean, default=False)
     phone_number = Column(String, nullable=True)  # For SMS/notifications
@@ -45,6 +56,17 @@ class Item(Base):
 
     category = relationship("Category", back_populates="items")
 
+def _is_low_stock(item: "Item") -> bool:
+    current = item.current_quantity if item.current_quantity is not None else 0.0
+    minimum = item.minimum_quantity if item.minimum_quantity is not None else 1.0
+    return current < minimum
+
+@event.listens_for(Item, "before_insert")
+@event.listens_for(Item, "before_update")
+def _maintain_low_stock_flag(mapper, connection, target):
+    # Keep the stored flag in step with the quantities on every ORM write
+    target.is_low_stock = _is_low_stock(target)
+
 class User(Base):
     __tablename__ = "users"
 
@@ -59,3 +81,36 @@ class User(Base):
     # Preferences
     theme_preference = Column(String, default="system")  # light, dark, system
     language_preference = Column(String, default="en-US") # pt-BR, en-US
+
+class DataVersion(Base):
+    """Per-resource version counter, bumped in the same transaction as each write."""
+    __tablename__ = "data_versions"
+
+    name = Column(String, primary_key=True)  # e.g. "items", "categories"
+    version = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+class ItemConsumptionDaily(Base):
+    """Consumed/restocked quantity per item per UTC day (see analytics.py)."""
+    __tablename__ = "item_consumption_daily"
+
+    item_id = Column(Integer, primary_key=True)  # No FK: rows outlive deleted items
+    day = Column(Date, primary_key=True)
+    category_id = Column(Integer, nullable=True)  # Category at the time of the changes
+    consumed = Column(Float, default=0.0, nullable=False)
+    restocked = Column(Float, default=0.0, nullable=False)
+    changes = Column(Integer, default=0, nullable=False)
+
+    __table_args__ = (Index("ix_item_consumption_daily_day", "day"),)
+
+class CategoryConsumptionDaily(Base):
+    """Consumed/restocked quantity per category per UTC day (see analytics.py)."""
+    __tablename__ = "category_consumption_daily"
+
+    category_id = Column(Integer, primary_key=True)  # 0 for items without a category
+    day = Column(Date, primary_key=True)
+    consumed = Column(Float, default=0.0, nullable=False)
+    restocked = Column(Float, default=0.0, nullable=False)
+    changes = Column(Integer, default=0, nullable=False)
+
+    __table_args__ = (Index("ix_category_consumption_daily_day", "day"),)
@@ -133,19 +133,21 @@ class NotificationService:
             List of notification dicts
         """
         notifications = []
+        predictor = None
         
         for item in items:
             # Check if low stock
             if item.current_quantity < item.minimum_quantity:
                 # Calculate days remaining if possible
                 from .ml_predictor import (
-                    MLPredictor,
+                    get_predictor,
                     calculate_daily_usage,
                     calculate_days_remaining
                 )
                 
                 history = usage_tracker.get_history_as_list(item.quantity_history)
-                predictor = MLPredictor()
+                if predictor is None:
+                    predictor = get_predictor()
                 ml_usage = predictor.predict_usage_rate(history)
                 
                 if ml_usage:
@@ -0,0 +1,180 @@
+"""
+Per-request SQL profiling: query counts, DB time, N+1 detection and a
+slow-query log.
+
+``QueryProfilerMiddleware`` opens a ``QueryProfile`` for each HTTP request
+as the request's ``metrics.RequestStats``, so the cursor events in
+metrics.py record every statement executed while it is active (sync
+endpoints run in the threadpool with a copy of the request context, so
+they are covered too) and the route metrics count into the same object.
+When the response starts the profile is checked:
+
+- a SELECT repeated ``n_plus_one_threshold`` times is logged as a likely
+  N+1 (the fix is usually ``selectinload``/``joinedload``)
+- statements slower than ``slow_query_ms`` and requests whose DB time
+  exceeds ``slow_request_ms`` go to the slow-query log
+- in debug mode the summary is returned as ``X-DB-*`` response headers
+
+Tests use ``capture_profiles`` (see the ``assert_max_queries`` fixture) to
+bound the number of queries an endpoint may run.
+"""
+import logging
+import os
+import re
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, List, Optional
+
+from starlette.datastructures import MutableHeaders
+
+from .metrics import RequestStats, current_request_stats
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger("backend.slow_queries")
+
+DEFAULT_SLOW_QUERY_MS = 100.0
+DEFAULT_SLOW_REQUEST_MS = 500.0
+DEFAULT_N_PLUS_ONE_THRESHOLD = 5
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r"\bIN\s*\((?:\s*\?\s*,?)+\)", re.IGNORECASE)
+_POSITIONAL = re.compile(r"__\[POSTCOMPILE_\w+\]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    """
+    Statement shape with literals and IN-list lengths removed, so the same
+    query issued with different values groups together.
+    """
+    shape = _LITERALS.sub("?", statement)
+    shape = _POSITIONAL.sub("?", shape)
+    shape = _IN_LISTS.sub("IN (...)", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+class QueryProfile(RequestStats):
+    """Statements executed during one request."""
+
+    def __init__(self, label: str = "", slow_query_ms: float = DEFAULT_SLOW_QUERY_MS):
+        super().__init__()
+        self.label = label
+        self.slow_query_ms = slow_query_ms
+        self.statements: Counter = Counter()  # Raw statement -> executions
+        self.slow: List[tuple] = []  # (elapsed_ms, statement)
+
+    def record(self, statement: str, elapsed: float):
+        super().record(statement, elapsed)
+        self.statements[statement] += 1
+        if elapsed * 1000 >= self.slow_query_ms:
+            self.slow.append((elapsed * 1000, statement))
+
+    def repeated(self, threshold: int = DEFAULT_N_PLUS_ONE_THRESHOLD) -> List[tuple]:
+        """
+        Likely N+1 patterns: (fingerprint, executions) for SELECT shapes run
+        at least ``threshold`` times, most repeated first.
+        """
+        shapes: Counter = Counter()
+        for statement, count in self.statements.items():
+            if statement.lstrip()[:6].upper() == "SELECT":
+                shapes[fingerprint(statement)] += count
+        return [(shape, count) for shape, count in shapes.most_common() if count >= threshold]
+
+    def summary(self) -> str:
+        return f"{self.label}: {self.queries} queries, {self.db_time * 1000:.1f} ms in DB"
+
+
+_listeners: List[Callable[[QueryProfile], None]] = []
+
+
+def configure_slow_query_log(path: Optional[str]):
+    """Send the slow-query log to ``path`` (in addition to normal logging)."""
+    if not path:
+        return
+    if any(getattr(h, "baseFilename", None) == path for h in slow_query_logger.handlers):
+        return
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    handler = logging.FileHandler(path)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    slow_query_logger.addHandler(handler)
+    slow_query_logger.setLevel(logging.INFO)
+
+
+class QueryProfilerMiddleware:
+    """
+    ASGI middleware that profiles the SQL issued by each HTTP request.
+    """
+
+    def __init__(
+        self,
+        app,
+        debug_headers: bool = False,
+        slow_query_ms: float = DEFAULT_SLOW_QUERY_MS,
+        slow_request_ms: float = DEFAULT_SLOW_REQUEST_MS,
+        n_plus_one_threshold: int = DEFAULT_N_PLUS_ONE_THRESHOLD
+    ):
+        self.app = app
+        self.debug_headers = debug_headers
+        self.slow_query_ms = slow_query_ms
+        self.slow_request_ms = slow_request_ms
+        self.n_plus_one_threshold = n_plus_one_threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = QueryProfile(f"{scope['method']} {scope['path']}", self.slow_query_ms)
+        token = current_request_stats.set(profile)
+        reported = False
+
+        def report():
+            nonlocal reported
+            if not reported:
+                reported = True
+                self.report(profile)
+
+        async def send_with_summary(message):
+            if message["type"] == "http.response.start":
+                # Queries issued while a streaming body is sent are not in the summary
+                report()
+                if self.debug_headers:
+                    headers = MutableHeaders(scope=message)
+                    headers["X-DB-Query-Count"] = str(profile.queries)
+                    headers["X-DB-Time-Ms"] = f"{profile.db_time * 1000:.2f}"
+                    repeated = profile.repeated(self.n_plus_one_threshold)
+                    if repeated:
+                        headers["X-DB-N-Plus-One"] = str(repeated[0][1])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_summary)
+        finally:
+            current_request_stats.reset(token)
+            report()
+
+    def report(self, profile: QueryProfile):
+        for shape, count in profile.repeated(self.n_plus_one_threshold):
+            logger.warning(f"Possible N+1 in {profile.label}: {count}x {shape[:300]}")
+        for elapsed_ms, statement in profile.slow:
+            slow_query_logger.info(f"slow query {elapsed_ms:.1f} ms [{profile.label}] {fingerprint(statement)[:1000]}")
+        if profile.db_time * 1000 >= self.slow_request_ms:
+            slow_query_logger.info(f"slow request {profile.summary()}")
+        for listener in list(_listeners):
+            listener(profile)
+
+
+@contextmanager
+def capture_profiles():
+    """
+    Collect the profiles of requests completed inside the block (requests
+    must pass through ``QueryProfilerMiddleware``).
+    """
+    captured: List[QueryProfile] = []
+    _listeners.append(captured.append)
+    try:
+        yield captured
+    finally:
+        _listeners.remove(captured.append)
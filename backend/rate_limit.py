@@ -0,0 +1,310 @@
+"""
+Admission control: per-user token buckets and a cap on concurrent writes.
+
+Requests are sorted into route classes:
+
+- login: ``POST /token`` (keyed by client address; there is no user yet)
+- barcode: ``/barcode/*`` and ``/items/by-barcode/*``
+- writes: other POST/PUT/PATCH/DELETE
+- reads: everything else
+
+Each (class, user) pair has a token bucket of ``rate`` requests per second
+with bursts up to ``burst``. Requests without a valid token are keyed by
+client address. Writes also take a slot from a process-wide pool of
+``max_concurrent_writes``. A request over either limit is answered at once
+with 429 and ``Retry-After`` instead of waiting for a threadpool worker or
+the SQLite writer lock, so one looping client cannot starve the others.
+``PUT /items/{id}`` takes its slot in the handler instead, and only when
+the update is not handed to the write coalescer (``acquire_write_slot``):
+coalesced updates hold no thread or connection while they wait, and the
+coalescer bounds its own batches.
+
+Buckets live in memory, or in a SQLite file shared by the workers on a
+host (``RATE_LIMIT_PATH``). The concurrency cap is always per process.
+Limiter failures let the request through.
+"""
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from starlette.responses import JSONResponse
+
+from . import auth, metrics
+
+logger = logging.getLogger(__name__)
+
+READS = "reads"
+WRITES = "writes"
+BARCODE = "barcode"
+LOGIN = "login"
+
+# (requests per second, burst)
+DEFAULT_LIMITS: Dict[str, Tuple[float, float]] = {
+    READS: (20.0, 100.0),
+    WRITES: (5.0, 30.0),
+    BARCODE: (1.0, 10.0),
+    LOGIN: (0.2, 10.0),
+}
+DEFAULT_MAX_CONCURRENT_WRITES = 8
+
+# Never limited: metrics scrapes, static files
+EXEMPT_PATHS = ("/metrics",)
+EXEMPT_PREFIXES = ("/static/",)
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+# Writes that may be coalesced: the handler decides whether they need a slot
+DEFERRED_SLOT_WRITES = re.compile(r"PUT /items/\d+")
+
+# In-memory buckets kept before idle (full) ones are dropped. Both stores scan
+# for idle buckets at most once per interval
+MAX_BUCKETS = 10000
+PRUNE_INTERVAL = 1.0
+
+BUSY = "Server busy, too many concurrent writes"
+
+
+def classify(method: str, path: str) -> Optional[str]:
+    """Route class of a request, or None if it is never limited."""
+    if method == "OPTIONS" or path in EXEMPT_PATHS or path.startswith(EXEMPT_PREFIXES):
+        return None
+    if path == "/token":
+        return LOGIN
+    if path.startswith(("/barcode/", "/items/by-barcode/")):
+        return BARCODE
+    return WRITES if method in WRITE_METHODS else READS
+
+
+class MemoryBucketStore:
+    """Token buckets in a dict. Thread-safe."""
+
+    def __init__(self):
+        self._buckets: Dict[str, list] = {}  # key -> [tokens, updated_at, rate, burst]
+        self._lock = threading.Lock()
+        self._next_prune = 0.0
+
+    def take(self, key: str, rate: float, burst: float, now: float) -> Tuple[bool, float]:
+        """
+        Take one token. Returns (allowed, tokens left after the refill).
+        """
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= MAX_BUCKETS and now >= self._next_prune:
+                    self._prune(now)
+                bucket = self._buckets[key] = [burst, now, rate, burst]
+            tokens = min(burst, bucket[0] + max(0.0, now - bucket[1]) * rate)
+            allowed = tokens >= 1
+            bucket[0] = tokens - 1 if allowed else tokens
+            bucket[1] = now
+            return allowed, tokens
+
+    def _prune(self, now: float):
+        # Buckets that have refilled completely, at their own rate, carry no state
+        # worth keeping. The scan is O(n): at most one per interval, even if it
+        # drops nothing.
+        self._next_prune = now + PRUNE_INTERVAL
+        self._buckets = {
+            k: b for k, b in self._buckets.items() if b[0] + (now - b[1]) * b[2] < b[3]
+        }
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class SQLiteBucketStore:
+    """
+    Token buckets in a SQLite file shared by workers. Each take is one
+    UPSERT, so concurrent workers never lose updates.
+
+    Takes run synchronously on the event loop: an uncontended take costs
+    ~25 µs, less than a threadpool hop would. While another worker holds
+    the file's write lock a take waits at most ``BUSY_TIMEOUT``, then fails
+    and the request is let through. Rows idle long enough to have refilled
+    are deleted at most once per ``PRUNE_INTERVAL``.
+    """
+
+    BUSY_TIMEOUT = 0.05
+
+    # expires_at: when the bucket is full again even if it was empty
+    TAKE = """
+        INSERT INTO rate_limit_buckets (key, tokens, updated_at, allowed, expires_at)
+        VALUES (:key, :burst - 1, :now, 1, :now + :burst / :rate)
+        ON CONFLICT(key) DO UPDATE SET
+            tokens = MIN(:burst, tokens + MAX(0, :now - updated_at) * :rate)
+                - (MIN(:burst, tokens + MAX(0, :now - updated_at) * :rate) >= 1),
+            allowed = MIN(:burst, tokens + MAX(0, :now - updated_at) * :rate) >= 1,
+            updated_at = :now,
+            expires_at = :now + :burst / :rate
+        RETURNING allowed, tokens + allowed
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._next_prune = 0.0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.BUSY_TIMEOUT, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit_buckets ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, allowed INTEGER NOT NULL, "
+                "expires_at REAL NOT NULL DEFAULT 0)"
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(rate_limit_buckets)")}
+            if "expires_at" not in columns:
+                # Files from older releases: their buckets are dropped at the next prune
+                try:
+                    conn.execute("ALTER TABLE rate_limit_buckets ADD COLUMN expires_at REAL NOT NULL DEFAULT 0")
+                except sqlite3.OperationalError:
+                    pass  # Another worker added it
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_rate_limit_buckets_expires_at ON rate_limit_buckets (expires_at)")
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, rate: float, burst: float, now: float) -> Tuple[bool, float]:
+        conn = self._connection()
+        if now >= self._next_prune:
+            self._prune(conn, now)
+        row = conn.execute(
+            self.TAKE, {"key": key, "rate": rate, "burst": burst, "now": now}
+        ).fetchone()
+        return bool(row[0]), row[1]
+
+    def _prune(self, conn: sqlite3.Connection, now: float):
+        self._next_prune = now + PRUNE_INTERVAL
+        conn.execute("DELETE FROM rate_limit_buckets WHERE expires_at <= ?", (now,))
+
+    def reset(self):
+        self._connection().execute("DELETE FROM rate_limit_buckets")
+
+
+class RateLimiter:
+    """Per-class token buckets and the concurrent-write pool."""
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, Tuple[float, float]]] = None,
+        max_concurrent_writes: int = DEFAULT_MAX_CONCURRENT_WRITES,
+        store=None
+    ):
+        self.limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self.max_concurrent_writes = max_concurrent_writes
+        self.store = store or MemoryBucketStore()
+        self.writes_in_flight = 0
+
+    def retry_after(self, route_class: str, identity: str, now: Optional[float] = None) -> Optional[int]:
+        """
+        Take a token for ``identity``. Returns None if the request may
+        proceed, else the seconds to wait before retrying.
+        """
+        rate, burst = self.limits[route_class]
+        if rate <= 0:
+            return None  # Class not limited
+        try:
+            allowed, tokens = self.store.take(f"{route_class}:{identity}", rate, burst, now or time.time())
+        except sqlite3.Error as e:
+            logger.warning(f"Rate limiter store failed, allowing request: {e}")
+            return None
+        if allowed:
+            return None
+        return max(1, math.ceil((1 - tokens) / rate))
+
+    def reset(self):
+        self.store.reset()
+
+
+class WriteSlot:
+    """A request's place in the concurrent-write pool."""
+
+    def __init__(self, limiter: RateLimiter):
+        self.limiter = limiter
+        self.held = False
+
+    def acquire(self) -> bool:
+        """Take a slot (single event loop: no lock needed). False if none is free."""
+        limiter = self.limiter
+        if not self.held:
+            if limiter.writes_in_flight >= limiter.max_concurrent_writes:
+                return False
+            limiter.writes_in_flight += 1
+            self.held = True
+        return True
+
+    def release(self):
+        if self.held:
+            self.held = False
+            self.limiter.writes_in_flight -= 1
+
+
+def acquire_write_slot(request) -> bool:
+    """
+    Take the concurrent-write slot of a request whose slot was deferred to
+    the handler. True if it holds one, or if writes are not limited.
+    """
+    slot = request.scope.get("state", {}).get("write_slot")
+    if slot is None or slot.acquire():
+        return True
+    metrics.RATE_LIMITED.inc(WRITES, "concurrency")
+    return False
+
+
+def _too_many_requests(retry_after: int, detail: str) -> JSONResponse:
+    return JSONResponse({"detail": detail}, status_code=429, headers={"Retry-After": str(retry_after)})
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware applying a ``RateLimiter`` before any other work is
+    done for the request.
+    """
+
+    def __init__(self, app, limiter: RateLimiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route_class = classify(scope["method"], scope["path"])
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        username = auth.username_from_scope(scope) if route_class != LOGIN else None
+        client = scope.get("client")
+        identity = f"user:{username}" if username else f"addr:{client[0] if client else 'unknown'}"
+
+        retry_after = self.limiter.retry_after(route_class, identity)
+        if retry_after is not None:
+            metrics.RATE_LIMITED.inc(route_class, "rate")
+            await _too_many_requests(retry_after, "Too many requests")(scope, receive, send)
+            return
+
+        if route_class != WRITES:
+            await self.app(scope, receive, send)
+            return
+
+        slot = WriteSlot(self.limiter)
+        if DEFERRED_SLOT_WRITES.fullmatch(f"{scope['method']} {scope['path']}"):
+            scope.setdefault("state", {})["write_slot"] = slot
+        elif not slot.acquire():
+            metrics.RATE_LIMITED.inc(route_class, "concurrency")
+            await _too_many_requests(1, BUSY)(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            slot.release()
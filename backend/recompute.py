@@ -0,0 +1,286 @@
+"""
+Recompute stored usage predictions for the whole inventory.
+
+Items are streamed from the database in id order, fitted in parallel on a
+process pool and written back in one transaction per batch. After every
+batch the last processed id is saved to a checkpoint file, so an
+interrupted run continues where it stopped.
+
+The pass also compacts histories (see ``usage_tracker.compact_history``),
+so histories stored before tiering, or imported, are brought into tiers.
+
+Writes are optimistic: a row is only updated if its history and quantity
+still match what was read. Rows changed by a concurrent request meanwhile
+are skipped; that request already refreshed their predictions.
+
+Usage:
+    python -m backend.recompute [--batch-size 500] [--workers 4] [--restart]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy import bindparam, create_engine, func, select, update
+from sqlalchemy.orm import Session, sessionmaker
+
+from . import database, models, versioning
+from .ml_predictor import MLPredictor, get_predictor, predict_item_fields
+from .settings import Settings, load_env_file
+from .usage_tracker import UsageTracker, compact_history
+
+DEFAULT_CHECKPOINT = os.path.join("data", "recompute.checkpoint.json")
+
+# Columns a worker needs; full ORM objects are never loaded
+ROW_COLUMNS = (
+    models.Item.id,
+    models.Item.quantity_history,
+    models.Item.current_quantity,
+    models.Item.acquisition_difficulty,
+    models.Item.usage_rate,
+    models.Item.usage_period,
+)
+
+# Prediction columns written back by compute_row
+RESULT_COLUMNS = (
+    "predicted_usage_rate",
+    "prediction_confidence",
+    "predicted_purchase_date",
+    "prediction_updated_at",
+)
+
+# Only write rows whose inputs are unchanged since they were read
+GUARDED_UPDATE = (
+    update(models.Item.__table__)
+    .where(
+        models.Item.id == bindparam("b_id"),
+        models.Item.quantity_history.is_not_distinct_from(bindparam("b_seen_history")),
+        models.Item.current_quantity.is_not_distinct_from(bindparam("b_seen_quantity")),
+    )
+    .values(
+        quantity_history=bindparam("b_quantity_history"),
+        **{name: bindparam(f"b_{name}") for name in RESULT_COLUMNS}
+    )
+)
+
+# Per-process state, set by _init_worker
+_predictor: Optional[MLPredictor] = None
+_tracker = UsageTracker()
+
+
+def _init_worker(predictor_name: Optional[str], backend_name: Optional[str]):
+    global _predictor
+    _predictor = get_predictor(predictor_name, backend_name=backend_name)
+
+
+def compute_row(row: tuple) -> Dict:
+    """
+    Compute the prediction columns for one (id, history, ...) row, plus
+    the (possibly compacted) history. Runs inside a worker process.
+    """
+    item_id, history_json, current_quantity, difficulty, usage_rate, usage_period = row
+    predictor = _predictor or get_predictor()
+    history = _tracker.get_history_as_list(history_json)
+    compacted = compact_history(history)
+    fields = predict_item_fields(
+        predictor,
+        compacted,
+        current_quantity,
+        difficulty,
+        usage_rate,
+        usage_period
+    )
+    fields["id"] = item_id
+    fields["quantity_history"] = (
+        json.dumps(compacted) if compacted is not history else history_json
+    )
+    return fields
+
+
+def guarded_params(row: tuple, fields: Dict) -> Dict:
+    """Bind parameters for GUARDED_UPDATE from a read row and its result."""
+    params = {f"b_{name}": fields[name] for name in RESULT_COLUMNS}
+    params.update({
+        "b_id": fields["id"],
+        "b_quantity_history": fields["quantity_history"],
+        "b_seen_history": row[1],
+        "b_seen_quantity": row[2],
+    })
+    return params
+
+
+def load_checkpoint(path: str) -> int:
+    """Return the last item id recorded in the checkpoint, or 0."""
+    try:
+        with open(path) as f:
+            return int(json.load(f).get("last_id", 0))
+    except (OSError, ValueError):
+        return 0
+
+
+def save_checkpoint(path: str, last_id: int, processed: int):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"last_id": last_id, "processed": processed}, f)
+    os.replace(tmp_path, path)
+
+
+def iter_batches(db: Session, after_id: int, batch_size: int) -> Iterator[List[tuple]]:
+    """
+    Yield batches of item rows with id > after_id, in id order.
+
+    Each batch is its own keyset query streamed with yield_per, so no read
+    cursor stays open while the batch is written back (SQLite would block
+    the commit otherwise).
+    """
+    last_id = after_id
+    while True:
+        stmt = (
+            select(*ROW_COLUMNS)
+            .where(models.Item.id > last_id)
+            .order_by(models.Item.id)
+            .limit(batch_size)
+            .execution_options(yield_per=batch_size)
+        )
+        batch = [tuple(row) for row in db.execute(stmt)]
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1][0]
+
+
+def recompute(
+    session_factory=None,
+    batch_size: int = 500,
+    workers: Optional[int] = None,
+    checkpoint_path: str = DEFAULT_CHECKPOINT,
+    restart: bool = False,
+    backend_name: Optional[str] = None,
+    predictor_name: Optional[str] = None,
+    progress=None
+) -> Dict:
+    """
+    Recompute predictions for every item.
+
+    Args:
+        session_factory: Session factory (defaults to database.SessionLocal)
+        batch_size: Items per read/write batch
+        workers: Worker processes (defaults to the CPU count)
+        checkpoint_path: Where progress is stored between runs
+        restart: Ignore an existing checkpoint
+        backend_name: Regression backend used by the workers
+        predictor_name: 'linear' or 'segmented' (defaults to ML_PREDICTOR)
+        progress: Optional callable receiving a stats dict after each batch
+
+    Returns:
+        Stats dict with processed, skipped (rows changed concurrently),
+        total, elapsed_s and items_per_s
+    """
+    session_factory = session_factory or database.SessionLocal
+    start_after = 0 if restart else load_checkpoint(checkpoint_path)
+
+    db = session_factory()
+    started = time.perf_counter()
+    processed = 0
+    skipped = 0
+    try:
+        total = db.scalar(
+            select(func.count()).select_from(models.Item).where(models.Item.id > start_after)
+        )
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(predictor_name, backend_name)
+        ) as pool:
+            chunksize = max(1, batch_size // ((workers or os.cpu_count() or 1) * 4))
+            for batch in iter_batches(db, start_after, batch_size):
+                results = list(pool.map(compute_row, batch, chunksize=chunksize))
+                written = db.execute(
+                    GUARDED_UPDATE,
+                    [guarded_params(row, fields) for row, fields in zip(batch, results)]
+                ).rowcount
+                skipped += len(batch) - written
+                versioning.bump_version(db, versioning.ITEMS)
+                db.commit()
+
+                processed += len(batch)
+                save_checkpoint(checkpoint_path, batch[-1][0], processed)
+
+                if progress:
+                    elapsed = time.perf_counter() - started
+                    progress({
+                        "processed": processed,
+                        "total": total,
+                        "last_id": batch[-1][0],
+                        "items_per_s": processed / elapsed if elapsed else 0.0,
+                    })
+    finally:
+        db.close()
+
+    # Finished: the next run starts from scratch
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "processed": processed,
+        "skipped": skipped,
+        "total": total,
+        "resumed_after_id": start_after,
+        "elapsed_s": round(elapsed, 3),
+        "items_per_s": round(processed / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def _print_progress(stats: Dict):
+    total = stats["total"] or 1
+    print(
+        f"{stats['processed']}/{stats['total']} items "
+        f"({100 * stats['processed'] / total:.1f}%) - "
+        f"{stats['items_per_s']:.0f} items/s - last id {stats['last_id']}",
+        file=sys.stderr,
+        flush=True
+    )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Recompute usage predictions for all items")
+    parser.add_argument("--database-url", help="Defaults to the app database")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT)
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint")
+    parser.add_argument("--backend", help="Regression backend (numpy, python, sklearn)")
+    parser.add_argument("--predictor", help="Usage predictor (linear, segmented); defaults to ML_PREDICTOR")
+    args = parser.parse_args(argv)
+    load_env_file()
+
+    if args.database_url:
+        engine = create_engine(args.database_url)
+    else:
+        engine = database.engine
+    database.init_db(engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    stats = recompute(
+        session_factory,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        checkpoint_path=args.checkpoint,
+        restart=args.restart,
+        backend_name=args.backend,
+        predictor_name=args.predictor or Settings.from_env().ml_predictor,
+        progress=_print_progress
+    )
+    print(json.dumps(stats))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""
+Pluggable one-feature least-squares backends for usage prediction.
+
+All backends fit ``y = slope * x + intercept`` and report R² with the same
+conventions as scikit-learn's ``LinearRegression.score``:
+- constant x gives slope 0 and intercept mean(y)
+- constant y gives R² 1.0 for a perfect fit, otherwise 0.0
+
+Backends:
+- numpy: closed form on float64 arrays (default when numpy is installed)
+- python: pure-Python closed form for slim images
+- sklearn: reference implementation, kept for parity checks
+"""
+import importlib.util
+import math
+import os
+from typing import Dict, NamedTuple, Optional, Sequence
+
+
+class LinearFit(NamedTuple):
+    slope: float
+    intercept: float
+    r2: float
+
+
+def _r2(ss_res: float, ss_tot: float) -> float:
+    if ss_tot == 0:
+        return 1.0 if ss_res == 0 else 0.0
+    return 1.0 - ss_res / ss_tot
+
+
+class PurePythonRegression:
+    """
+    Closed-form least squares using only the standard library.
+    """
+    name = "python"
+
+    def fit(self, xs: Sequence[float], ys: Sequence[float]) -> LinearFit:
+        n = len(xs)
+        mean_x = math.fsum(xs) / n
+        mean_y = math.fsum(ys) / n
+
+        sxx = math.fsum((x - mean_x) ** 2 for x in xs)
+        sxy = math.fsum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+        slope = sxy / sxx if sxx else 0.0
+        intercept = mean_y - slope * mean_x
+
+        ss_res = math.fsum((y - (slope * x + intercept)) ** 2 for x, y in zip(xs, ys))
+        ss_tot = math.fsum((y - mean_y) ** 2 for y in ys)
+        return LinearFit(slope, intercept, _r2(ss_res, ss_tot))
+
+
+class NumpyRegression:
+    """
+    Closed-form least squares on numpy arrays.
+    """
+    name = "numpy"
+
+    def __init__(self):
+        import numpy as np
+        self._np = np
+
+    def fit(self, xs: Sequence[float], ys: Sequence[float]) -> LinearFit:
+        np = self._np
+        x = np.asarray(xs, dtype=np.float64)
+        y = np.asarray(ys, dtype=np.float64)
+
+        dx = x - x.mean()
+        dy = y - y.mean()
+        sxx = float(dx @ dx)
+        slope = float(dx @ dy) / sxx if sxx else 0.0
+        intercept = float(y.mean()) - slope * float(x.mean())
+
+        residuals = y - (slope * x + intercept)
+        return LinearFit(slope, intercept, _r2(float(residuals @ residuals), float(dy @ dy)))
+
+
+class SklearnRegression:
+    """
+    Reference implementation using scikit-learn's LinearRegression.
+    A fresh estimator is built per fit, so instances are safe to share.
+    """
+    name = "sklearn"
+
+    def __init__(self):
+        import numpy as np
+        from sklearn.linear_model import LinearRegression
+        self._np = np
+        self._estimator_cls = LinearRegression
+
+    def fit(self, xs: Sequence[float], ys: Sequence[float]) -> LinearFit:
+        X = self._np.asarray(xs, dtype=self._np.float64).reshape(-1, 1)
+        y = self._np.asarray(ys, dtype=self._np.float64)
+        model = self._estimator_cls().fit(X, y)
+        return LinearFit(float(model.coef_[0]), float(model.intercept_), float(model.score(X, y)))
+
+
+BACKENDS = {
+    "numpy": NumpyRegression,
+    "python": PurePythonRegression,
+    "sklearn": SklearnRegression,
+}
+
+_instances: Dict[str, object] = {}
+
+
+def _module_available(name: str) -> bool:
+    return importlib.util.find_spec(name) is not None
+
+
+def get_regression_backend(name: Optional[str] = None):
+    """
+    Return a (cached) regression backend.
+
+    Args:
+        name: 'numpy', 'python', 'sklearn' or 'auto'. Defaults to the
+              ML_BACKEND environment variable, then 'auto'.
+
+    Returns:
+        Backend instance; 'auto' picks numpy when installed, else python
+    """
+    name = (name or os.getenv("ML_BACKEND") or "auto").lower()
+    if name == "auto":
+        name = "numpy" if _module_available("numpy") else "python"
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown regression backend: {name}")
+
+    backend = _instances.get(name)
+    if backend is None:
+        backend = BACKENDS[name]()
+        _instances[name] = backend
+    return backend
@@ -0,0 +1,224 @@
+"""
+On-demand profiling of a single request.
+
+An admin adds ``X-Profile: sample`` (or ``cprofile``) to a request, or
+``?__profile=sample`` to its URL, and the request runs under a profiler.
+The result is stored under ``./data/profiles`` and named in the
+``X-Profile-Id`` response header; admins list and download artifacts from
+``/admin/profiles``.
+
+Modes:
+- sample: a background thread samples Python stacks every few
+  milliseconds and writes collapsed stacks (``*.collapsed``, for
+  flamegraph.pl / speedscope). It covers the event loop and threadpool
+  threads, so sync endpoints are included; concurrent requests show up too.
+- cprofile: deterministic ``cProfile`` of the event-loop thread, saved as
+  ``*.pstats``. Sync endpoints run in the threadpool and are not visible
+  in this mode. The thread has a single profiler hook, so one cprofile
+  session runs at a time; a request flagged meanwhile runs unprofiled.
+
+Requests without the flag pay one header lookup; with profiling disabled
+in settings the middleware is not installed at all.
+"""
+import cProfile
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import List, Optional
+from urllib.parse import parse_qs
+
+from starlette.datastructures import MutableHeaders
+
+from . import auth
+
+logger = logging.getLogger(__name__)
+
+MODES = ("sample", "cprofile")
+HEADER = b"x-profile"
+QUERY_FLAG = "__profile"
+SAMPLE_INTERVAL = 0.002
+MAX_STACK_DEPTH = 128
+
+# Leaf frames of threads that are idle (waiting for work), not running a request
+_IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+}
+
+_ARTIFACT_NAME = re.compile(r"^[\w.-]+\.(collapsed|pstats)$")
+
+# Held by the running cprofile session (shared by every app in the process)
+_cprofile_lock = threading.Lock()
+
+
+def _requested_mode(scope) -> Optional[str]:
+    for name, value in scope["headers"]:
+        if name == HEADER:
+            mode = value.decode("latin-1").strip().lower()
+            return mode if mode in MODES else "sample"
+    query = scope.get("query_string", b"")
+    if QUERY_FLAG.encode() in query:
+        mode = parse_qs(query.decode("latin-1")).get(QUERY_FLAG, ["sample"])[0].lower()
+        return mode if mode in MODES else "sample"
+    return None
+
+
+class StackSampler(threading.Thread):
+    """Samples every other thread's Python stack into collapsed-stack counts."""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        super().__init__(name="request-profiler", daemon=True)
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        own = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class ProfileStore:
+    """Profile artifacts on disk with count and age limits."""
+
+    def __init__(self, directory: str, max_files: int = 50, max_age_days: float = 7.0):
+        self.directory = directory
+        self.max_files = max_files
+        self.max_age_days = max_age_days
+
+    def new_name(self, method: str, path: str, extension: str) -> str:
+        slug = re.sub(r"[^\w]+", "-", path).strip("-")[:60] or "root"
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+        return f"{stamp}-{method.lower()}-{slug}.{extension}"
+
+    def path(self, name: str) -> Optional[str]:
+        """Path of an existing artifact; None for unknown or unsafe names."""
+        if not _ARTIFACT_NAME.match(name):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.isfile(path) else None
+
+    def list(self) -> List[dict]:
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for name in os.listdir(self.directory):
+            if not _ARTIFACT_NAME.match(name):
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            entries.append({
+                "name": name,
+                "bytes": stat.st_size,
+                "created_at": datetime.utcfromtimestamp(stat.st_mtime).isoformat()
+            })
+        return sorted(entries, key=lambda e: e["name"], reverse=True)
+
+    def prune(self):
+        """Drop artifacts beyond ``max_files`` (oldest first) or older than ``max_age_days``."""
+        cutoff = time.time() - self.max_age_days * 86400
+        for position, entry in enumerate(self.list()):
+            path = os.path.join(self.directory, entry["name"])
+            try:
+                if position >= self.max_files or os.stat(path).st_mtime < cutoff:
+                    os.remove(path)
+            except OSError:
+                continue
+
+    def save(self, name: str, write) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, name)
+        write(path)
+        self.prune()
+        return path
+
+
+class RequestProfilingMiddleware:
+    """
+    ASGI middleware that profiles flagged requests from admin users.
+    Non-admin flags are ignored, so the flag can't be used to slow the server.
+    """
+
+    def __init__(self, app, store: ProfileStore, admin_usernames=("admin",)):
+        self.app = app
+        self.store = store
+        self.admin_usernames = set(admin_usernames)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        mode = _requested_mode(scope)
+        if mode is None or auth.username_from_scope(scope) not in self.admin_usernames:
+            await self.app(scope, receive, send)
+            return
+
+        if mode == "cprofile" and not _cprofile_lock.acquire(blocking=False):
+            logger.info(f"cProfile session already running; {scope['method']} {scope['path']} runs unprofiled")
+            await self.app(scope, receive, send)
+            return
+
+        extension = "collapsed" if mode == "sample" else "pstats"
+        name = self.store.new_name(scope["method"], scope["path"], extension)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["X-Profile-Id"] = name
+            await send(message)
+
+        if mode == "sample":
+            sampler = StackSampler()
+            sampler.start()
+            try:
+                await self.app(scope, receive, send_with_id)
+            finally:
+                sampler.stop()
+                self._save(name, lambda path: _write_text(path, sampler.collapsed()))
+        else:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+                try:
+                    await self.app(scope, receive, send_with_id)
+                finally:
+                    profile.disable()
+                    self._save(name, profile.dump_stats)
+            finally:
+                _cprofile_lock.release()
+
+    def _save(self, name: str, write):
+        try:
+            path = self.store.save(name, write)
+            logger.info(f"Saved request profile {path}")
+        except OSError as e:
+            logger.warning(f"Could not save request profile {name}: {e}")
+
+
+def _write_text(path: str, text: str):
+    with open(path, "w") as f:
+        f.write(text)
@@ -0,0 +1,193 @@
+"""
+Versioned response cache for read endpoints.
+
+Entries are keyed by path + query parameters + ETag. The ETag encodes the
+data versions a response depends on (see versioning.py), so a write makes
+old entries unreachable instead of requiring explicit invalidation; they
+simply age out of the LRU.
+
+Two tiers:
+- an in-process LRU bounded by total bytes (per-entry byte accounting)
+- an optional SQLite file shared by all workers on the host
+"""
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+from fastapi import Request, Response
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Approximate per-entry bookkeeping cost (OrderedDict node, key tuple, bytes header)
+ENTRY_OVERHEAD_BYTES = 200
+
+
+class SQLiteCacheTier:
+    """
+    Shared cache tier in a SQLite file, oldest entries evicted first.
+    Failures are logged and treated as misses; the cache is best-effort.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                "key TEXT PRIMARY KEY, body BLOB NOT NULL, size INTEGER NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_response_cache_created ON response_cache (created_at)")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            row = self._connection().execute(
+                "SELECT body FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Shared response cache read failed: {e}")
+            return None
+        return bytes(row[0]) if row else None
+
+    def set(self, key: str, body: bytes):
+        try:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, body, size, created_at) VALUES (?, ?, ?, ?)",
+                (key, body, len(body), time.time())
+            )
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM response_cache").fetchone()[0]
+            if total > self.max_bytes:
+                # Drop the oldest entries until the tier fits again
+                conn.execute(
+                    "DELETE FROM response_cache WHERE key IN ("
+                    " SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY created_at DESC) AS running"
+                    " FROM response_cache) WHERE running > ?)",
+                    (self.max_bytes,)
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Shared response cache write failed: {e}")
+
+
+class ResponseCache:
+    """
+    Byte-bounded LRU of serialized responses, optionally backed by a shared tier.
+    Thread-safe; the lock only guards dictionary operations.
+    """
+
+    def __init__(self, max_bytes: int, shared: Optional[SQLiteCacheTier] = None):
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def entry_size(key: str, body: bytes) -> int:
+        return len(body) + len(key) + ENTRY_OVERHEAD_BYTES
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                metrics.CACHE_LOOKUPS.inc("response", "hit")
+                return body
+
+        if self.shared is not None:
+            body = self.shared.get(key)
+            if body is not None:
+                self._store(key, body)
+                with self._lock:
+                    self.shared_hits += 1
+                metrics.CACHE_LOOKUPS.inc("response", "shared_hit")
+                return body
+
+        with self._lock:
+            self.misses += 1
+        metrics.CACHE_LOOKUPS.inc("response", "miss")
+        return None
+
+    def set(self, key: str, body: bytes):
+        self._store(key, body)
+        if self.shared is not None:
+            self.shared.set(key, body)
+
+    def _store(self, key: str, body: bytes):
+        size = self.entry_size(key, body)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= self.entry_size(key, old)
+            self._entries[key] = body
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                old_key, old_body = self._entries.popitem(last=False)
+                self.current_bytes -= self.entry_size(old_key, old_body)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+def cache_key(request: Request, etag: str) -> str:
+    query = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    return f"{request.url.path}?{query}#{etag}"
+
+
+def cached_json_response(
+    request: Request,
+    headers: Dict[str, str],
+    build: Callable[[], bytes]
+) -> Response:
+    """
+    Return the cached body for this request/version, building it on a miss.
+
+    Args:
+        headers: Validator headers from versioning.conditional_headers
+        build: Produces the serialized JSON body (runs SQL + serialization)
+    """
+    cache: Optional[ResponseCache] = getattr(request.app.state, "response_cache", None)
+    if cache is None:
+        return Response(content=build(), media_type="application/json", headers=headers)
+
+    key = cache_key(request, headers["ETag"])
+    body = cache.get(key)
+    if body is None:
+        body = build()
+        cache.set(key, body)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 
 class CategoryBase(BaseModel):
     name: str
@@ -53,6 +53,9 @@ class Item(ItemBase):
     updated_at: datetime
     category: Optional[Category] = None
     quantity_history: Optional[str] = None
+    predicted_usage_rate: Optional[float] = None
+    prediction_confidence: Optional[float] = None
+    predicted_purchase_date: Optional[datetime] = None
 
     class Config:
         from_attributes = True
@@ -79,8 +82,16 @@ class PurchasePrediction(BaseModel):
     confidence: float  # 0-1 confidence score
     needs_tracking: bool  # True if insufficient data for ML prediction
 
+class ConsumptionPoint(BaseModel):
+    period: str  # ISO date of the period's first day
+    category_id: Optional[int] = None  # Set when grouped by category (0 = no category)
+    item_id: Optional[int] = None  # Set when grouped by item
+    consumed: float
+    restocked: float
+
 class BarcodeIdentifyRequest(BaseModel):
-    image_base64: str  # Base64 encoded image data
+    image_base64: Optional[str] = None  # Base64 encoded image data
+    barcode: Optional[str] = None  # Code decoded on the device, checked against the inventory first
 
 class BarcodeIdentifyResponse(BaseModel):
     success: bool
@@ -88,8 +99,28 @@ class BarcodeIdentifyResponse(BaseModel):
     suggested_category: Optional[str] = None
     suggested_unit: Optional[str] = None
     barcode: Optional[str] = None
+    item_id: Optional[int] = None  # Set when the barcode belongs to an item we already stock
     error: Optional[str] = None
 
+class ImportRowResult(BaseModel):
+    row: int  # 1-based data row (header excluded)
+    action: str  # 'create', 'update', 'skip' or 'error'
+    name: Optional[str] = None
+    item_id: Optional[int] = None
+    changes: Dict[str, Any] = {}  # Fields that differ from the stored item
+    error: Optional[str] = None
+
+class CsvImportResult(BaseModel):
+    dry_run: bool
+    created: int
+    updated: int
+    skipped: int
+    errors: int
+    categories_created: List[str] = []
+    rows: List[ImportRowResult] = []
+    elapsed_s: float
+    rows_per_s: float
+
 class UserBase(BaseModel):
     username: str
 
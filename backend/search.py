@@ -0,0 +1,135 @@
+"""
+Full-text item search backed by SQLite FTS5.
+
+``items_fts`` indexes each item's name, notes, barcode and category name
+under the item's id (rowid). Triggers on ``items`` and ``categories`` keep
+it in sync, so every write path (API, CSV/NDJSON import, raw SQL) is
+covered. The ``unicode61 remove_diacritics 2`` tokenizer folds case and
+accents, so "feijao" finds "Feijão", and the prefix indexes make
+search-as-you-type queries ("arr" -> "Arroz") index lookups.
+"""
+import re
+from typing import List, Tuple
+
+from sqlalchemy import DDL, event, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session, selectinload
+
+from . import models
+
+FTS_TABLE = "items_fts"
+
+# bm25 column weights: name, notes, barcode, category
+RANK_WEIGHTS = (10.0, 1.0, 5.0, 2.0)
+
+_CATEGORY_NAME = "(SELECT name FROM categories WHERE id = new.category_id)"
+
+CREATE_STATEMENTS = (
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, notes, barcode, category,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS items_fts_insert AFTER INSERT ON items BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, notes, barcode, category)
+        VALUES (new.id, new.name, new.notes, new.barcode, {_CATEGORY_NAME});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS items_fts_update
+    AFTER UPDATE OF name, notes, barcode, category_id ON items BEGIN
+        UPDATE {FTS_TABLE}
+        SET name = new.name, notes = new.notes, barcode = new.barcode, category = {_CATEGORY_NAME}
+        WHERE rowid = new.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS items_fts_delete AFTER DELETE ON items BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS items_fts_category_rename
+    AFTER UPDATE OF name ON categories BEGIN
+        UPDATE {FTS_TABLE} SET category = new.name
+        WHERE rowid IN (SELECT id FROM items WHERE category_id = new.id);
+    END""",
+)
+
+DROP_STATEMENTS = (
+    "DROP TRIGGER IF EXISTS items_fts_category_rename",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+)
+
+REBUILD_STATEMENTS = (
+    f"DELETE FROM {FTS_TABLE}",
+    f"""INSERT INTO {FTS_TABLE}(rowid, name, notes, barcode, category)
+        SELECT items.id, items.name, items.notes, items.barcode, categories.name
+        FROM items LEFT JOIN categories ON categories.id = items.category_id""",
+)
+
+# Follow the items table through create_all()/drop_all() (tests, fresh databases)
+for _statement in CREATE_STATEMENTS:
+    event.listen(models.Item.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+for _statement in DROP_STATEMENTS:
+    event.listen(models.Item.__table__, "before_drop", DDL(_statement).execute_if(dialect="sqlite"))
+
+
+def install(bind):
+    """
+    Create the index and triggers on an existing database (idempotent).
+    Databases created before the index existed are populated once.
+    """
+    if bind.dialect.name != "sqlite":
+        return
+    with bind.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": FTS_TABLE}
+        ).first()
+        for statement in CREATE_STATEMENTS:
+            conn.execute(text(statement))
+        if not exists:
+            rebuild(conn)
+
+
+def rebuild(conn: Connection):
+    """Re-index every item from scratch."""
+    for statement in REBUILD_STATEMENTS:
+        conn.execute(text(statement))
+
+
+def build_match_query(query: str) -> str:
+    """
+    Turn user input into an FTS5 MATCH expression: every word must match,
+    each as a prefix. Quoting the terms keeps FTS5 syntax characters in
+    user input from being interpreted.
+
+    "Feijão pre" -> '"Feijão"* AND "pre"*'
+    """
+    terms = re.findall(r"\w+", query)
+    return " AND ".join(f'"{term}"*' for term in terms)
+
+
+def search_items(db: Session, query: str, limit: int = 20, offset: int = 0) -> Tuple[List[models.Item], int]:
+    """
+    Ranked item search.
+
+    Returns:
+        (items for the requested page, best match first; total number of matches)
+    """
+    match = build_match_query(query)
+    if not match:
+        return [], 0
+
+    weights = ", ".join(str(w) for w in RANK_WEIGHTS)
+    rows = db.execute(
+        text(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match "
+            f"ORDER BY bm25({FTS_TABLE}, {weights}), rowid LIMIT :limit OFFSET :offset"
+        ),
+        {"match": match, "limit": limit, "offset": offset}
+    ).all()
+    total = db.execute(
+        text(f"SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match"), {"match": match}
+    ).scalar()
+
+    ids = [row[0] for row in rows]
+    if not ids:
+        return [], total
+    rows = db.query(models.Item).options(selectinload(models.Item.category)).filter(models.Item.id.in_(ids))
+    by_id = {i.id: i for i in rows}
+    return [by_id[i] for i in ids if i in by_id], total
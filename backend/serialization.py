@@ -0,0 +1,48 @@
+"""
+Fast JSON serialization for list responses.
+
+FastAPI's default path validates every returned object against the
+response model, converts it to Python primitives and then encodes it with
+the stdlib json module. For large lists we instead:
+- validate ORM rows once and let pydantic-core emit JSON bytes directly
+- dump dicts we built ourselves without validating them again
+"""
+import json
+from typing import Any, List, Type
+
+from pydantic import BaseModel, TypeAdapter
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+_adapters = {}
+
+
+def list_adapter(model: Type[BaseModel]) -> TypeAdapter:
+    """Cached TypeAdapter for List[model] (building one is not free)."""
+    adapter = _adapters.get(model)
+    if adapter is None:
+        adapter = TypeAdapter(List[model])
+        _adapters[model] = adapter
+    return adapter
+
+
+def dump_orm_list(model: Type[BaseModel], rows: list) -> bytes:
+    """
+    Validate ORM rows against ``model`` once and serialize them to JSON bytes.
+    """
+    adapter = list_adapter(model)
+    return adapter.dump_json(adapter.validate_python(rows, from_attributes=True))
+
+
+def dump_json(data: Any) -> bytes:
+    """
+    Serialize trusted primitives (dicts/lists we built) to JSON bytes.
+    Uses orjson when installed, falling back to the stdlib encoder.
+    """
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":")).encode()
@@ -0,0 +1,132 @@
+"""
+Application settings for the AInventory backend.
+Values are read from the environment; entrypoints call ``load_env_file()``
+first so an optional .env file is honoured.
+"""
+import os
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+
+DEFAULT_FRONTEND_DIR = os.path.join(os.path.dirname(__file__), "..", "frontend")
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_rate(name: str, default: Tuple[float, float]) -> Tuple[float, float]:
+    """A "rate,burst" pair such as "5,30" (5 requests/s, bursts of 30)."""
+    value = os.getenv(name)
+    if not value:
+        return default
+    rate, _, burst = value.partition(",")
+    return float(rate), float(burst or rate)
+
+
+def load_env_file() -> None:
+    """
+    Load .env into os.environ (existing variables win).
+    Only entrypoints call this: it mutates the process environment.
+    """
+    from dotenv import load_dotenv
+    load_dotenv()
+
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    Settings consumed by ``create_app``.
+    """
+    # Directory served under /static (None disables the mount)
+    frontend_dir: Optional[str] = DEFAULT_FRONTEND_DIR
+    cors_origins: Tuple[str, ...] = ("*",)
+    # Seed default categories and the admin user at startup
+    seed_on_startup: bool = True
+    # In-process response cache size (0 disables the cache)
+    response_cache_bytes: int = 8 * 1024 * 1024
+    # Optional SQLite file shared by workers as a second cache tier
+    response_cache_path: Optional[str] = None
+    response_cache_shared_bytes: int = 64 * 1024 * 1024
+    # Serve Prometheus metrics at /metrics, optionally only to scrapers sending this bearer token
+    metrics_enabled: bool = False
+    metrics_token: Optional[str] = None
+    # Directory where workers share metrics snapshots (multi-worker deployments)
+    metrics_dir: Optional[str] = None
+    # SQL profiling (see profiler.py): X-DB-* response headers, slow-query log
+    sql_debug_headers: bool = False
+    slow_query_ms: float = 100.0
+    slow_request_ms: float = 500.0
+    # Optional file for the slow-query log (it always goes to the backend.slow_queries logger)
+    slow_query_log: Optional[str] = None
+    # Users allowed to use admin tools (request profiling, traces)
+    admin_usernames: Tuple[str, ...] = ("admin",)
+    # On-demand request profiling (see request_profiling.py); False removes the middleware
+    request_profiling: bool = True
+    profile_dir: str = "./data/profiles"
+    profile_max_files: int = 50
+    profile_max_age_days: float = 7.0
+    # Request tracing (see tracing.py): recent traces kept in memory, optional JSONL file
+    tracing: bool = True
+    trace_buffer_size: int = 200
+    trace_file: Optional[str] = None
+    # Admission control (see rate_limit.py): (requests/s, burst) per user and route class
+    rate_limiting: bool = True
+    rate_limit_reads: Tuple[float, float] = (20.0, 100.0)
+    rate_limit_writes: Tuple[float, float] = (5.0, 30.0)
+    rate_limit_barcode: Tuple[float, float] = (1.0, 10.0)
+    rate_limit_login: Tuple[float, float] = (0.2, 10.0)
+    max_concurrent_writes: int = 8
+    # Optional SQLite file so all workers share the buckets
+    rate_limit_path: Optional[str] = None
+    # Group commit of quantity updates (see write_coalescer.py); 0 ms commits each one alone
+    write_coalesce_ms: float = 2.0
+    write_coalesce_max_batch: int = 256
+    # SQLite synchronous level for group commits: full, normal or off
+    write_durability: str = "full"
+    # Usage predictor (see ml_predictor.get_predictor): linear or segmented
+    ml_predictor: str = "linear"
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        """
+        Load settings from environment variables (see ``load_env_file``).
+        """
+        origins = os.getenv("CORS_ORIGINS")
+        return cls(
+            frontend_dir=os.getenv("FRONTEND_DIR", DEFAULT_FRONTEND_DIR),
+            cors_origins=tuple(o.strip() for o in origins.split(",")) if origins else ("*",),
+            seed_on_startup=_env_bool("SEED_ON_STARTUP", True),
+            response_cache_bytes=int(os.getenv("RESPONSE_CACHE_BYTES", cls.response_cache_bytes)),
+            response_cache_path=os.getenv("RESPONSE_CACHE_PATH") or None,
+            response_cache_shared_bytes=int(os.getenv("RESPONSE_CACHE_SHARED_BYTES", cls.response_cache_shared_bytes)),
+            metrics_enabled=_env_bool("METRICS_ENABLED", False),
+            metrics_token=os.getenv("METRICS_TOKEN") or None,
+            metrics_dir=os.getenv("METRICS_DIR") or None,
+            sql_debug_headers=_env_bool("SQL_DEBUG_HEADERS", False),
+            slow_query_ms=float(os.getenv("SLOW_QUERY_MS", cls.slow_query_ms)),
+            slow_request_ms=float(os.getenv("SLOW_REQUEST_MS", cls.slow_request_ms)),
+            slow_query_log=os.getenv("SLOW_QUERY_LOG") or None,
+            admin_usernames=tuple(u.strip() for u in os.getenv("ADMIN_USERNAMES", "admin").split(",") if u.strip()),
+            request_profiling=_env_bool("REQUEST_PROFILING", True),
+            profile_dir=os.getenv("PROFILE_DIR", cls.profile_dir),
+            profile_max_files=int(os.getenv("PROFILE_MAX_FILES", cls.profile_max_files)),
+            profile_max_age_days=float(os.getenv("PROFILE_MAX_AGE_DAYS", cls.profile_max_age_days)),
+            tracing=_env_bool("TRACING", True),
+            trace_buffer_size=int(os.getenv("TRACE_BUFFER_SIZE", cls.trace_buffer_size)),
+            trace_file=os.getenv("TRACE_FILE") or None,
+            rate_limiting=_env_bool("RATE_LIMITING", True),
+            rate_limit_reads=_env_rate("RATE_LIMIT_READS", cls.rate_limit_reads),
+            rate_limit_writes=_env_rate("RATE_LIMIT_WRITES", cls.rate_limit_writes),
+            rate_limit_barcode=_env_rate("RATE_LIMIT_BARCODE", cls.rate_limit_barcode),
+            rate_limit_login=_env_rate("RATE_LIMIT_LOGIN", cls.rate_limit_login),
+            max_concurrent_writes=int(os.getenv("MAX_CONCURRENT_WRITES", cls.max_concurrent_writes)),
+            rate_limit_path=os.getenv("RATE_LIMIT_PATH") or None,
+            write_coalesce_ms=float(os.getenv("WRITE_COALESCE_MS", cls.write_coalesce_ms)),
+            write_coalesce_max_batch=int(os.getenv("WRITE_COALESCE_MAX_BATCH", cls.write_coalesce_max_batch)),
+            write_durability=os.getenv("WRITE_DURABILITY", cls.write_durability).strip().lower(),
+            ml_predictor=os.getenv("ML_PREDICTOR", cls.ml_predictor).strip().lower(),
+        )
@@ -8,6 +8,9 @@ import httpx
 from datetime import datetime, timedelta
 from typing import Optional
 import logging
+import time
+
+from . import metrics, tracing
 
 logger = logging.getLogger(__name__)
 
@@ -33,6 +36,7 @@ def mark_sms_sent(item_id: int):
     _sent_messages[f"item_{item_id}"] = datetime.now()
 
 
+@tracing.traced(kind=tracing.SPAN_KIND_CLIENT)
 async def send_sms(phone: str, message: str, item_id: Optional[int] = None) -> bool:
     """
     Send SMS via Textbelt API
@@ -47,8 +51,10 @@ async def send_sms(phone: str, message: str, item_id: Optional[int] = None) -> b
     """
     if item_id and not can_send_sms(item_id):
         logger.info(f"SMS for item {item_id} already sent in last 24h, skipping")
+        metrics.SMS_SENDS.inc("rate_limited")
         return False
     
+    start = time.perf_counter()
     try:
         async with httpx.AsyncClient() as client:
             response = await client.post(
@@ -65,17 +71,22 @@ async def send_sms(phone: str, message: str, item_id: Optional[int] = None) -> b
             
             if result.get("success"):
                 logger.info(f"SMS sent successfully to {phone}")
+                metrics.SMS_SENDS.inc("sent")
                 if item_id:
                     mark_sms_sent(item_id)
                 return True
             else:
                 error = result.get("error", "Unknown error")
                 logger.error(f"Failed to send SMS: {error}")
+                metrics.SMS_SENDS.inc("failed")
                 return False
                 
     except Exception as e:
         logger.error(f"Error sending SMS: {e}")
+        metrics.SMS_SENDS.inc("error")
         return False
+    finally:
+        metrics.SMS_DURATION.observe(time.perf_counter() - start)
 
 
 def calculate_suggested_quantity(
@@ -1,6 +1,8 @@
 """
 Pytest configuration and fixtures for the Inventory Control application.
 """
+from contextlib import contextmanager
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
@@ -15,7 +17,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from backend.database import Base, get_db
 from backend.main import app
-from backend import models
+from backend import models, profiler
 
 
 # Create in-memory SQLite database for testing
@@ -56,6 +58,11 @@ def client(db_session):
     Base.metadata.create_all(bind=engine)
     
     app.dependency_overrides[get_db] = override_get_db
+    # Tables are recreated per test, so cached responses must not leak across tests
+    if app.state.response_cache is not None:
+        app.state.response_cache.clear()
+    if app.state.rate_limiter is not None:
+        app.state.rate_limiter.reset()
     
     with TestClient(app) as test_client:
         yield test_client
@@ -93,3 +100,24 @@ def sample_item(db_session, sample_category):
     db_session.commit()
     db_session.refresh(item)
     return item
+
+
+@pytest.fixture
+def assert_max_queries():
+    """
+    Fail if any request made inside the block runs more than ``limit`` SQL
+    statements::
+
+        with assert_max_queries(5):
+            client.get("/items", headers=auth_headers)
+    """
+    @contextmanager
+    def check(limit: int):
+        with profiler.capture_profiles() as profiles:
+            yield profiles
+        over = [p for p in profiles if p.queries > limit]
+        assert not over, "; ".join(
+            f"{p.summary()} (max {limit})" + "".join(f"\n  {n}x {shape}" for shape, n in p.repeated(2))
+            for p in over
+        )
+    return check
@@ -0,0 +1,94 @@
+"""
+Tests for the consumption rollups and GET /analytics/consumption.
+"""
+import json
+from datetime import datetime, timedelta
+
+from backend import analytics, models
+
+
+def _put(client, auth_headers, item_id, quantity):
+    response = client.put(f"/items/{item_id}", headers=auth_headers, json={"current_quantity": quantity})
+    assert response.status_code == 200
+
+
+def _consumption(client, auth_headers, **params):
+    response = client.get("/analytics/consumption", headers=auth_headers, params=params)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_quantity_updates_roll_up_per_item_and_category(client, auth_headers, sample_item, db_session):
+    for quantity in (3.0, 1.5, 10.0, 9.0):  # -2, -1.5, +8.5, -1
+        _put(client, auth_headers, sample_item.id, quantity)
+    client.put(f"/items/{sample_item.id}", headers=auth_headers, json={"notes": "no quantity change"})
+    today = datetime.utcnow().date().isoformat()
+
+    [by_category] = _consumption(client, auth_headers)
+    assert by_category == {
+        "period": today, "category_id": sample_item.category_id, "consumed": 4.5, "restocked": 8.5
+    }
+    [by_item] = _consumption(client, auth_headers, group_by="item")
+    assert by_item["item_id"] == sample_item.id and by_item["consumed"] == 4.5
+    [total] = _consumption(client, auth_headers, group_by="total", granularity="month")
+    assert total["period"] == today[:8] + "01"
+    assert "category_id" not in total and "item_id" not in total
+
+    row = db_session.query(models.ItemConsumptionDaily).one()
+    assert row.changes == 4
+
+
+def test_ranges_and_granularities_are_single_indexed_aggregates(
+    client, auth_headers, sample_item, db_session, assert_max_queries
+):
+    monday = datetime(2024, 3, 4)
+    for offset, change in [(0, -1.0), (2, -2.0), (6, 5.0), (7, -4.0), (31, -8.0)]:
+        analytics.record_change(db_session, sample_item.id, sample_item.category_id, change, monday + timedelta(days=offset))
+    db_session.commit()
+
+    params = {"start": "2024-03-01", "end": "2024-04-30", "group_by": "item", "item_id": sample_item.id}
+    with assert_max_queries(4):
+        weekly = _consumption(client, auth_headers, granularity="week", **params)
+    assert [(p["period"], p["consumed"], p["restocked"]) for p in weekly] == [
+        ("2024-03-04", 3.0, 5.0), ("2024-03-11", 4.0, 0.0), ("2024-04-01", 8.0, 0.0)
+    ]
+    monthly = _consumption(client, auth_headers, granularity="month", **params)
+    assert [(p["period"], p["consumed"]) for p in monthly] == [("2024-03-01", 7.0), ("2024-04-01", 8.0)]
+    daily = _consumption(client, auth_headers, start="2024-03-05", end="2024-03-11", category_id=sample_item.category_id)
+    assert [p["period"] for p in daily] == ["2024-03-06", "2024-03-10", "2024-03-11"]
+
+    response = client.get("/analytics/consumption", headers=auth_headers, params={"start": "2024-05-01", "end": "2024-04-01"})
+    assert response.status_code == 400
+    response = client.get("/analytics/consumption", headers=auth_headers, params={"granularity": "hour"})
+    assert response.status_code == 422
+
+
+def test_backfill_rolls_up_stored_histories_once(db_session, sample_category):
+    history = [
+        {"date": "2024-01-07T20:00:00", "quantity": 4.0, "change": -3.0, "period": "week", "start": "2024-01-01",
+         "min": 4.0, "max": 9.0, "consumed": 5.0, "restocked": 2.0, "count": 6},
+        {"date": "2024-02-01T09:00:00", "quantity": 3.0, "change": -1.0},
+        {"date": "2024-02-01T18:00:00", "quantity": 12.0, "change": 9.0},
+    ]
+    item = models.Item(
+        name="Oats", category_id=sample_category.id, current_quantity=12.0,
+        minimum_quantity=1.0, quantity_history=json.dumps(history)
+    )
+    db_session.add(item)
+    db_session.commit()
+
+    assert analytics.backfill(db_session) == 1
+    assert analytics.backfill(db_session) == 0
+    rows = analytics.consumption(db_session, datetime(2024, 1, 1).date(), datetime(2024, 2, 28).date())
+    assert [(r["period"], r["consumed"], r["restocked"]) for r in rows] == [
+        ("2024-01-01", 5.0, 2.0), ("2024-02-01", 1.0, 9.0)
+    ]
+
+
+def test_deleted_items_leave_their_category_totals(client, auth_headers, sample_item, db_session):
+    _put(client, auth_headers, sample_item.id, 1.0)
+    assert client.delete(f"/items/{sample_item.id}", headers=auth_headers).status_code == 200
+
+    assert _consumption(client, auth_headers, group_by="item") == []
+    [by_category] = _consumption(client, auth_headers)
+    assert by_category["consumed"] == 4.0
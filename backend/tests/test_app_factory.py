@@ -0,0 +1,83 @@
+"""
+Tests for the application factory and side-effect-free imports.
+"""
+import json
+import os
+import subprocess
+import sys
+
+from fastapi.testclient import TestClient
+
+from backend.main import create_app
+from backend.settings import Settings
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def test_import_has_no_side_effects(tmp_path):
+    """Importing backend.main must not touch the filesystem, read .env or load sklearn."""
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    result = subprocess.run(
+        [sys.executable, "-c",
+         "import json, sys, backend.main; print(json.dumps([m in sys.modules for m in ('sklearn', 'dotenv')]))"],
+        cwd=tmp_path, env=env, capture_output=True, text=True, check=True,
+    )
+    assert json.loads(result.stdout) == [False, False]
+    assert not (tmp_path / "data").exists()
+
+
+def test_create_app_uses_settings():
+    app = create_app(Settings(frontend_dir=None, seed_on_startup=False))
+    assert app.state.settings.seed_on_startup is False
+    assert not any(getattr(r, "name", None) == "static" for r in app.routes)
+
+
+def test_predictor_comes_from_settings(monkeypatch):
+    """ML_PREDICTOR is read with the other settings."""
+    from backend.ml_predictor import MLPredictor, SegmentedPredictor
+
+    assert type(create_app(Settings(frontend_dir=None)).state.ml_predictor) is MLPredictor
+    monkeypatch.setenv("ML_PREDICTOR", "Segmented")
+    settings = Settings.from_env()
+    assert settings.ml_predictor == "segmented"
+    assert type(create_app(settings).state.ml_predictor) is SegmentedPredictor
+
+
+def test_lifespan_seeds_through_dependency_overrides(client, db_session):
+    """The lifespan handler seeds the database the app is configured with."""
+    from backend import models
+    names = {c.name for c in db_session.query(models.Category).all()}
+    assert "Alimentos" in names
+    assert db_session.query(models.User).filter(models.User.username == "admin").first()
+
+
+def test_lifespan_can_skip_seeding(db_session):
+    from backend.database import get_db
+    from backend.tests.conftest import override_get_db
+    from backend import models
+
+    app = create_app(Settings(frontend_dir=None, seed_on_startup=False))
+    app.dependency_overrides[get_db] = override_get_db
+    with TestClient(app):
+        pass
+    assert db_session.query(models.Category).count() == 0
+
+
+def test_init_db_adds_missing_columns(tmp_path):
+    """Databases created by older releases get new columns on startup."""
+    from sqlalchemy import create_engine, inspect, text
+    from backend.database import init_db
+
+    engine = create_engine(f"sqlite:///{tmp_path}/old.db")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, name VARCHAR)"))
+        conn.execute(text("INSERT INTO items (name) VALUES ('Arroz')"))
+
+    init_db(engine)
+
+    columns = {c["name"] for c in inspect(engine).get_columns("items")}
+    assert {"quantity_history", "predicted_usage_rate"} <= columns
+    indexes = {i["name"] for i in inspect(engine).get_indexes("items")}
+    assert {"ix_items_last_checked_at", "ix_items_is_low_stock", "ix_items_barcode_normalized"} <= indexes
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT name FROM items")).scalar() == "Arroz"
@@ -0,0 +1,73 @@
+"""
+Tests for the prediction backtest harness.
+"""
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend import models
+from backend.backtest import actual_depletion_days, backtest, load_items, replay_item, synthetic_items
+from backend.tests.conftest import TestingSessionLocal
+
+
+def _steady_history(days=40, rate=2.0, restock_at=10.0, refill=40.0):
+    """Daily checks consuming ``rate``; restocks are recorded separately, an hour later."""
+    start = datetime(2024, 1, 1, 9)
+    quantity, history = refill, []
+    for day in range(days):
+        quantity -= rate
+        date = start + timedelta(days=day)
+        history.append({"date": date.isoformat(), "quantity": quantity, "change": -rate})
+        if quantity < restock_at:
+            quantity += refill
+            history.append({"date": (date + timedelta(hours=1)).isoformat(), "quantity": quantity, "change": refill})
+    return history
+
+
+def test_actual_depletion_interpolates_and_ignores_restocks():
+    times = [0.0, 1.0, 2.0, 3.0, 4.0]
+    consumed = [0.0, 2.0, 0.0, 2.0, 2.0]  # A restock on day 2 consumes nothing
+    assert actual_depletion_days(times, consumed, 0, 3.0) == pytest.approx(2.5)
+    assert actual_depletion_days(times, consumed, 0, 6.0) == pytest.approx(4.0)
+    assert actual_depletion_days(times, consumed, 0, 7.0) is None
+    assert actual_depletion_days(times, consumed, 2, 0.0) == 0.0
+
+
+def test_exact_rate_scores_perfectly():
+    item = {"history": _steady_history(), "usage_rate": 14.0, "usage_period": "weekly"}
+    results = replay_item(item, ["user_rate", "average"])
+    assert results["user_rate"]["errors"] and results["user_rate"]["missed"] == 0
+    # Within the hour between a check and its restock record
+    assert max(abs(e) for e in results["user_rate"]["errors"]) < 0.05
+    # Restocks never count as consumption, so the average stays close
+    assert max(abs(e) for e in results["average"]["errors"]) < 0.25
+
+
+def test_backtest_runs_batches_on_worker_processes():
+    items = synthetic_items(12, months=3, seed=1)
+    parallel = backtest(items, ["user_rate", "average", "ml", "segmented"], workers=2, batch_size=5)
+    inline = backtest(items, ["user_rate", "average", "ml", "segmented"], workers=0, batch_size=5)
+
+    assert parallel["items"] == 12
+    for name, summary in parallel["strategies"].items():
+        assert summary["points"] > 0
+        assert 0 <= summary["coverage"] <= 1
+        assert summary["runtime_s"] >= 0
+        assert {k: v for k, v in summary.items() if k not in ("runtime_s", "us_per_prediction")} == {
+            k: v for k, v in inline["strategies"][name].items() if k not in ("runtime_s", "us_per_prediction")
+        }
+    with pytest.raises(ValueError):
+        backtest(items, ["crystal_ball"])
+
+
+def test_items_are_loaded_from_the_database(db_session, sample_category):
+    db_session.add_all([
+        models.Item(name="Rice", category_id=sample_category.id, current_quantity=1.0,
+                    quantity_history=json.dumps(_steady_history(days=10, restock_at=0.0)), usage_rate=2.0),
+        models.Item(name="Salt", category_id=sample_category.id, current_quantity=1.0),
+    ])
+    db_session.commit()
+
+    [item] = load_items(TestingSessionLocal)
+    assert item["usage_rate"] == 2.0 and len(item["history"]) == 10
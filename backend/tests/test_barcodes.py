@@ -0,0 +1,95 @@
+"""
+Tests for barcode normalization, lookup and identify short-circuit.
+"""
+from sqlalchemy import text
+
+from backend import barcodes, models
+from backend.barcodes import normalize_barcode
+
+
+def _create(client, auth_headers, category_id, name, barcode):
+    return client.post("/items", headers=auth_headers, json={
+        "name": name, "category_id": category_id, "unit": "un",
+        "current_quantity": 1.0, "minimum_quantity": 1.0, "barcode": barcode
+    })
+
+
+def test_normalize_barcode():
+    assert normalize_barcode("7891000100103") == "07891000100103"
+    assert normalize_barcode(" 7 891000-100103 ") == "07891000100103"
+    # UPC-A and its EAN-13 form share a key
+    assert normalize_barcode("012345678905") == normalize_barcode("0012345678905")
+    assert normalize_barcode("abc-123") == "ABC123"
+    assert normalize_barcode("  ") is None
+    assert normalize_barcode(None) is None
+
+
+def test_lookup_by_barcode(client, auth_headers, sample_category):
+    item_id = _create(client, auth_headers, sample_category.id, "Café", "7891000100103").json()["id"]
+
+    response = client.get("/items/by-barcode/7%20891000%20100103", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["id"] == item_id
+    assert client.get("/items/by-barcode/000000", headers=auth_headers).status_code == 404
+
+
+def test_barcode_is_unique(client, auth_headers, sample_category):
+    first = _create(client, auth_headers, sample_category.id, "Café", "7891000100103").json()["id"]
+    duplicate = _create(client, auth_headers, sample_category.id, "Café 2", "07891000100103")
+    assert duplicate.status_code == 409
+
+    other = _create(client, auth_headers, sample_category.id, "Chá", None).json()["id"]
+    response = client.put(f"/items/{other}", headers=auth_headers, json={"barcode": "7891000100103"})
+    assert response.status_code == 409
+    # Re-saving an item's own barcode is fine
+    assert client.put(f"/items/{first}", headers=auth_headers, json={"barcode": "7891000100103"}).status_code == 200
+
+
+def test_identify_resolves_known_barcode_without_image(client, auth_headers, sample_category):
+    item_id = _create(client, auth_headers, sample_category.id, "Café", "7891000100103").json()["id"]
+
+    result = client.post("/barcode/identify", headers=auth_headers, json={"barcode": "7891000100103"}).json()
+    assert result["success"] is True
+    assert result["item_id"] == item_id
+    assert result["product_name"] == "Café"
+    assert result["suggested_category"] == sample_category.name
+
+    unknown = client.post("/barcode/identify", headers=auth_headers, json={"barcode": "123"}).json()
+    assert unknown["success"] is False
+    assert unknown["item_id"] is None
+
+
+def test_backfill_keeps_oldest_of_duplicate_barcodes(db_session, sample_category):
+    db_session.execute(text("DROP INDEX ix_items_barcode_normalized"))
+    for name, code in (("A", "7891000100103"), ("B", "07891000100103"), ("C", "ABC")):
+        db_session.execute(
+            text("INSERT INTO items (name, category_id, barcode) VALUES (:name, :category, :code)"),
+            {"name": name, "category": sample_category.id, "code": code}
+        )
+
+    assert barcodes.backfill_normalized_barcodes(db_session) == 2
+    db_session.commit()
+    keys = dict(db_session.query(models.Item.name, models.Item.barcode_normalized))
+    assert keys == {"A": "07891000100103", "B": None, "C": "ABC"}
+    indexes = db_session.execute(text("PRAGMA index_list(items)")).all()
+    assert any(row[1] == barcodes.UNIQUE_INDEX and row[2] for row in indexes)
+
+
+def test_update_keeps_unindexed_duplicate_unindexed(db_session, sample_category):
+    db_session.execute(text("DROP INDEX ix_items_barcode_normalized"))
+    for name in ("Old", "Newer"):
+        db_session.execute(
+            text("INSERT INTO items (name, category_id, barcode) VALUES (:name, :category, '123')"),
+            {"name": name, "category": sample_category.id}
+        )
+    barcodes.backfill_normalized_barcodes(db_session)
+    db_session.commit()
+
+    duplicate = db_session.query(models.Item).filter(models.Item.name == "Newer").one()
+    duplicate.current_quantity = 5.0
+    db_session.commit()
+    assert duplicate.barcode_normalized is None
+
+    duplicate.barcode = "456"
+    db_session.commit()
+    assert duplicate.barcode_normalized == "456"
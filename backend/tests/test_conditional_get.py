@@ -0,0 +1,82 @@
+"""
+Tests for ETag / Last-Modified conditional GET support.
+"""
+import pytest
+
+
+@pytest.mark.parametrize("path", ["/items", "/categories", "/shopping-list"])
+def test_matching_etag_returns_304(client, auth_headers, path):
+    first = client.get(path, headers=auth_headers)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert etag.startswith('"') and etag.endswith('"')
+
+    second = client.get(path, headers={**auth_headers, "If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.content == b""
+    assert second.headers["ETag"] == etag
+
+
+def test_item_write_changes_item_validators(client, auth_headers, sample_category):
+    items_etag = client.get("/items", headers=auth_headers).headers["ETag"]
+    categories_etag = client.get("/categories", headers=auth_headers).headers["ETag"]
+
+    client.post("/items", headers=auth_headers, json={
+        "name": "Milk", "category_id": sample_category.id, "unit": "L",
+        "current_quantity": 1.0, "minimum_quantity": 2.0
+    })
+
+    items = client.get("/items", headers={**auth_headers, "If-None-Match": items_etag})
+    assert items.status_code == 200
+    assert items.headers["ETag"] != items_etag
+    assert [i["name"] for i in items.json()] == ["Milk"]
+
+    # Categories did not change
+    categories = client.get("/categories", headers={**auth_headers, "If-None-Match": categories_etag})
+    assert categories.status_code == 304
+
+
+def test_category_write_invalidates_items(client, auth_headers):
+    """Items embed their category, so category writes change /items too."""
+    items_etag = client.get("/items", headers=auth_headers).headers["ETag"]
+    client.post("/categories", headers=auth_headers, json={"name": "Nova", "icon": "N", "color": "#000"})
+    response = client.get("/items", headers={**auth_headers, "If-None-Match": items_etag})
+    assert response.status_code == 200
+
+
+def test_if_modified_since(client, auth_headers):
+    first = client.get("/categories", headers=auth_headers)
+    last_modified = first.headers["Last-Modified"]
+
+    response = client.get("/categories", headers={**auth_headers, "If-Modified-Since": last_modified})
+    assert response.status_code == 304
+
+    stale = client.get("/categories", headers={**auth_headers, "If-Modified-Since": "Mon, 01 Jan 2001 00:00:00 GMT"})
+    assert stale.status_code == 200
+
+
+def test_conditional_get_still_requires_auth(client, auth_headers):
+    etag = client.get("/items", headers=auth_headers).headers["ETag"]
+    response = client.get("/items", headers={"If-None-Match": etag})
+    assert response.status_code == 401
+
+
+def test_low_stock_sms_changes_item_validators(client, auth_headers, db_session, test_user, sample_item, monkeypatch):
+    """Recording last_sms_sent_at is an item write like any other."""
+    from backend import sms_service, versioning
+
+    test_user.phone_number = "+5511999990000"
+    db_session.commit()
+    seen = []
+
+    async def fake_send_sms(phone, message, item_id=None):
+        seen.append(versioning.get_versions(db_session, [versioning.ITEMS])[versioning.ITEMS][0])
+        return True
+
+    monkeypatch.setattr(sms_service, "send_sms", fake_send_sms)
+    response = client.put(f"/items/{sample_item.id}", headers=auth_headers, json={"current_quantity": 1.0})
+    assert response.status_code == 200
+
+    db_session.expire_all()
+    assert seen
+    assert versioning.get_versions(db_session, [versioning.ITEMS])[versioning.ITEMS][0] == seen[0] + 1
@@ -0,0 +1,109 @@
+"""
+Tests for CSV bulk import.
+"""
+import json
+
+from backend import models
+from backend.csv_import import normalize_text, read_rows
+
+
+def _post_csv(client, auth_headers, text, **params):
+    return client.post(
+        "/items/import-csv",
+        headers={**auth_headers, "Content-Type": "text/csv"},
+        params=params,
+        content=text.encode()
+    )
+
+
+def test_read_rows_handles_portuguese_headers_and_decimal_comma():
+    text = "Nome;Categoria;Quantidade;Mínimo;Unidade\nFeijão;Grãos;1,5;0,5;kg\n;;;;\n"
+    rows = list(read_rows(text))
+    assert rows == [(1, {
+        "name": "Feijão", "category": "Grãos", "current_quantity": "1.5",
+        "minimum_quantity": "0.5", "unit": "kg"
+    })]
+    assert normalize_text("  Feijão  PRETO ") == "feijao preto"
+
+
+def test_dry_run_reports_diff_without_writing(client, auth_headers, sample_item, db_session):
+    text = (
+        "name,category,current_quantity,minimum_quantity,unit,barcode\n"
+        f"{sample_item.name},Test Category,3,{sample_item.minimum_quantity},{sample_item.unit},\n"
+        "Arroz,Mercearia,5,1,kg,7891\n"
+        "arroz,Mercearia,6,1,kg,\n"
+        "Sem categoria,,1,1,un,\n"
+    )
+    response = _post_csv(client, auth_headers, text, dry_run="true")
+    assert response.status_code == 200
+    result = response.json()
+
+    assert result["dry_run"] is True
+    assert (result["created"], result["updated"], result["skipped"], result["errors"]) == (1, 1, 1, 1)
+    assert result["categories_created"] == ["Mercearia"]
+    update = next(r for r in result["rows"] if r["action"] == "update")
+    assert update["item_id"] == sample_item.id
+    assert update["changes"] == {"current_quantity": 3.0}
+
+    db_session.expire_all()
+    assert db_session.query(models.Item).count() == 1
+    assert db_session.query(models.Category).filter(models.Category.name == "Mercearia").count() == 0
+
+
+def test_import_creates_and_updates_matching_barcode_first(client, auth_headers, sample_category, db_session):
+    existing_id = client.post("/items", headers=auth_headers, json={
+        "name": "Leite", "category_id": sample_category.id, "unit": "L",
+        "current_quantity": 4.0, "minimum_quantity": 1.0, "barcode": "7893"
+    }).json()["id"]
+
+    text = (
+        "nome;categoria;quantidade;minimo;unidade;ean\n"
+        "Leite Integral;test category;2,5;1;L;7893\n"
+        "Café;Bebidas;1;0,5;kg;\n"
+    )
+    result = _post_csv(client, auth_headers, text).json()
+    assert result["dry_run"] is False
+    assert (result["created"], result["updated"], result["errors"]) == (1, 1, 0)
+
+    db_session.expire_all()
+    milk = db_session.query(models.Item).filter(models.Item.id == existing_id).one()
+    assert milk.name == "Leite Integral"
+    assert milk.current_quantity == 2.5
+    assert milk.category_id == sample_category.id
+    assert json.loads(milk.quantity_history)[-1]["change"] == -1.5
+    assert milk.last_checked_at is not None
+
+    coffee = db_session.query(models.Item).filter(models.Item.name == "Café").one()
+    assert coffee.category.name == "Bebidas"
+    assert coffee.is_low_stock is False
+
+    # The import invalidates cached item lists
+    names = {i["name"] for i in client.get("/items", headers=auth_headers).json()}
+    assert names == {"Leite Integral", "Café"}
+
+
+def test_unknown_category_is_an_error_when_creation_disabled(client, auth_headers):
+    text = "name,category,current_quantity,minimum_quantity,unit\nAdubo,Jardinagem,2,1,un\n"
+    result = _post_csv(client, auth_headers, text, create_categories="false").json()
+    assert result["created"] == 0
+    assert result["errors"] == 1
+    assert "Jardinagem" in result["rows"][0]["error"]
+
+
+def test_barcode_of_another_item_is_an_error(client, auth_headers, sample_category, db_session):
+    for name, barcode in (("Leite", None), ("Pão", "7893")):
+        client.post("/items", headers=auth_headers, json={
+            "name": name, "category_id": sample_category.id, "unit": "un",
+            "current_quantity": 1.0, "minimum_quantity": 1.0, "barcode": barcode
+        })
+
+    text = "name,category,current_quantity,minimum_quantity,unit,barcode\nLeite,Test Category,3,1,un,7893\n"
+    response = _post_csv(client, auth_headers, text)
+    assert response.status_code == 200
+    result = response.json()
+    assert (result["updated"], result["errors"]) == (0, 1)
+    assert "belongs to item" in result["rows"][0]["error"]
+
+    db_session.expire_all()
+    names = {i.name: i.barcode for i in db_session.query(models.Item)}
+    assert names == {"Leite": None, "Pão": "7893"}
@@ -0,0 +1,109 @@
+"""
+Tests for the inventory change stream.
+"""
+import asyncio
+import json
+import threading
+
+from backend import events, models
+from backend.events import EventBroker, sse_stream
+
+
+def _new_events(since_id):
+    return [e for e in events.broker.recent() if e["id"] > since_id]
+
+
+def _last_id():
+    recent = events.broker.recent()
+    return recent[-1]["id"] if recent else 0
+
+
+def test_publish_from_another_thread_reaches_subscriber():
+    broker = EventBroker()
+
+    async def scenario():
+        subscription = broker.subscribe()
+        thread = threading.Thread(target=broker.publish, args=([{"type": "item.updated", "data": {"id": 1}}],))
+        thread.start()
+        event = await asyncio.wait_for(subscription.queue.get(), timeout=1)
+        thread.join()
+        return event
+
+    event = asyncio.run(scenario())
+    assert event["type"] == "item.updated"
+    assert event["id"] == 1
+
+
+def test_slow_consumer_gets_resync_and_is_dropped():
+    broker = EventBroker(queue_size=3)
+
+    async def scenario():
+        subscription = broker.subscribe()
+        broker.publish([{"type": "item.updated", "data": {"id": i}} for i in range(10)])
+        await asyncio.sleep(0)  # Let the scheduled deliveries run
+        return [chunk async for chunk in sse_stream(subscription, broker, heartbeat=0.1)]
+
+    chunks = asyncio.run(scenario())
+    assert chunks[0].startswith(b"retry:")
+    assert len(chunks) == 2
+    assert b"event: resync" in chunks[1]
+    assert broker.subscriber_count == 0
+    assert broker.dropped == 1
+
+
+def test_resume_replays_missed_events_or_asks_for_resync():
+    broker = EventBroker(replay_size=3)
+    broker.publish([{"type": "item.updated", "data": {"id": i}} for i in range(5)])  # ids 1-5, 3-5 kept
+
+    async def first_events(last_event_id):
+        subscription = broker.subscribe(last_event_id=last_event_id)
+        await asyncio.sleep(0)
+        items = []
+        while not subscription.queue.empty():
+            items.append(subscription.queue.get_nowait())
+        return items
+
+    assert [e["id"] for e in asyncio.run(first_events(3))] == [4, 5]
+    assert [e["type"] for e in asyncio.run(first_events(1))] == ["resync"]
+
+
+def test_committed_writes_publish_events(client, auth_headers, sample_category):
+    start = _last_id()
+    item_id = client.post("/items", headers=auth_headers, json={
+        "name": "Arroz", "category_id": sample_category.id, "unit": "kg",
+        "current_quantity": 5.0, "minimum_quantity": 2.0
+    }).json()["id"]
+    client.put(f"/items/{item_id}", headers=auth_headers, json={"current_quantity": 1.0})
+    client.put(f"/items/{item_id}", headers=auth_headers, json={"current_quantity": 3.0})
+    client.delete(f"/items/{item_id}", headers=auth_headers)
+
+    types = [e["type"] for e in _new_events(start)]
+    assert types == [
+        "item.created",
+        "item.updated", "item.low_stock",
+        "item.updated", "item.restocked",
+        "item.deleted",
+    ]
+    low = next(e for e in _new_events(start) if e["type"] == "item.low_stock")
+    assert low["data"]["id"] == item_id
+    assert low["data"]["current_quantity"] == 1.0
+    json.dumps(low)
+
+
+def test_rolled_back_and_bulk_writes(db_session, sample_category):
+    start = _last_id()
+    db_session.add(models.Item(name="Temp", category_id=sample_category.id, current_quantity=1.0, minimum_quantity=1.0, unit="un"))
+    db_session.flush()
+    db_session.rollback()
+    assert _new_events(start) == []
+
+    db_session.add_all([
+        models.Item(name=f"Item {i}", category_id=sample_category.id, current_quantity=1.0, minimum_quantity=1.0, unit="un")
+        for i in range(events.BULK_THRESHOLD + 1)
+    ])
+    db_session.commit()
+    assert [(e["type"], e["count"]) for e in _new_events(start)] == [("items.bulk", events.BULK_THRESHOLD + 1)]
+
+
+def test_events_requires_auth(client):
+    assert client.get("/events").status_code == 401
@@ -0,0 +1,42 @@
+"""
+Tests for the hot-path micro-benchmark harness.
+"""
+from datetime import datetime
+
+from backend.benchmarks.hot_paths import compare, main, make_history, run
+
+
+def test_make_history_is_ordered_and_deterministic():
+    history = make_history(50)
+    dates = [datetime.fromisoformat(r["date"]) for r in history]
+    assert len(history) == 50
+    assert dates == sorted(dates)
+    assert history == make_history(50)
+    assert any(r["change"] > 0 for r in history)  # Includes restocks
+
+
+def test_run_times_every_case():
+    results = run(sizes=[5], repeat=2, min_time=0.001)["results"]
+    assert set(results) == {
+        "calculate_suggested_quantity",
+        "predict_usage_rate[n=5]", "get_prediction_confidence[n=5]", "parse_history_points[n=5]",
+        "segmented_predict_usage_rate[n=5]",
+        "add_quantity_record[n=5]", "get_history_as_list[n=5]", "needs_check_reminder[n=5]",
+    }
+    assert all(r["min_us"] > 0 and r["min_us"] <= r["median_us"] for r in results.values())
+
+
+def test_compare_flags_only_real_regressions():
+    baseline = {"results": {"a": {"min_us": 100.0}, "b": {"min_us": 0.5}, "c": {"min_us": 10.0}}}
+    current = {"results": {"a": {"min_us": 180.0}, "b": {"min_us": 1.2}, "c": {"min_us": 12.0}, "new": {"min_us": 5.0}}}
+    regressions = compare(current, baseline, threshold=1.5, min_delta_us=1.0)
+    assert [r["case"] for r in regressions] == ["a"]
+    assert regressions[0]["ratio"] == 1.8
+
+
+def test_cli_saves_baseline_and_passes_against_it(tmp_path, capsys):
+    baseline = tmp_path / "baseline.json"
+    args = ["--sizes", "5", "--repeat", "1", "--min-time", "0.001", "--only", "get_history_as_list", "--baseline", str(baseline)]
+    assert main(args + ["--save-baseline"]) == 0
+    assert baseline.exists()
+    assert main(args + ["--threshold", "1000"]) == 0
@@ -96,3 +96,47 @@ def test_delete_item(client, auth_headers):
     # Verify gone
     get_res = client.get(f"/items/{item_id}", headers=auth_headers)
     assert get_res.status_code == 404
+
+def test_alerts_use_stored_check_and_low_stock_columns(client, auth_headers, db_session):
+    from datetime import datetime, timedelta
+    from backend import models
+    
+    cat_id = client.post("/categories", headers=auth_headers, json={"name": "TestCatAlerts", "icon": "T", "color": "#000"}).json()["id"]
+    
+    def create(name, current, minimum):
+        return client.post(
+            "/items",
+            headers=auth_headers,
+            json={"name": name, "category_id": cat_id, "unit": "un",
+                  "current_quantity": current, "minimum_quantity": minimum}
+        ).json()["id"]
+    
+    never_checked = create("Never Checked", 5.0, 1.0)
+    checked = create("Checked", 5.0, 1.0)
+    stale = create("Stale", 5.0, 1.0)
+    low = create("Low", 5.0, 1.0)
+    
+    for item_id in (checked, stale):
+        client.put(f"/items/{item_id}", headers=auth_headers, json={"current_quantity": 4.0})
+    client.put(f"/items/{low}", headers=auth_headers, json={"current_quantity": 0.0})
+    
+    db_session.query(models.Item).filter(models.Item.id == stale).update(
+        {models.Item.last_checked_at: datetime.utcnow() - timedelta(days=8)}
+    )
+    db_session.commit()
+    
+    response = client.get("/items/alerts/needed", headers=auth_headers)
+    assert response.status_code == 200
+    alerts = {a["id"]: a for a in response.json()}
+    
+    assert set(alerts) == {never_checked, stale, low}
+    assert alerts[never_checked]["needs_quantity_check"] is True
+    assert alerts[stale]["needs_quantity_check"] is True
+    assert alerts[low]["needs_quantity_check"] is False
+    assert alerts[low]["is_low_stock"] is True
+    assert alerts[low]["is_critical"] is True
+    
+    # Restocking clears the stored low-stock flag
+    client.put(f"/items/{low}", headers=auth_headers, json={"current_quantity": 3.0})
+    alerts = {a["id"] for a in client.get("/items/alerts/needed", headers=auth_headers).json()}
+    assert low not in alerts
@@ -0,0 +1,72 @@
+"""
+Tests for the load-test household generator and driver.
+"""
+import asyncio
+import json
+import random
+from datetime import datetime
+
+import httpx
+
+from backend import models, sms_service
+from backend.benchmarks.load_test import (
+    Stats, build_app, drive, fake_external_services, generate_household, make_history, percentile, summarize
+)
+from backend.usage_tracker import MAX_HISTORY_SIZE
+
+
+def test_make_history_consumes_and_restocks():
+    history = make_history(random.Random(1), datetime(2024, 1, 1), 90, minimum=2.0)
+    dates = [r["date"] for r in history]
+    assert dates == sorted(dates)
+    assert all(r["quantity"] >= 0 for r in history)
+    assert any(r["change"] < 0 for r in history)
+    assert any(r["change"] > 0 for r in history)
+
+
+def test_generate_household(db_session):
+    ids = generate_household(db_session, items=12, months=4, seed=3)
+    items = db_session.query(models.Item).filter(models.Item.id.in_(ids)).all()
+    assert len(items) == 12
+    assert len({i.barcode for i in items}) == 12
+    for item in items:
+        assert 0 < len(json.loads(item.quantity_history)) <= MAX_HISTORY_SIZE
+        assert item.prediction_updated_at is not None
+    assert db_session.query(models.User).filter(models.User.username == "loadtest").count() == 1
+
+
+def test_percentiles_and_summary():
+    values = sorted(i / 1000 for i in range(1, 101))
+    assert percentile(values, 50) == 0.05
+    assert percentile(values, 99) == 0.099
+    stats = Stats()
+    for v in values:
+        stats.record("GET /items", v, ok=v < 0.1)
+    report = summarize(stats, elapsed=2.0)
+    assert report["requests"] == 100
+    assert report["throughput_rps"] == 50.0
+    assert report["endpoints"]["GET /items"]["errors"] == 1
+    assert report["endpoints"]["GET /items"]["p95_ms"] == 95.0
+
+
+def test_fake_sms_never_reaches_the_network():
+    original = sms_service.httpx
+    with fake_external_services(sms_latency=0, gemini_latency=0):
+        assert asyncio.run(sms_service.send_sms("+5511999990000", "teste"))
+    assert sms_service.httpx is original
+
+
+def test_drive_in_process(tmp_path):
+    async def run():
+        with fake_external_services(sms_latency=0, gemini_latency=0):
+            app, populate = build_app(str(tmp_path / "load.db"), items=20, months=2)
+            populate()
+            async with app.router.lifespan_context(app):
+                transport = httpx.ASGITransport(app=app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+                    return await drive(client, users=2, duration=30, max_requests=40)
+
+    report = asyncio.run(run())
+    assert report["requests"] >= 40
+    assert report["errors"] == 0
+    assert "PUT /items/{item_id}" in report["endpoints"]
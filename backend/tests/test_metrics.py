@@ -0,0 +1,133 @@
+"""
+Tests for the Prometheus metrics collectors and /metrics endpoint.
+"""
+import dataclasses
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+from backend import metrics
+from backend.metrics import Counter, Gauge, Histogram, Registry, merge_snapshots, render
+from backend.ml_predictor import MLPredictor
+
+
+def _registry():
+    registry = Registry()
+    counter = Counter("jobs_total", "Jobs", ("outcome",), registry=registry)
+    gauge = Gauge("jobs_running", "Running jobs", registry=registry)
+    histogram = Histogram("job_seconds", "Job time", buckets=(0.1, 1.0), registry=registry)
+    return registry, counter, gauge, histogram
+
+
+def test_render_text_format():
+    registry, counter, gauge, histogram = _registry()
+    counter.inc("ok")
+    counter.inc("ok", amount=2)
+    gauge.inc()
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+
+    text = render(registry.collect())
+    assert "# TYPE jobs_total counter" in text
+    assert 'jobs_total{outcome="ok"} 3' in text
+    assert "jobs_running 1" in text
+    assert 'job_seconds_bucket{le="0.1"} 2' in text
+    assert 'job_seconds_bucket{le="1"} 3' in text
+    assert 'job_seconds_bucket{le="+Inf"} 4' in text
+    assert "job_seconds_count 4" in text
+    assert "job_seconds_sum 3.65" in text
+
+
+def test_merge_sums_workers_and_ignores_dead_gauges():
+    registry, counter, gauge, histogram = _registry()
+    counter.inc("ok")
+    gauge.set(2)
+    histogram.observe(0.5)
+    live = registry.snapshot()
+    dead = json.loads(json.dumps(live))
+    dead["pid"] = 2 ** 22 + 12345  # No such process
+
+    merged = merge_snapshots([live, dead])
+    assert merged["jobs_total"]["values"] == [[["ok"], 2.0]]
+    assert merged["jobs_running"]["values"] == [[[], 2.0]]
+    assert merged["job_seconds"]["values"][0][1][:3] == [0, 2, 0]
+
+
+def test_shared_directory_aggregates_other_workers(tmp_path):
+    registry, counter, gauge, histogram = _registry()
+    counter.inc("ok")
+    other = registry.snapshot()
+    other["pid"] = 2 ** 22 + 12345
+    (tmp_path / "other.json").write_text(json.dumps(other))
+
+    registry.configure(str(tmp_path))
+    assert 'jobs_total{outcome="ok"} 2' in registry.render()
+    # The exited worker's file was folded into the archive
+    assert sorted(p.name for p in tmp_path.glob("*.json")) == sorted([f"{os.getpid()}.json", "archive.json"])
+
+    other["pid"] = 2 ** 22 + 12346
+    (tmp_path / "another.json").write_text(json.dumps(other))
+    gauge.set(5)
+    text = registry.render()
+    assert 'jobs_total{outcome="ok"} 3' in text
+    assert "jobs_running 5" in text  # Exited workers' gauges are dropped
+    assert len(list(tmp_path.glob("*.json"))) == 2
+
+
+def test_periodic_flush_writes_off_the_calling_thread(tmp_path, monkeypatch):
+    registry, counter, gauge, histogram = _registry()
+    registry.configure(str(tmp_path))
+    flushed = threading.Event()
+    writers = []
+    original = registry.flush
+    monkeypatch.setattr(registry, "flush", lambda: (writers.append(threading.current_thread()), original(), flushed.set()))
+
+    registry.maybe_flush()
+    assert flushed.wait(5)
+    assert writers and writers[0] is not threading.current_thread()
+    assert (tmp_path / f"{os.getpid()}.json").exists()
+    registry.maybe_flush()  # Within FLUSH_INTERVAL: no second write
+    assert len(writers) == 1
+
+
+def test_metrics_endpoint_is_off_by_default_and_can_require_a_token(client, monkeypatch):
+    assert client.get("/metrics").status_code == 404
+
+    settings = dataclasses.replace(client.app.state.settings, metrics_enabled=True, metrics_token="s3cret")
+    monkeypatch.setattr(client.app.state, "settings", settings)
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer s3cret"}).status_code == 200
+
+
+def test_metrics_endpoint_reports_routes_db_and_cache(client, auth_headers, sample_item, monkeypatch):
+    monkeypatch.setattr(client.app.state, "settings", dataclasses.replace(client.app.state.settings, metrics_enabled=True))
+    client.get("/items", headers=auth_headers)
+    client.get("/items", headers=auth_headers)
+    etag = client.get("/categories", headers=auth_headers).headers["etag"]
+    client.get("/categories", headers={**auth_headers, "If-None-Match": etag})
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert 'http_requests_total{method="GET",route="/items",status="200"}' in text
+    assert 'http_requests_total{method="GET",route="/categories",status="304"}' in text
+    assert 'db_queries_per_request_count{route="/items"}' in text
+    assert 'db_queries_total{verb="SELECT"}' in text
+    assert 'cache_lookups_total{cache="response",result="hit"}' in text
+    assert 'cache_lookups_total{cache="conditional",result="not_modified"}' in text
+    assert metrics.HTTP_IN_FLIGHT.value("GET", "/items") == 0
+
+
+def test_ml_fits_are_counted():
+    before = metrics.ML_FITS.value("fitted"), metrics.ML_FITS.value("insufficient_data")
+    start = datetime(2024, 1, 1)
+    history = [{"date": (start + timedelta(days=d)).isoformat(), "quantity": 10.0 - d} for d in range(6)]
+
+    assert MLPredictor().fit(history) is not None
+    assert MLPredictor().fit(history[:2]) is None
+    assert metrics.ML_FITS.value("fitted") == before[0] + 1
+    assert metrics.ML_FITS.value("insufficient_data") == before[1] + 1
+    assert metrics.ML_FIT_DURATION.count() >= 1
@@ -138,3 +138,234 @@ class TestUsageTracking:
         
         # Should be capped at MAX_HISTORY_SIZE (e.g., 90 days)
         assert len(history_data) <= 90
+    
+    @staticmethod
+    def _raw_history(days, per_day=3, rate=0.6):
+        """Steady consumption checked ``per_day`` times a day, restocked at 5."""
+        from datetime import datetime, timedelta
+        
+        start = datetime(2024, 1, 1, 8, 0, 0)
+        quantity, history = 40.0, []
+        for n in range(days * per_day):
+            old = quantity
+            quantity = round(quantity - rate / per_day, 4)
+            if quantity < 5:
+                quantity += 40.0
+            history.append({
+                "date": (start + timedelta(hours=n * 24 / per_day)).isoformat(),
+                "quantity": quantity,
+                "change": round(quantity - old, 4)
+            })
+        return history
+    
+    def test_old_records_are_downsampled_into_tiers(self):
+        """Aged records become daily, then weekly aggregates that keep consumption."""
+        from datetime import datetime, timedelta
+        from backend.usage_tracker import (
+            DAILY_DAYS, MAX_HISTORY_SIZE, RAW_DAYS, compact_history, consumed_in
+        )
+        
+        raw = self._raw_history(days=400)
+        compacted = compact_history(raw)
+        newest = datetime.fromisoformat(raw[-1]["date"])
+        
+        periods = [r.get("period", "raw") for r in compacted]
+        assert periods == sorted(periods, key=["week", "day", "raw"].index)
+        assert len(compacted) <= MAX_HISTORY_SIZE
+        assert compacted[-1] == raw[-1]
+        
+        raw_part = [r for r in compacted if "period" not in r]
+        assert datetime.fromisoformat(raw_part[0]["date"]) >= newest - timedelta(days=RAW_DAYS)
+        days = [r for r in compacted if r.get("period") == "day"]
+        assert all(d["count"] == 3 for d in days[1:])
+        assert days[0]["start"] >= (newest - timedelta(days=DAILY_DAYS)).date().isoformat()
+        weeks = [r for r in compacted if r.get("period") == "week"]
+        assert all(datetime.fromisoformat(w["start"]).weekday() == 0 for w in weeks)
+        assert all(w["min"] <= w["quantity"] <= w["max"] for w in weeks)
+        
+        # Nothing is lost within the retention window
+        assert sum(consumed_in(r) for r in compacted) == pytest.approx(sum(consumed_in(r) for r in raw))
+        assert sum(r["change"] for r in compacted) == pytest.approx(sum(r["change"] for r in raw))
+    
+    def test_compaction_is_incremental(self):
+        """Histories with nothing aged out are returned as is; aggregates merge."""
+        from backend.usage_tracker import compact_history
+        
+        recent = self._raw_history(days=10)
+        assert compact_history(recent) is recent
+        
+        history = self._raw_history(days=60)
+        once = compact_history(history[:-30])
+        again = compact_history(once + history[-30:])
+        assert again == compact_history(history)
+    
+    def test_weekly_tier_expires(self):
+        """Aggregates beyond WEEKLY_DAYS are dropped."""
+        from datetime import datetime, timedelta
+        from backend.usage_tracker import WEEKLY_DAYS, compact_history
+        
+        history = self._raw_history(days=WEEKLY_DAYS + 200, per_day=1)
+        compacted = compact_history(history)
+        cutoff = datetime.fromisoformat(history[-1]["date"]) - timedelta(days=WEEKLY_DAYS)
+        assert compacted[0]["start"] >= cutoff.date().isoformat()
+    
+    def test_predictor_and_average_use_tiered_history(self):
+        """Fits and the simple average give the same rate on the tiered series."""
+        from backend.ml_predictor import MLPredictor
+        from backend.usage_tracker import UsageTracker, compact_history
+        import json
+        
+        history = [
+            {"date": r["date"], "quantity": r["quantity"] + 1000, "change": r["change"]}
+            for r in self._raw_history(days=300, rate=2.0)
+        ]
+        # No restocks: quantities decline steadily
+        for old, record in zip(history, history[1:]):
+            record["quantity"] = round(old["quantity"] - 2.0 / 3, 4)
+            record["change"] = -round(2.0 / 3, 4)
+        compacted = compact_history(history)
+        assert len(compacted) < len(history) / 3
+        
+        assert MLPredictor().predict_usage_rate(compacted) == pytest.approx(2.0, rel=0.01)
+        tracker = UsageTracker()
+        assert tracker.calculate_average_usage(json.dumps(compacted)) == pytest.approx(
+            tracker.calculate_average_usage(json.dumps(history)), rel=0.01
+        )
+
+
+class TestPredictorConcurrency:
+    """A shared predictor must give each caller the result for its own history."""
+    
+    @staticmethod
+    def _history(rate, points=20):
+        return [
+            {"date": f"2024-01-{day + 1:02d}", "quantity": 500.0 - rate * day}
+            for day in range(points)
+        ]
+    
+    def test_fit_returns_immutable_result(self):
+        """fit() returns a frozen UsagePrediction computed from one parse."""
+        import dataclasses
+        from backend.ml_predictor import MLPredictor
+        
+        result = MLPredictor().fit(self._history(2.0))
+        assert result.rate == pytest.approx(2.0)
+        assert result.intercept == pytest.approx(500.0)
+        assert result.r2 == pytest.approx(1.0)
+        assert result.n == 20
+        assert result.confidence == pytest.approx(20 / 30)
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            result.rate = 0.0
+    
+    @pytest.mark.parametrize("backend_name", ["numpy", "python", "sklearn"])
+    def test_shared_predictor_under_threads(self, backend_name):
+        """Concurrent fits on one instance never see another item's data."""
+        from concurrent.futures import ThreadPoolExecutor
+        from backend.ml_predictor import MLPredictor
+        
+        if backend_name == "sklearn":
+            pytest.importorskip("sklearn")
+        
+        predictor = MLPredictor(backend_name=backend_name)
+        # Distinct rates; every third series is noisy so R² differs too
+        cases = []
+        for i in range(60):
+            history = self._history(rate=0.5 + i * 0.25, points=5 + i % 25)
+            if i % 3 == 0:
+                history = [
+                    dict(h, quantity=h["quantity"] + (7.0 if j % 2 else -7.0))
+                    for j, h in enumerate(history)
+                ]
+            cases.append(history)
+        expected = [predictor.fit(h) for h in cases]
+        
+        def run(index):
+            return index, predictor.fit(cases[index])
+        
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            results = list(pool.map(run, [i % len(cases) for i in range(3000)]))
+        
+        for index, result in results:
+            assert result == expected[index]
+
+
+class TestSegmentedPredictor:
+    """Restock-aware, recency-weighted consumption estimate."""
+    
+    @staticmethod
+    def _sawtooth(rates, start_quantity=30.0, restock_below=6.0, refill=30.0):
+        """One check per day consuming ``rates[day]``; net restocks like real checks."""
+        start = datetime(2024, 1, 1, 9)
+        quantity, history = start_quantity, []
+        for day, rate in enumerate(rates):
+            old = quantity
+            quantity -= rate
+            if quantity < restock_below:
+                quantity += refill
+            history.append({
+                "date": (start + timedelta(days=day)).isoformat(),
+                "quantity": round(quantity, 6),
+                "change": round(quantity - old, 6)
+            })
+        return history
+    
+    def test_restocks_do_not_bend_the_rate(self):
+        """A sawtooth that defeats the linear fit gives the exact rate."""
+        from backend.ml_predictor import MLPredictor, SegmentedPredictor
+        
+        history = self._sawtooth([2.0] * 60)
+        result = SegmentedPredictor().fit(history)
+        assert result.rate == pytest.approx(2.0)
+        assert result.r2 == pytest.approx(1.0)
+        assert result.confidence == pytest.approx(1.0)
+        assert MLPredictor().fit(history).rate < 1.0
+    
+    def test_recent_segments_weigh_more(self):
+        """After usage doubles, the estimate leans to the new rate with a short half-life."""
+        from backend.ml_predictor import SegmentedPredictor
+        
+        history = self._sawtooth([1.0] * 120 + [2.0] * 30)
+        short = SegmentedPredictor(half_life_days=7).predict_usage_rate(history)
+        long = SegmentedPredictor(half_life_days=10000).predict_usage_rate(history)
+        assert 1.0 < long < short < 2.0
+        assert short > 1.8
+    
+    def test_aggregates_and_insufficient_data(self):
+        """Tiered aggregates with restocks split segments; lone points give no fit."""
+        from backend.ml_predictor import SegmentedPredictor
+        
+        predictor = SegmentedPredictor()
+        assert predictor.fit(self._sawtooth([2.0] * 3)) is None
+        # Every record is a restock: no segment has two points
+        rising = [
+            {"date": f"2024-01-{day + 1:02d}", "quantity": 10.0 + day, "change": 1.0}
+            for day in range(10)
+        ]
+        assert predictor.fit(rising) is None
+        # Mostly restocks: the only slope comes from one two-point segment
+        restocked = [
+            {"date": f"2024-01-{day + 1:02d}", "quantity": q, "change": c}
+            for day, (q, c) in enumerate([(10.0, 0.0), (2.0, -8.0), (20.0, 18.0), (30.0, 10.0), (40.0, 10.0)])
+        ]
+        assert predictor.fit(restocked) is None
+        
+        weeks = [
+            {"date": f"2024-01-{7 * w + 7:02d}T12:00:00", "quantity": q, "change": 0.0, "period": "week",
+             "start": f"2024-01-{7 * w + 1:02d}", "consumed": 7.0, "restocked": r, "count": 7}
+            for w, (q, r) in enumerate([(20.0, 0.0), (13.0, 0.0), (30.0, 24.0), (23.0, 0.0)])
+        ]
+        result = predictor.fit(weeks + [{"date": "2024-02-04T12:00:00", "quantity": 16.0, "change": -7.0}])
+        assert result.rate == pytest.approx(1.0)
+        assert result.n == 5
+    
+    def test_predictor_is_selected_per_deployment(self, monkeypatch):
+        """ML_PREDICTOR picks the predictor; the default stays linear."""
+        from backend.ml_predictor import MLPredictor, SegmentedPredictor, get_predictor
+        
+        monkeypatch.delenv("ML_PREDICTOR", raising=False)
+        assert type(get_predictor()) is MLPredictor
+        monkeypatch.setenv("ML_PREDICTOR", "segmented")
+        assert type(get_predictor()) is SegmentedPredictor
+        assert type(get_predictor("linear")) is MLPredictor
+        with pytest.raises(ValueError):
+            get_predictor("quantum")
@@ -0,0 +1,107 @@
+"""
+Tests for the SQL profiler middleware.
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import models, profiler
+from backend.database import get_db
+from backend.main import create_app
+from backend.profiler import QueryProfile, fingerprint
+from backend.settings import Settings
+from backend.tests.conftest import override_get_db
+
+
+def _add_categories_and_items(db_session, categories=6, per_category=2):
+    for c in range(categories):
+        category = models.Category(name=f"Cat {c}", icon="📦", color="#000000")
+        db_session.add(category)
+        db_session.flush()
+        for i in range(per_category):
+            db_session.add(models.Item(
+                name=f"Item {c}-{i}", category_id=category.id, unit="un",
+                current_quantity=1.0, minimum_quantity=1.0
+            ))
+    db_session.commit()
+
+
+def test_fingerprint_groups_literals_and_in_lists():
+    assert fingerprint("SELECT * FROM items WHERE id = 5 AND name = 'a''b'") == \
+        "SELECT * FROM items WHERE id = ? AND name = ?"
+    assert fingerprint("SELECT * FROM t WHERE id IN (?, ?, ?)") == fingerprint("SELECT * FROM t WHERE id IN (?)")
+
+
+def test_repeated_selects_are_flagged():
+    profile = QueryProfile("GET /x", slow_query_ms=100)
+    for item_id in range(6):
+        profile.record(f"SELECT * FROM categories WHERE id = {item_id}", 0.001)
+    profile.record("UPDATE items SET x = 1", 0.2)
+
+    assert profile.repeated(5) == [("SELECT * FROM categories WHERE id = ?", 6)]
+    assert profile.queries == 7
+    assert [statement for _, statement in profile.slow] == ["UPDATE items SET x = 1"]
+
+
+def test_read_items_does_not_load_categories_per_item(client, auth_headers, db_session, assert_max_queries):
+    _add_categories_and_items(db_session)
+    with assert_max_queries(6) as profiles:
+        response = client.get("/items", headers=auth_headers)
+    assert len(response.json()) == 12
+    assert all(item["category"] for item in response.json())
+    assert profiles[0].repeated(3) == []
+
+
+def test_assert_max_queries_reports_offenders(client, auth_headers, sample_item, assert_max_queries):
+    with pytest.raises(AssertionError, match="GET /items"):
+        with assert_max_queries(1):
+            client.get("/items", headers=auth_headers)
+
+
+def test_debug_headers_and_slow_query_log(db_session, tmp_path):
+    log_path = tmp_path / "slow.log"
+    app = create_app(Settings(
+        seed_on_startup=False, frontend_dir=None, response_cache_bytes=0,
+        sql_debug_headers=True, slow_query_ms=0.0, slow_request_ms=0.0, slow_query_log=str(log_path)
+    ))
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        with TestClient(app) as test_client:
+            response = test_client.get("/categories")  # 401 after the token check, no SQL
+            assert response.headers["x-db-query-count"] == "0"
+            token = test_client.post("/token", data={"username": "nobody", "password": "x"})
+            assert int(token.headers["x-db-query-count"]) >= 1
+            assert float(token.headers["x-db-time-ms"]) >= 0
+    finally:
+        for handler in list(profiler.slow_query_logger.handlers):
+            if getattr(handler, "baseFilename", None) == str(log_path):
+                profiler.slow_query_logger.removeHandler(handler)
+                handler.close()
+
+    log = log_path.read_text()
+    assert "slow query" in log and "POST /token" in log
+    assert "slow request POST /token" in log
+
+
+def test_profiler_headers_off_by_default(client, auth_headers):
+    response = client.get("/items", headers=auth_headers)
+    assert "x-db-query-count" not in response.headers
+
+
+def test_failed_statements_leave_no_timing_state(db_session):
+    """Timing lives on the execution context, so a failed statement can't skew the next one."""
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+    from backend.metrics import current_request_stats
+
+    profile = QueryProfile("test")
+    token = current_request_stats.set(profile)
+    try:
+        with pytest.raises(OperationalError):
+            db_session.execute(text("SELECT * FROM no_such_table"))
+        db_session.rollback()
+        db_session.execute(text("SELECT 1"))
+    finally:
+        current_request_stats.reset(token)
+
+    assert profile.queries == 1
+    assert list(profile.statements) == ["SELECT 1"]
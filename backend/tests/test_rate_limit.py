@@ -0,0 +1,153 @@
+"""
+Tests for admission control and per-user rate limiting.
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import auth, models, rate_limit
+from backend.database import get_db
+from backend.main import create_app
+from backend.rate_limit import (
+    BARCODE, LOGIN, READS, WRITES, MemoryBucketStore, RateLimiter, SQLiteBucketStore, classify
+)
+from backend.settings import Settings
+from backend.tests.conftest import override_get_db
+
+
+def test_classify_route_classes():
+    assert classify("POST", "/token") == LOGIN
+    assert classify("POST", "/barcode/identify") == BARCODE
+    assert classify("GET", "/items/by-barcode/789") == BARCODE
+    assert classify("PUT", "/items/1") == WRITES
+    assert classify("GET", "/items") == READS
+    assert classify("GET", "/metrics") is None
+    assert classify("OPTIONS", "/items") is None
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryBucketStore()
+    return SQLiteBucketStore(str(tmp_path / "limits.db"))
+
+
+def test_bucket_allows_burst_then_refills(store):
+    limiter = RateLimiter({READS: (2.0, 3.0)}, store=store)
+    assert [limiter.retry_after(READS, "user:a", now=100.0) for _ in range(3)] == [None, None, None]
+    assert limiter.retry_after(READS, "user:a", now=100.0) == 1
+    assert limiter.retry_after(READS, "user:b", now=100.0) is None  # Buckets are per identity
+    assert limiter.retry_after(READS, "user:a", now=100.6) is None  # 1.2 tokens refilled
+    assert limiter.retry_after(READS, "user:a", now=100.6) == 1
+
+
+def test_slow_refill_reports_longer_retry_after(store):
+    limiter = RateLimiter({LOGIN: (0.1, 1.0)}, store=store)
+    assert limiter.retry_after(LOGIN, "addr:1.2.3.4", now=50.0) is None
+    assert limiter.retry_after(LOGIN, "addr:1.2.3.4", now=52.0) == 8
+
+
+def test_memory_prune_judges_each_bucket_by_its_own_rate(monkeypatch):
+    monkeypatch.setattr(rate_limit, "MAX_BUCKETS", 1)
+    limiter = RateLimiter({LOGIN: (0.2, 3.0), BARCODE: (1.0, 3.0)})
+    for _ in range(3):
+        limiter.retry_after(LOGIN, "addr:1.2.3.4", now=100.0)
+
+    # A new barcode bucket triggers the prune; at the barcode rate the login bucket would be full
+    assert limiter.retry_after(BARCODE, "user:a", now=104.0) is None
+    assert limiter.retry_after(LOGIN, "addr:1.2.3.4", now=104.0) == 1  # 0.8 tokens refilled
+
+
+def test_memory_prune_scan_is_rate_limited(monkeypatch):
+    monkeypatch.setattr(rate_limit, "MAX_BUCKETS", 2)
+    store = MemoryBucketStore()
+    scans = []
+    original = store._prune
+    monkeypatch.setattr(store, "_prune", lambda now: (scans.append(now), original(now)))
+    for i in range(10):
+        store.take(f"reads:user:{i}", 1.0, 5.0, now=100.0 + i * 0.1)
+    assert len(scans) == 1
+    store.take("reads:user:late", 1.0, 5.0, now=102.0)
+    assert len(scans) == 2
+
+
+def test_sqlite_buckets_are_shared_between_workers(tmp_path):
+    path = str(tmp_path / "limits.db")
+    worker_a = RateLimiter({WRITES: (1.0, 2.0)}, store=SQLiteBucketStore(path))
+    worker_b = RateLimiter({WRITES: (1.0, 2.0)}, store=SQLiteBucketStore(path))
+    assert worker_a.retry_after(WRITES, "user:a", now=10.0) is None
+    assert worker_b.retry_after(WRITES, "user:a", now=10.0) is None
+    assert worker_a.retry_after(WRITES, "user:a", now=10.0) == 1
+
+
+def test_sqlite_prune_drops_only_refilled_buckets(tmp_path):
+    store = SQLiteBucketStore(str(tmp_path / "limits.db"))
+    store.take("login:addr:1.2.3.4", 0.2, 3.0, now=100.0)  # Full again at 115
+    store.take("reads:user:a", 2.0, 4.0, now=100.0)  # Full again at 102
+    store.take("reads:user:b", 2.0, 4.0, now=103.0)  # Runs the prune
+
+    keys = {key for (key,) in store._connection().execute("SELECT key FROM rate_limit_buckets")}
+    assert keys == {"login:addr:1.2.3.4", "reads:user:b"}
+    # The next scan runs at 106, dropping b and c
+    store.take("reads:user:c", 2.0, 4.0, now=103.5)
+    store.take("reads:user:d", 2.0, 4.0, now=106.0)
+    keys = {key for (key,) in store._connection().execute("SELECT key FROM rate_limit_buckets")}
+    assert keys == {"login:addr:1.2.3.4", "reads:user:d"}
+
+
+def _limited_client(db_session, **limits):
+    settings = Settings(seed_on_startup=False, frontend_dir=None, response_cache_bytes=0, slow_query_log=None, **limits)
+    app = create_app(settings)
+    app.dependency_overrides[get_db] = override_get_db
+    return TestClient(app)
+
+
+def _token(client, username, password):
+    return {"Authorization": f"Bearer {client.post('/token', data={'username': username, 'password': password}).json()['access_token']}"}
+
+
+def test_reads_over_the_limit_get_429_per_user(db_session, test_user):
+    db_session.add(models.User(username="other", hashed_password=auth.get_password_hash("pw")))
+    db_session.commit()
+    with _limited_client(db_session, rate_limit_reads=(0.01, 2.0)) as client:
+        headers = _token(client, "testuser", "testpass")
+        assert client.get("/items", headers=headers).status_code == 200
+        assert client.get("/items", headers=headers).status_code == 200
+        response = client.get("/items", headers=headers)
+        assert response.status_code == 429
+        assert int(response.headers["retry-after"]) >= 1
+
+        # Another user has their own bucket
+        assert client.get("/items", headers=_token(client, "other", "pw")).status_code == 200
+
+
+def test_login_attempts_are_limited_by_address(db_session, test_user):
+    with _limited_client(db_session, rate_limit_login=(0.01, 2.0)) as client:
+        for _ in range(2):
+            client.post("/token", data={"username": "testuser", "password": "wrong"})
+        response = client.post("/token", data={"username": "testuser", "password": "testpass"})
+        assert response.status_code == 429
+
+
+def test_concurrent_write_cap_rejects_instead_of_queuing(db_session, test_user, sample_item):
+    with _limited_client(db_session, max_concurrent_writes=0) as client:
+        headers = _token(client, "testuser", "testpass")
+        response = client.put(f"/items/{sample_item.id}", json={"name": "Renamed"}, headers=headers)
+        assert response.status_code == 429
+        assert response.headers["retry-after"] == "1"
+        assert client.post("/categories", json={"name": "New"}, headers=headers).status_code == 429
+        assert client.get("/items", headers=headers).status_code == 200
+
+
+def test_coalesced_quantity_updates_skip_the_write_cap(db_session, test_user, sample_item):
+    """They wait on the write coalescer, not on a thread or connection."""
+    with _limited_client(db_session, max_concurrent_writes=0) as client:
+        headers = _token(client, "testuser", "testpass")
+        response = client.put(f"/items/{sample_item.id}", json={"current_quantity": 1}, headers=headers)
+        assert response.status_code == 200
+        assert response.json()["current_quantity"] == 1
+        assert client.app.state.rate_limiter.writes_in_flight == 0
+
+    with _limited_client(db_session, max_concurrent_writes=0, write_coalesce_ms=0) as client:
+        headers = _token(client, "testuser", "testpass")
+        response = client.put(f"/items/{sample_item.id}", json={"current_quantity": 2}, headers=headers)
+        assert response.status_code == 429
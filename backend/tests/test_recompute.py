@@ -0,0 +1,164 @@
+"""
+Tests for the bulk prediction recompute job.
+"""
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend import models, recompute as recompute_module
+from backend.recompute import recompute, save_checkpoint
+from backend.tests.conftest import TestingSessionLocal
+
+
+def _history(rate, points=10):
+    return json.dumps([
+        {"date": f"2024-02-{day + 1:02d}", "quantity": 100.0 - rate * day}
+        for day in range(points)
+    ])
+
+
+@pytest.fixture
+def many_items(db_session, sample_category):
+    items = [
+        models.Item(
+            name=f"Item {i}",
+            category_id=sample_category.id,
+            current_quantity=50.0,
+            minimum_quantity=1.0,
+            unit="un",
+            quantity_history=_history(rate=1.0 + i) if i % 4 else None,
+            usage_rate=7.0 if i % 4 == 0 else None,
+            usage_period="weekly"
+        )
+        for i in range(23)
+    ]
+    db_session.add_all(items)
+    db_session.commit()
+    return [item.id for item in items]
+
+
+def test_recompute_updates_every_item(db_session, many_items, tmp_path):
+    checkpoint = tmp_path / "checkpoint.json"
+    seen = []
+
+    stats = recompute(
+        TestingSessionLocal,
+        batch_size=5,
+        workers=2,
+        checkpoint_path=str(checkpoint),
+        progress=seen.append
+    )
+
+    assert stats["processed"] == len(many_items)
+    assert [s["processed"] for s in seen] == [5, 10, 15, 20, 23]
+    assert not checkpoint.exists()
+
+    db_session.expire_all()
+    for item in db_session.query(models.Item).all():
+        assert item.prediction_updated_at is not None
+        index = int(item.name.split()[1])
+        if index % 4:
+            assert item.predicted_usage_rate == pytest.approx(1.0 + index)
+        else:
+            assert item.predicted_usage_rate == pytest.approx(1.0)  # 7/week
+            assert item.prediction_confidence == 0.5
+        assert item.predicted_purchase_date is not None
+
+
+def test_recompute_resumes_from_checkpoint(db_session, many_items, tmp_path):
+    checkpoint = tmp_path / "checkpoint.json"
+    save_checkpoint(str(checkpoint), many_items[9], 10)
+
+    stats = recompute(TestingSessionLocal, batch_size=4, workers=1, checkpoint_path=str(checkpoint))
+
+    assert stats["resumed_after_id"] == many_items[9]
+    assert stats["processed"] == len(many_items) - 10
+    db_session.expire_all()
+    untouched = db_session.query(models.Item).filter(models.Item.id <= many_items[9]).all()
+    assert all(item.prediction_updated_at is None for item in untouched)
+
+
+def test_recompute_skips_rows_changed_after_they_were_read(db_session, many_items, tmp_path, monkeypatch):
+    changed_history = _history(rate=9.0, points=3)
+    read_batches = recompute_module.iter_batches
+
+    def batches_then_concurrent_write(db, after_id, batch_size):
+        for batch in read_batches(db, after_id, batch_size):
+            # A request updates the item between the read and the write-back
+            with TestingSessionLocal() as other:
+                other.get(models.Item, many_items[1]).quantity_history = changed_history
+                other.commit()
+            yield batch
+
+    monkeypatch.setattr(recompute_module, "iter_batches", batches_then_concurrent_write)
+    stats = recompute(TestingSessionLocal, batch_size=50, workers=1, checkpoint_path=str(tmp_path / "c.json"))
+
+    assert stats["processed"] == len(many_items)
+    assert stats["skipped"] == 1
+    db_session.expire_all()
+    changed = db_session.get(models.Item, many_items[1])
+    assert changed.quantity_history == changed_history
+    assert changed.prediction_updated_at is None
+    assert db_session.get(models.Item, many_items[2]).prediction_updated_at is not None
+
+
+def test_update_item_refreshes_stored_prediction(client, auth_headers, sample_item):
+    response = client.put(
+        f"/items/{sample_item.id}",
+        headers=auth_headers,
+        json={"usage_rate": 2.0, "usage_period": "daily"}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["predicted_usage_rate"] == 2.0
+    assert data["predicted_purchase_date"] is not None
+
+
+def test_recompute_compacts_untiered_histories(db_session, sample_category, tmp_path):
+    long_history = json.dumps([
+        {"date": (datetime(2024, 1, 1, 9) + timedelta(days=day)).isoformat(), "quantity": 400.0 - day, "change": -1.0}
+        for day in range(200)
+    ])
+    item = models.Item(
+        name="Rice", category_id=sample_category.id, current_quantity=200.0,
+        minimum_quantity=1.0, quantity_history=long_history
+    )
+    recent = models.Item(
+        name="Milk", category_id=sample_category.id, current_quantity=90.0,
+        minimum_quantity=1.0, quantity_history=_history(rate=1.0)
+    )
+    db_session.add_all([item, recent])
+    db_session.commit()
+
+    recompute(TestingSessionLocal, batch_size=10, workers=1, checkpoint_path=str(tmp_path / "c.json"))
+
+    db_session.expire_all()
+    history = json.loads(item.quantity_history)
+    assert {"week", "day"} <= {r.get("period") for r in history}
+    assert sum(r.get("consumed", -r["change"]) for r in history) == pytest.approx(200.0)
+    assert item.predicted_usage_rate == pytest.approx(1.0, rel=0.05)
+    assert recent.quantity_history == _history(rate=1.0)
+
+
+def test_recompute_with_the_segmented_predictor(db_session, sample_category, tmp_path):
+    quantity, history = 30.0, []
+    for day in range(40):
+        old, quantity = quantity, quantity - 1.5
+        if quantity < 5:
+            quantity += 30.0
+        history.append({"date": (datetime(2024, 1, 1) + timedelta(days=day)).isoformat(),
+                        "quantity": quantity, "change": quantity - old})
+    item = models.Item(
+        name="Coffee", category_id=sample_category.id, current_quantity=quantity,
+        minimum_quantity=1.0, quantity_history=json.dumps(history)
+    )
+    db_session.add(item)
+    db_session.commit()
+
+    recompute(
+        TestingSessionLocal, workers=1, checkpoint_path=str(tmp_path / "c.json"), predictor_name="segmented"
+    )
+
+    db_session.expire_all()
+    assert item.predicted_usage_rate == pytest.approx(1.5)
@@ -0,0 +1,70 @@
+"""
+Tests for the pluggable regression backends.
+"""
+import random
+
+import pytest
+
+from backend import regression
+from backend.regression import (
+    NumpyRegression,
+    PurePythonRegression,
+    get_regression_backend,
+)
+
+
+def _series(n, seed=0):
+    rng = random.Random(seed)
+    xs = sorted(rng.randint(0, 120) for _ in range(n))
+    ys = [50.0 - 0.7 * x + rng.gauss(0, 3) for x in xs]
+    return xs, ys
+
+
+CASES = [
+    _series(5),
+    _series(40, seed=1),
+    _series(500, seed=2),
+    ([0, 1, 2, 3, 4], [10.0, 9.0, 8.0, 7.0, 6.0]),   # perfect line
+    ([0, 1, 2, 3, 4], [5.0, 5.0, 5.0, 5.0, 5.0]),     # constant y
+    ([3, 3, 3, 3, 3], [1.0, 2.0, 3.0, 4.0, 5.0]),     # constant x
+]
+
+
+@pytest.mark.parametrize("xs,ys", CASES)
+def test_backends_match_sklearn_reference(xs, ys):
+    pytest.importorskip("sklearn")
+    reference = get_regression_backend("sklearn").fit(xs, ys)
+
+    for backend in (NumpyRegression(), PurePythonRegression()):
+        fit = backend.fit(xs, ys)
+        assert fit.slope == pytest.approx(reference.slope, abs=1e-9)
+        assert fit.intercept == pytest.approx(reference.intercept, abs=1e-9)
+        assert fit.r2 == pytest.approx(reference.r2, abs=1e-9)
+
+
+def test_backend_selected_from_env(monkeypatch):
+    monkeypatch.setenv("ML_BACKEND", "python")
+    assert get_regression_backend().name == "python"
+
+
+def test_auto_falls_back_to_pure_python(monkeypatch):
+    monkeypatch.delenv("ML_BACKEND", raising=False)
+    monkeypatch.setattr(regression, "_module_available", lambda name: False)
+    assert get_regression_backend("auto").name == "python"
+
+
+def test_unknown_backend_raises():
+    with pytest.raises(ValueError):
+        get_regression_backend("fortran")
+
+
+def test_predictor_works_without_numpy_backend():
+    from backend.ml_predictor import MLPredictor
+
+    predictor = MLPredictor(backend_name="python")
+    history = [
+        {"date": f"2024-01-0{day}", "quantity": 10.0 - day}
+        for day in range(1, 7)
+    ]
+    assert predictor.predict_usage_rate(history) == pytest.approx(1.0)
+    assert predictor.get_prediction_confidence(history) > 0
@@ -0,0 +1,90 @@
+"""
+Tests for on-demand request profiling.
+"""
+import os
+import pstats
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.database import get_db
+from backend.main import create_app
+from backend import request_profiling
+from backend.request_profiling import ProfileStore
+from backend.settings import Settings
+from backend.tests.conftest import override_get_db
+
+
+@pytest.fixture
+def profiling_client(db_session, test_user, tmp_path):
+    settings = Settings(
+        seed_on_startup=False, frontend_dir=None, response_cache_bytes=0, slow_query_log=None,
+        admin_usernames=("testuser",), profile_dir=str(tmp_path / "profiles"), profile_max_files=2
+    )
+    app = create_app(settings)
+    app.dependency_overrides[get_db] = override_get_db
+    with TestClient(app) as client:
+        token = client.post("/token", data={"username": "testuser", "password": "testpass"}).json()["access_token"]
+        client.headers["Authorization"] = f"Bearer {token}"
+        yield client
+
+
+def test_sample_mode_writes_collapsed_stacks(profiling_client, tmp_path):
+    response = profiling_client.get("/shopping-list", headers={"X-Profile": "sample"})
+    assert response.status_code == 200
+    name = response.headers["x-profile-id"]
+    assert name.endswith(".collapsed")
+
+    listed = profiling_client.get("/admin/profiles").json()
+    assert [p["name"] for p in listed] == [name]
+    download = profiling_client.get(f"/admin/profiles/{name}")
+    assert download.status_code == 200
+    for line in download.text.splitlines():
+        stack, count = line.rsplit(" ", 1)
+        assert stack and int(count) > 0
+
+
+def test_cprofile_mode_via_query_flag(profiling_client, tmp_path):
+    response = profiling_client.get("/items?__profile=cprofile")
+    name = response.headers["x-profile-id"]
+    assert name.endswith(".pstats")
+    stats = pstats.Stats(str(tmp_path / "profiles" / name))
+    assert stats.total_calls > 0
+
+
+def test_concurrent_cprofile_request_runs_unprofiled(profiling_client):
+    # Another request holds the event loop's profiler hook
+    with request_profiling._cprofile_lock:
+        response = profiling_client.get("/items", headers={"X-Profile": "cprofile"})
+    assert response.status_code == 200
+    assert "x-profile-id" not in response.headers
+    assert "x-profile-id" in profiling_client.get("/items", headers={"X-Profile": "cprofile"}).headers
+
+
+def test_flag_is_ignored_for_non_admins_and_unflagged_requests(client, auth_headers):
+    # The default app only treats "admin" as an admin
+    response = client.get("/items", headers={**auth_headers, "X-Profile": "sample"})
+    assert response.status_code == 200
+    assert "x-profile-id" not in response.headers
+    assert client.get("/admin/profiles", headers=auth_headers).status_code == 403
+
+
+def test_download_rejects_unknown_and_unsafe_names(profiling_client):
+    assert profiling_client.get("/admin/profiles/..%2F..%2Fetc%2Fpasswd").status_code == 404
+    assert profiling_client.get("/admin/profiles/missing.pstats").status_code == 404
+
+
+def test_retention_keeps_newest_files(tmp_path):
+    store = ProfileStore(str(tmp_path), max_files=2, max_age_days=1)
+    for i in range(4):
+        store.save(f"2024010{i}T000000-get-items.collapsed", lambda path: open(path, "w").close())
+    assert [p["name"] for p in store.list()] == [
+        "20240103T000000-get-items.collapsed", "20240102T000000-get-items.collapsed"
+    ]
+
+    old = tmp_path / "20240103T000000-get-items.collapsed"
+    stale = time.time() - 2 * 86400
+    os.utime(old, (stale, stale))
+    store.prune()
+    assert [p["name"] for p in store.list()] == ["20240102T000000-get-items.collapsed"]
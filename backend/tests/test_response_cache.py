@@ -0,0 +1,99 @@
+"""
+Tests for the versioned response cache.
+"""
+from sqlalchemy import event
+
+from backend.main import app
+from backend.response_cache import ResponseCache, SQLiteCacheTier
+from backend.tests.conftest import engine
+
+
+class TestResponseCache:
+    """Unit tests for the byte-bounded LRU."""
+
+    def test_evicts_least_recently_used_by_bytes(self):
+        body = b"x" * 300
+        entry = ResponseCache.entry_size("a", body)
+        cache = ResponseCache(max_bytes=entry * 2)
+
+        cache.set("a", body)
+        cache.set("b", body)
+        assert cache.get("a") == body  # "a" becomes most recent
+        cache.set("c", body)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == body
+        assert cache.get("c") == body
+        stats = cache.stats()
+        assert stats["entries"] == 2
+        assert stats["bytes"] == entry * 2
+        assert stats["evictions"] == 1
+
+    def test_oversized_entries_are_not_stored(self):
+        cache = ResponseCache(max_bytes=100)
+        cache.set("big", b"x" * 1000)
+        assert cache.get("big") is None
+        assert cache.stats()["bytes"] == 0
+
+    def test_shared_tier_is_visible_to_other_workers(self, tmp_path):
+        path = str(tmp_path / "cache.db")
+        worker_a = ResponseCache(10_000, shared=SQLiteCacheTier(path, 10_000))
+        worker_b = ResponseCache(10_000, shared=SQLiteCacheTier(path, 10_000))
+
+        worker_a.set("key", b"[1,2,3]")
+        assert worker_b.get("key") == b"[1,2,3]"
+        assert worker_b.stats()["shared_hits"] == 1
+        # Promoted into worker_b's local tier
+        assert worker_b.get("key") == b"[1,2,3]"
+        assert worker_b.stats()["hits"] == 1
+
+    def test_shared_tier_is_size_bounded(self, tmp_path):
+        tier = SQLiteCacheTier(str(tmp_path / "cache.db"), max_bytes=250)
+        for i in range(5):
+            tier.set(f"k{i}", b"x" * 100)
+        assert tier.get("k4") is not None
+        assert tier.get("k0") is None
+
+
+def _capture_statements():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    return statements, lambda: event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def test_hot_read_skips_queries(client, auth_headers):
+    first = client.get("/categories", headers=auth_headers)
+    assert first.status_code == 200
+
+    statements, stop = _capture_statements()
+    try:
+        second = client.get("/categories", headers=auth_headers)
+    finally:
+        stop()
+
+    assert second.status_code == 200
+    assert second.content == first.content
+    assert not any("FROM categories" in s for s in statements)
+    assert app.state.response_cache.stats()["hits"] >= 1
+
+
+def test_write_makes_new_version_visible(client, auth_headers):
+    client.get("/categories", headers=auth_headers)
+    client.post("/categories", headers=auth_headers, json={"name": "Bebidas", "icon": "B", "color": "#123"})
+    names = [c["name"] for c in client.get("/categories", headers=auth_headers).json()]
+    assert "Bebidas" in names
+
+
+def test_shopping_list_and_alerts_are_cached(client, auth_headers, sample_item):
+    client.put(f"/items/{sample_item.id}", headers=auth_headers, json={"current_quantity": 1.0})
+
+    for path in ("/shopping-list", "/items/alerts/needed"):
+        first = client.get(path, headers=auth_headers)
+        second = client.get(path, headers=auth_headers)
+        assert first.status_code == second.status_code == 200
+        assert first.content == second.content
+        assert [i["id"] for i in first.json()] == [sample_item.id]
@@ -0,0 +1,80 @@
+"""
+Tests for FTS5 item search.
+"""
+from sqlalchemy import text
+
+from backend import models, search
+from backend.search import build_match_query
+
+
+def _add_items(db_session, category, names):
+    items = [
+        models.Item(name=name, category_id=category.id, current_quantity=1.0, minimum_quantity=1.0, unit="un")
+        for name in names
+    ]
+    db_session.add_all(items)
+    db_session.commit()
+    return items
+
+
+def test_match_query_quotes_terms_as_prefixes():
+    assert build_match_query('Feijão "pre') == '"Feijão"* AND "pre"*'
+    assert build_match_query("  -*() ") == ""
+
+
+def test_search_is_accent_insensitive_prefix_and_ranked(client, auth_headers, db_session, sample_category):
+    _add_items(db_session, sample_category, ["Feijão Preto", "Arroz Integral", "Açúcar"])
+    notes_only = models.Item(
+        name="Panela", category_id=sample_category.id, current_quantity=1.0,
+        minimum_quantity=1.0, unit="un", notes="para cozinhar feijao"
+    )
+    db_session.add(notes_only)
+    db_session.commit()
+
+    response = client.get("/items/search", params={"q": "feijao"}, headers=auth_headers)
+    assert response.status_code == 200
+    assert [i["name"] for i in response.json()] == ["Feijão Preto", "Panela"]
+    assert response.headers["x-total-count"] == "2"
+
+    assert [i["name"] for i in client.get("/items/search?q=acu", headers=auth_headers).json()] == ["Açúcar"]
+    assert [i["name"] for i in client.get("/items/search?q=arr%20int", headers=auth_headers).json()] == ["Arroz Integral"]
+
+
+def test_search_pagination(client, auth_headers, db_session, sample_category):
+    _add_items(db_session, sample_category, [f"Sabonete {i}" for i in range(5)])
+    first = client.get("/items/search?q=sabonete&limit=2", headers=auth_headers)
+    rest = client.get("/items/search?q=sabonete&limit=2&offset=2", headers=auth_headers).json()
+    assert len(first.json()) == 2 and len(rest) == 2
+    assert first.headers["x-total-count"] == "5"
+    assert not {i["id"] for i in first.json()} & {i["id"] for i in rest}
+
+
+def test_index_follows_updates_deletes_and_category_renames(db_session, sample_category):
+    item, other = _add_items(db_session, sample_category, ["Leite", "Café"])
+
+    item.name = "Leite Desnatado"
+    item.barcode = "7891000100103"
+    db_session.delete(other)
+    sample_category.name = "Laticínios"
+    db_session.commit()
+
+    def names(q):
+        return [i.name for i in search.search_items(db_session, q)[0]]
+
+    assert names("desnat") == ["Leite Desnatado"]
+    assert names("789100") == ["Leite Desnatado"]
+    assert names("laticinios") == ["Leite Desnatado"]
+    assert names("cafe") == []
+
+
+def test_install_populates_index_for_existing_database(db_session, sample_item):
+    bind = db_session.get_bind()
+    with bind.begin() as conn:
+        for statement in search.DROP_STATEMENTS:
+            conn.execute(text(statement))
+    search.install(bind)
+    assert [i.id for i in search.search_items(db_session, "test item")[0]] == [sample_item.id]
+
+
+def test_search_requires_query(client, auth_headers):
+    assert client.get("/items/search", headers=auth_headers).status_code == 422
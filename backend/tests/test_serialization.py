@@ -0,0 +1,28 @@
+"""
+Tests for the fast list serialization path.
+"""
+import json
+
+from backend import schemas, serialization
+from backend.benchmarks.serialization import fastapi_default, make_items, make_shopping_rows
+
+
+def test_orm_list_matches_fastapi_default():
+    items = make_items(20, history_points=5)
+    assert json.loads(serialization.dump_orm_list(schemas.Item, items)) == \
+        json.loads(fastapi_default(schemas.Item, items))
+
+
+def test_trusted_rows_match_fastapi_default():
+    rows = make_shopping_rows(10)
+    assert json.loads(serialization.dump_json(rows)) == \
+        json.loads(fastapi_default(schemas.ShoppingListItem, rows))
+
+
+def test_items_endpoint_serializes_category(client, auth_headers, sample_item):
+    response = client.get("/items", headers=auth_headers)
+    assert response.headers["content-type"] == "application/json"
+    [item] = response.json()
+    assert item["id"] == sample_item.id
+    assert item["category"]["name"] == "Test Category"
+    assert item["created_at"] is not None
@@ -0,0 +1,133 @@
+"""
+Tests for request tracing.
+"""
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import tracing
+from backend.database import get_db
+from backend.main import create_app
+from backend.settings import Settings
+from backend.tests.conftest import override_get_db
+
+
+@pytest.fixture
+def tracing_client(db_session, test_user, tmp_path):
+    settings = Settings(
+        seed_on_startup=False, frontend_dir=None, response_cache_bytes=0, slow_query_log=None,
+        admin_usernames=("testuser",), trace_file=str(tmp_path / "traces.jsonl")
+    )
+    app = create_app(settings)
+    app.dependency_overrides[get_db] = override_get_db
+    with TestClient(app) as client:
+        token = client.post("/token", data={"username": "testuser", "password": "testpass"}).json()["access_token"]
+        client.headers["Authorization"] = f"Bearer {token}"
+        yield client
+
+
+def _spans(document):
+    return [s for rs in document["resourceSpans"] for ss in rs["scopeSpans"] for s in ss["spans"]]
+
+
+def test_spans_are_noops_outside_a_trace():
+    with tracing.span("outside") as span:
+        assert span is None
+    assert tracing.start_span("outside") is None
+
+
+def test_item_update_trace_has_child_spans(tracing_client, sample_item, tmp_path):
+    response = tracing_client.put(f"/items/{sample_item.id}", json={"current_quantity": 3})
+    assert response.status_code == 200
+    trace_id = response.headers["traceparent"].split("-")[1]
+
+    document = tracing_client.get("/admin/traces", params={"trace_id": trace_id}).json()
+    spans = {s["name"]: s for s in _spans(document)}
+    root = spans["PUT /items/{item_id}"]
+    assert root["kind"] == tracing.SPAN_KIND_SERVER
+    assert "parentSpanId" not in root
+    by_id = {s["spanId"]: s for s in spans.values()}
+    for name in ("UsageTracker.add_quantity_record", "db.commit"):
+        assert spans[name]["traceId"] == trace_id
+        # Quantity updates run under the write coalescer's span
+        parent = by_id[spans[name]["parentSpanId"]]
+        assert parent["name"] == "WriteCoalescer.submit"
+        assert parent["parentSpanId"] == root["spanId"]
+    assert {"key": "db.batch.size", "value": {"intValue": "1"}} in spans["db.commit"]["attributes"]
+    assert {"key": "http.response.status_code", "value": {"intValue": "200"}} in root["attributes"]
+
+    lines = (tmp_path / "traces.jsonl").read_text().splitlines()
+    exported = [json.loads(line) for line in lines]
+    assert any(s["traceId"] == trace_id for doc in exported for s in _spans(doc))
+
+
+def test_per_item_spans_are_capped_and_counted(tracing_client, db_session, sample_category, monkeypatch):
+    from backend import models
+
+    monkeypatch.setattr(tracing, "MAX_SPANS_PER_TRACE", 5)
+    db_session.add_all([
+        models.Item(name=f"Item {i}", category_id=sample_category.id, unit="un",
+                    current_quantity=0.0, minimum_quantity=1.0, is_low_stock=True)
+        for i in range(10)
+    ])
+    db_session.commit()
+
+    response = tracing_client.get("/shopping-list")
+    assert len(response.json()) == 10
+    trace_id = response.headers["traceparent"].split("-")[1]
+
+    spans = _spans(tracing_client.get("/admin/traces", params={"trace_id": trace_id}).json())
+    assert len(spans) == 6  # Root + 5 children
+    (root,) = [s for s in spans if "parentSpanId" not in s]
+    assert {"key": "trace.dropped_spans", "value": {"intValue": "5"}} in root["attributes"]
+
+
+def test_incoming_traceparent_is_continued(tracing_client):
+    parent = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+    response = tracing_client.get("/categories", headers={"traceparent": parent})
+    assert response.headers["traceparent"].startswith("00-0af7651916cd43dd8448eb211c80319c-")
+
+    spans = _spans(tracing_client.get("/admin/traces", params={"trace_id": "0af7651916cd43dd8448eb211c80319c"}).json())
+    root = next(s for s in spans if s["kind"] == tracing.SPAN_KIND_SERVER)
+    assert root["parentSpanId"] == "b7ad6b7169203331"
+
+
+def test_traced_coroutine_records_errors():
+    @tracing.traced(kind=tracing.SPAN_KIND_CLIENT)
+    async def flaky():
+        raise ValueError("boom")
+
+    async def run():
+        trace = tracing.Trace()
+        root = tracing.Span(trace, "root")
+        token = tracing.current_span.set(root)
+        try:
+            with pytest.raises(ValueError):
+                await flaky()
+        finally:
+            tracing.current_span.reset(token)
+        return trace
+
+    (span,) = asyncio.run(run()).spans
+    assert span.name.endswith("flaky")
+    assert span.status_code == tracing.STATUS_ERROR
+    assert span.status_message == "ValueError: boom"
+
+
+def test_ring_buffer_keeps_newest_and_filters_slow():
+    buffer = tracing.RingBufferExporter(max_traces=2)
+    for duration_ms in (5, 1, 50):
+        trace = tracing.Trace()
+        trace.root = tracing.Span(trace, "GET /x")
+        trace.root.end()
+        trace.root.end_ns = trace.root.start_ns + duration_ms * 1_000_000
+        buffer.export(trace)
+
+    assert [t.root.duration_ms for t in buffer.traces()] == [50, 1]
+    assert [t.root.duration_ms for t in buffer.traces(min_duration_ms=10)] == [50]
+
+
+def test_traces_endpoint_requires_admin(client, auth_headers):
+    assert client.get("/admin/traces", headers=auth_headers).status_code == 403
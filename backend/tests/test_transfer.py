@@ -0,0 +1,212 @@
+"""
+Tests for NDJSON export and import.
+"""
+import asyncio
+import gzip
+import json
+from datetime import datetime, timedelta
+
+import sqlite3
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend import models, transfer
+from backend.database import Base
+from backend.transfer import iter_line_batches
+
+
+def _records(body: bytes):
+    return [json.loads(line) for line in body.splitlines() if line.strip()]
+
+
+def _create_item(client, auth_headers, category_id, name, barcode=None):
+    item_id = client.post("/items", headers=auth_headers, json={
+        "name": name, "category_id": category_id, "unit": "un",
+        "current_quantity": 10.0, "minimum_quantity": 2.0, "barcode": barcode
+    }).json()["id"]
+    for qty in (9.0, 8.0, 7.0):
+        client.put(f"/items/{item_id}", headers=auth_headers, json={"current_quantity": qty})
+    return item_id
+
+
+def test_export_streams_categories_items_and_history(client, auth_headers, sample_category):
+    item_id = _create_item(client, auth_headers, sample_category.id, "Arroz", barcode="7891")
+
+    response = client.get("/export", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    records = _records(response.content)
+    assert records[0]["type"] == "meta"
+    types = [r["type"] for r in records]
+    assert types.index("category") < types.index("item") < types.index("history")
+    [item] = [r for r in records if r["type"] == "item"]
+    assert item["id"] == item_id and item["barcode"] == "7891"
+    history = [r for r in records if r["type"] == "history"]
+    assert [h["quantity"] for h in history] == [9.0, 8.0, 7.0]
+
+
+def test_export_holds_no_lock_between_pages(tmp_path):
+    path = tmp_path / "inventory.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    category = models.Category(name="Grãos")
+    db.add(category)
+    db.flush()
+    count = transfer.EXPORT_PAGE_SIZE + 100
+    db.add_all(models.Item(name=f"Item {n}", category_id=category.id) for n in range(count))
+    db.commit()
+
+    records = transfer.iter_export_records(db)
+    while next(records)["type"] != "item":
+        pass
+    # A slow client is mid-download: a writer must still get through
+    writer = sqlite3.connect(path, timeout=0)
+    writer.execute("UPDATE items SET current_quantity = 1")
+    writer.commit()
+    writer.close()
+
+    names = ["Item 0"] + [r["name"] for r in records if r["type"] == "item"]
+    assert names == [f"Item {n}" for n in range(count)]
+    db.close()
+    engine.dispose()
+
+
+def test_gzip_round_trip_restores_inventory(client, auth_headers, sample_category, db_session):
+    item_id = _create_item(client, auth_headers, sample_category.id, "Feijão", barcode="7892")
+    exported = client.get("/export?compress=gzip", headers=auth_headers).content
+    assert exported[:2] == b"\x1f\x8b"
+
+    client.delete(f"/items/{item_id}", headers=auth_headers)
+
+    response = client.post(
+        "/import", headers={**auth_headers, "Content-Type": "application/gzip"}, content=exported
+    )
+    assert response.status_code == 200
+    summary = response.json()
+    assert summary["items_created"] == 1
+    assert summary["history_records"] == 3
+    assert summary["errors"] == 0
+
+    db_session.expire_all()
+    item = db_session.query(models.Item).filter(models.Item.id == item_id).one()
+    assert item.name == "Feijão"
+    assert [h["quantity"] for h in json.loads(item.quantity_history)] == [9.0, 8.0, 7.0]
+    assert item.last_checked_at is not None
+
+
+def test_database_error_stops_import_with_committed_counts(client, auth_headers, sample_category, db_session, monkeypatch):
+    from functools import partial
+    from sqlalchemy.exc import OperationalError
+    from backend import transfer
+
+    item_id = _create_item(client, auth_headers, sample_category.id, "Feijão")
+    exported = client.get("/export", headers=auth_headers).content
+    client.delete(f"/items/{item_id}", headers=auth_headers)
+
+    def failing_apply_items(self, db, records):
+        if records:
+            raise OperationalError("INSERT INTO items", {}, Exception("disk I/O error"))
+
+    # Two lines per batch: the meta and category batches commit, then the item batch fails
+    monkeypatch.setattr(transfer, "iter_line_batches", partial(transfer.iter_line_batches, batch_lines=2))
+    monkeypatch.setattr(transfer.NDJSONImporter, "_apply_items", failing_apply_items)
+    response = client.post("/import", headers=auth_headers, content=exported)
+
+    assert response.status_code == 409
+    detail = response.json()["detail"]
+    assert "OperationalError" in detail
+    # meta + categories come first; the last category shares the failed batch with the item
+    categories = sum(r["type"] == "category" for r in _records(exported))
+    assert categories % 2 == 0
+    assert f"'categories_updated': {categories - 1}" in detail
+    assert "'items_created': 0" in detail and "'history_records': 0" in detail
+    db_session.expire_all()
+    assert db_session.query(models.Item).count() == 0
+
+
+def test_import_upserts_by_barcode(client, auth_headers, sample_category, db_session):
+    item_id = _create_item(client, auth_headers, sample_category.id, "Leite", barcode="7893")
+    lines = [
+        {"type": "category", "id": 99, "name": "Test Category", "icon": "🧪", "color": "#FF0000"},
+        # Different id, same barcode: updates the existing item
+        {"type": "item", "id": 500, "name": "Leite Integral", "category_id": 99, "barcode": "7893",
+         "current_quantity": 3.0, "minimum_quantity": 1.0, "unit": "L"},
+        {"type": "history", "item_id": 500, "date": "2024-03-01T10:00:00", "quantity": 3.0, "change": -1.0},
+        {"type": "item", "id": 501, "name": "Pão", "category_id": 99,
+         "current_quantity": 1.0, "minimum_quantity": 2.0, "unit": "un"},
+        "not an object",
+    ]
+    body = "\n".join(json.dumps(l) for l in lines) + "\n{broken"
+    summary = client.post("/import", headers=auth_headers, content=body.encode()).json()
+
+    assert summary["categories_updated"] == 1
+    assert summary["items_updated"] == 1
+    assert summary["items_created"] == 1
+    assert summary["errors"] == 2
+
+    db_session.expire_all()
+    milk = db_session.query(models.Item).filter(models.Item.id == item_id).one()
+    assert milk.name == "Leite Integral"
+    assert milk.category_id == sample_category.id
+    assert len(json.loads(milk.quantity_history)) == 1
+    bread = db_session.query(models.Item).filter(models.Item.id == 501).one()
+    assert bread.is_low_stock is True
+
+
+def test_history_of_rejected_item_is_not_applied(client, auth_headers, sample_category, db_session):
+    item_id = _create_item(client, auth_headers, sample_category.id, "Sal")
+    lines = [
+        # Rejected, and its source id happens to match a local item
+        {"type": "item", "id": item_id, "category_id": sample_category.id},
+        {"type": "history", "item_id": item_id, "date": "2024-03-01T10:00:00", "quantity": 1.0, "change": -1.0},
+    ]
+    body = "\n".join(json.dumps(l) for l in lines)
+    summary = client.post("/import", headers=auth_headers, content=body.encode()).json()
+
+    assert summary["errors"] == 2
+    assert summary["history_records"] == 0
+    db_session.expire_all()
+    salt = db_session.query(models.Item).filter(models.Item.id == item_id).one()
+    assert [h["quantity"] for h in json.loads(salt.quantity_history)] == [9.0, 8.0, 7.0]
+
+
+def test_history_aggregates_survive_export_and_import(client, auth_headers, sample_category, db_session):
+    item_id = _create_item(client, auth_headers, sample_category.id, "Café")
+    start = (datetime.utcnow() - timedelta(days=200)).date()
+    start -= timedelta(days=start.weekday())
+    week = {
+        "date": f"{start + timedelta(days=6)}T20:00:00", "quantity": 4.0, "change": -3.0, "period": "week",
+        "start": start.isoformat(), "min": 4.0, "max": 9.0, "consumed": 5.0, "restocked": 2.0, "count": 6
+    }
+    item = db_session.query(models.Item).filter(models.Item.id == item_id).one()
+    item.quantity_history = json.dumps([week] + json.loads(item.quantity_history))
+    db_session.commit()
+
+    exported = client.get("/export", headers=auth_headers).content
+    history = [r for r in _records(exported) if r["type"] == "history"]
+    assert {k: v for k, v in history[0].items() if k not in ("type", "item_id")} == week
+
+    client.delete(f"/items/{item_id}", headers=auth_headers)
+    client.post("/import", headers=auth_headers, content=exported)
+    db_session.expire_all()
+    restored = db_session.query(models.Item).filter(models.Item.id == item_id).one()
+    assert json.loads(restored.quantity_history)[0] == week
+
+def test_line_batches_are_bounded_across_chunk_boundaries():
+    payload = b"".join(json.dumps({"n": i}).encode() + b"\n" for i in range(25))
+    compressed = gzip.compress(payload)
+
+    async def chunks(data):
+        for i in range(0, len(data), 7):
+            yield data[i:i + 7]
+
+    async def collect(data):
+        return [batch async for batch in iter_line_batches(chunks(data), batch_lines=10)]
+
+    for data in (payload, compressed):
+        batches = asyncio.run(collect(data))
+        assert [len(b) for b in batches] == [10, 10, 5]
+        assert [json.loads(line)["n"] for batch in batches for _, line in batch] == list(range(25))
@@ -0,0 +1,150 @@
+"""
+Tests for the group-commit write coalescer.
+"""
+import asyncio
+import json
+from contextlib import contextmanager
+
+import httpx
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+
+from backend import models
+from backend.database import Base, get_db
+from backend.main import create_app
+from backend.settings import Settings
+from backend.tests.conftest import override_get_db
+from backend.write_coalescer import WriteCoalescer
+
+
+@pytest.fixture
+def file_db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'coalesce.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    commits = []
+    event.listen(engine, "commit", lambda conn: commits.append(1))
+
+    @contextmanager
+    def session_scope():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    with session_scope() as db:
+        db.add_all([models.Item(name=f"Item {i}", current_quantity=10.0, minimum_quantity=1.0) for i in range(20)])
+        db.commit()
+    commits.clear()
+    yield engine, session_scope, commits
+    engine.dispose()
+
+
+def _set_quantity(item_id, quantity):
+    def apply(db):
+        item = db.get(models.Item, item_id)
+        if item is None:
+            raise LookupError(item_id)
+        item.current_quantity = quantity
+        return item
+
+    return apply, lambda item: (item.id, item.current_quantity)
+
+
+def test_concurrent_writes_share_one_commit(file_db):
+    engine, session_scope, commits = file_db
+    coalescer = WriteCoalescer(session_scope, window_ms=20)
+
+    async def run():
+        results = await asyncio.gather(*(coalescer.submit(*_set_quantity(i, float(i))) for i in range(1, 21)))
+        await coalescer.close()
+        return results
+
+    assert asyncio.run(run()) == [(i, float(i)) for i in range(1, 21)]
+    assert len(commits) == 1
+    with session_scope() as db:
+        assert sorted(q for (q,) in db.query(models.Item.current_quantity)) == [float(i) for i in range(1, 21)]
+
+
+def test_failing_write_does_not_fail_its_batch(file_db):
+    engine, session_scope, commits = file_db
+    coalescer = WriteCoalescer(session_scope, window_ms=20)
+
+    async def run():
+        results = await asyncio.gather(
+            coalescer.submit(*_set_quantity(1, 3.0)),
+            coalescer.submit(*_set_quantity(999, 3.0)),
+            coalescer.submit(*_set_quantity(2, 4.0)),
+            return_exceptions=True
+        )
+        await coalescer.close()
+        return results
+
+    ok_1, missing, ok_2 = asyncio.run(run())
+    assert ok_1 == (1, 3.0) and ok_2 == (2, 4.0)
+    assert isinstance(missing, LookupError)
+    with session_scope() as db:
+        assert db.get(models.Item, 1).current_quantity == 3.0
+        assert db.get(models.Item, 2).current_quantity == 4.0
+
+
+def test_relaxed_durability_is_restored_after_the_batch(file_db):
+    engine, session_scope, commits = file_db
+    engine.pool.dispose()
+    # One pooled connection, so the check sees the connection the batch used
+    engine.pool = engine.pool.recreate()
+    seen = []
+    coalescer = WriteCoalescer(
+        session_scope, window_ms=1, durability="off",
+        before_commit=lambda db: seen.append(db.execute(text("PRAGMA synchronous")).scalar())
+    )
+
+    async def run():
+        await coalescer.submit(*_set_quantity(1, 2.0))
+        await coalescer.close()
+
+    asyncio.run(run())
+    assert seen == [0]
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 2
+
+
+def test_unknown_durability_is_rejected():
+    with pytest.raises(ValueError):
+        WriteCoalescer(lambda: None, durability="sometimes")
+
+
+def test_concurrent_quantity_updates_through_the_api(client, auth_headers, db_session, sample_category):
+    items = [
+        models.Item(name=f"Audit {i}", category_id=sample_category.id, current_quantity=5.0, minimum_quantity=1.0)
+        for i in range(8)
+    ]
+    db_session.add_all(items)
+    db_session.commit()
+    ids = [item.id for item in items]
+
+    app = create_app(Settings(seed_on_startup=False, frontend_dir=None, response_cache_bytes=0, slow_query_log=None))
+    app.dependency_overrides[get_db] = override_get_db
+
+    async def run():
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test", headers=auth_headers) as api:
+                responses = await asyncio.gather(*(
+                    api.put(f"/items/{item_id}", json={"current_quantity": 2.0}) for item_id in ids
+                ))
+                missing = await api.put("/items/99999", json={"current_quantity": 1.0})
+        return responses, missing
+
+    responses, missing = asyncio.run(run())
+    assert [r.status_code for r in responses] == [200] * len(ids)
+    assert [r.json()["id"] for r in responses] == ids
+    assert all(r.json()["current_quantity"] == 2.0 for r in responses)
+    assert missing.status_code == 404
+
+    db_session.expire_all()
+    for item in db_session.query(models.Item).filter(models.Item.id.in_(ids)):
+        assert item.current_quantity == 2.0
+        assert json.loads(item.quantity_history)[-1]["change"] == -3.0
@@ -0,0 +1,360 @@
+"""
+Lightweight request tracing with OpenTelemetry-shaped spans.
+
+``TracingMiddleware`` opens a server span for every HTTP request. Code that
+runs inside the request adds child spans with ``span()`` or the ``traced``
+decorator. History updates, ML fits, SMS sends, Gemini calls and session
+commits are instrumented. When the request ends its spans go to the
+exporters:
+
+- ``RingBufferExporter`` keeps recent traces in memory for ``GET /admin/traces``
+- ``JsonlExporter`` appends one OTLP/JSON ``resourceSpans`` document per
+  trace to a file, the format of the OpenTelemetry Collector file
+  exporter, so traces can be loaded into Jaeger/Tempo later
+
+No SDK or collector is needed. Outside a traced request ``span()`` does
+nothing beyond one context variable lookup. A trace keeps at most
+``MAX_SPANS_PER_TRACE`` child spans (per-item loops such as ML fits for the
+shopping list would otherwise add thousands); further spans are not
+recorded and the root span counts them in ``trace.dropped_spans``. An incoming W3C
+``traceparent`` header is continued, and the response carries the
+request's own ``traceparent``.
+"""
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Iterable, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from starlette.datastructures import MutableHeaders
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "ainventory"
+
+# OTLP enums
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_UNSET = 0
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+# Requests that are not traced: scrapes, the trace viewer itself, static files
+EXCLUDED_PATHS = ("/metrics", "/admin/traces")
+EXCLUDED_PREFIXES = ("/static/",)
+
+# Child spans recorded per trace; later ones are dropped and counted
+MAX_SPANS_PER_TRACE = 256
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+_COMMIT_SPAN_KEY = "trace_commit_span"
+
+
+class Trace:
+    """Spans of one request, appended as they end (from any thread)."""
+
+    def __init__(self, trace_id: Optional[str] = None):
+        self.trace_id = trace_id or os.urandom(16).hex()
+        self.spans: List["Span"] = []
+        self.root: Optional["Span"] = None
+        self.started = 0  # Child spans started (approximate across threads)
+        self.dropped = 0
+
+
+class Span:
+    __slots__ = (
+        "trace", "span_id", "parent_span_id", "name", "kind",
+        "start_ns", "end_ns", "attributes", "status_code", "status_message"
+    )
+
+    def __init__(self, trace: Trace, name: str, parent_span_id: Optional[str] = None,
+                 kind: int = SPAN_KIND_INTERNAL, attributes: Optional[dict] = None):
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_span_id = parent_span_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = dict(attributes or {})
+        self.status_code = STATUS_UNSET
+        self.status_message = ""
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def set_error(self, exc: BaseException):
+        self.status_code = STATUS_ERROR
+        self.status_message = f"{type(exc).__name__}: {exc}"[:500]
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            self.trace.spans.append(self)
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": _otlp_attributes(self.attributes),
+            "status": {"code": self.status_code},
+        }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        if self.status_message:
+            span["status"]["message"] = self.status_message
+        return span
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: dict) -> List[dict]:
+    return [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items() if v is not None]
+
+
+def to_otlp(traces: Iterable[Trace]) -> dict:
+    """OTLP/JSON ``ExportTraceServiceRequest`` for the given traces."""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({"service.name": SERVICE_NAME})},
+            "scopeSpans": [{
+                "scope": {"name": __name__},
+                "spans": [s.to_otlp() for trace in traces for s in trace.spans]
+            }]
+        }]
+    }
+
+
+current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+def start_span(name: str, kind: int = SPAN_KIND_INTERNAL, **attributes) -> Optional[Span]:
+    """
+    Child of the current span, or None outside a trace or once the trace
+    has ``MAX_SPANS_PER_TRACE`` spans. The caller ends it; it does not
+    become the current span.
+    """
+    parent = current_span.get()
+    if parent is None:
+        return None
+    trace = parent.trace
+    if trace.started >= MAX_SPANS_PER_TRACE:
+        trace.dropped += 1
+        return None
+    trace.started += 1
+    return Span(trace, name, parent.span_id, kind, attributes)
+
+
+@contextmanager
+def span(name: str, kind: int = SPAN_KIND_INTERNAL, **attributes):
+    """Run the block in a child span (yields None outside a trace)."""
+    child = start_span(name, kind, **attributes)
+    if child is None:
+        yield None
+        return
+    token = current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.set_error(e)
+        raise
+    finally:
+        current_span.reset(token)
+        child.end()
+
+
+def set_attribute(key: str, value):
+    """Set an attribute on the current span, if any."""
+    current = current_span.get()
+    if current is not None:
+        current.set_attribute(key, value)
+
+
+def traced(name: Optional[str] = None, kind: int = SPAN_KIND_INTERNAL):
+    """Decorator running each call of a function (sync or async) in a span named after it."""
+    def decorate(func):
+        span_name = name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if current_span.get() is None:
+                    return await func(*args, **kwargs)
+                with span(span_name, kind):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if current_span.get() is None:
+                return func(*args, **kwargs)
+            with span(span_name, kind):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# Session commits: span from before_commit (which includes the final flush) to the outcome
+
+@event.listens_for(Session, "before_commit")
+def _start_commit_span(session: Session):
+    if current_span.get() is None:
+        return
+    bind = session.get_bind()
+    session.info[_COMMIT_SPAN_KEY] = start_span("db.commit", SPAN_KIND_CLIENT, **{"db.system": bind.dialect.name})
+
+
+@event.listens_for(Session, "after_commit")
+def _end_commit_span(session: Session):
+    commit_span = session.info.pop(_COMMIT_SPAN_KEY, None)
+    if commit_span is not None:
+        commit_span.status_code = STATUS_OK
+        commit_span.end()
+
+
+@event.listens_for(Session, "after_rollback")
+def _fail_commit_span(session: Session):
+    commit_span = session.info.pop(_COMMIT_SPAN_KEY, None)
+    if commit_span is not None:
+        commit_span.status_code = STATUS_ERROR
+        commit_span.status_message = "rolled back"
+        commit_span.end()
+
+
+class RingBufferExporter:
+    """The most recent traces, in memory."""
+
+    def __init__(self, max_traces: int = 200):
+        self._traces: deque = deque(maxlen=max_traces)
+        self._lock = threading.Lock()
+
+    def export(self, trace: Trace):
+        with self._lock:
+            self._traces.append(trace)
+
+    def traces(self, limit: int = 20, min_duration_ms: float = 0.0, trace_id: Optional[str] = None) -> List[Trace]:
+        """Newest first, optionally only slow requests or one trace."""
+        with self._lock:
+            traces = list(self._traces)
+        selected = []
+        for trace in reversed(traces):
+            root = trace.root
+            if trace_id is not None and trace.trace_id != trace_id:
+                continue
+            if root is None or root.duration_ms < min_duration_ms:
+                continue
+            selected.append(trace)
+            if len(selected) >= limit:
+                break
+        return selected
+
+
+class JsonlExporter:
+    """Appends each trace as one OTLP/JSON line."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def export(self, trace: Trace):
+        line = json.dumps(to_otlp([trace]), separators=(",", ":"))
+        with self._lock, open(self.path, "a") as f:
+            f.write(line + "\n")
+
+
+def _parse_traceparent(scope) -> tuple:
+    for name, value in scope["headers"]:
+        if name == b"traceparent":
+            match = _TRACEPARENT.match(value.decode("latin-1").strip().lower())
+            if match and match.group(1) != "0" * 32:
+                return match.group(1), match.group(2)
+    return None, None
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware that traces each HTTP request and exports the trace
+    when the request finishes.
+    """
+
+    def __init__(self, app, exporters: Iterable = ()):
+        self.app = app
+        self.exporters = list(exporters)
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if scope["type"] != "http" or path in EXCLUDED_PATHS or path.startswith(EXCLUDED_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        trace_id, parent_span_id = _parse_traceparent(scope)
+        trace = Trace(trace_id)
+        method = scope["method"]
+        root = Span(trace, f"{method} {path}", parent_span_id, SPAN_KIND_SERVER, {
+            "http.request.method": method,
+            "url.path": path,
+        })
+        trace.root = root
+        token = current_span.set(root)
+
+        async def send_with_traceparent(message):
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                root.set_attribute("http.response.status_code", status)
+                if status >= 500:
+                    root.status_code = STATUS_ERROR
+                MutableHeaders(scope=message)["traceparent"] = f"00-{trace.trace_id}-{root.span_id}-01"
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_traceparent)
+        except BaseException as e:
+            root.set_error(e)
+            raise
+        finally:
+            current_span.reset(token)
+            route = getattr(scope.get("route"), "path_format", None)
+            if route:
+                root.name = f"{method} {route}"
+                root.set_attribute("http.route", route)
+            if trace.dropped:
+                root.set_attribute("trace.dropped_spans", trace.dropped)
+            root.end()
+            self.export(trace)
+
+    def export(self, trace: Trace):
+        for exporter in self.exporters:
+            try:
+                exporter.export(trace)
+            except Exception as e:
+                logger.warning(f"Trace export failed ({type(exporter).__name__}): {e}")
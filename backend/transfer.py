@@ -0,0 +1,392 @@
+"""
+Streaming NDJSON export and import of a household inventory.
+
+Format: one JSON object per line, each with a "type":
+- {"type": "meta", "format": "ainventory-ndjson", "version": 1, ...}
+- {"type": "category", "id", "name", "icon", "color"}
+- {"type": "item", "id", <ItemBase fields>, "created_at"}
+- {"type": "history", "item_id", "date", "quantity", "change"}, plus the
+  aggregate fields for daily/weekly history aggregates (see usage_tracker.py)
+
+Categories come first; each item line is followed by its history lines.
+Export reads keyset pages and import applies bounded batches of lines, so
+both run in constant memory whatever the inventory size (import keeps only
+an id map of source -> target ids).
+"""
+import json
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import analytics, models, schemas, versioning
+from .barcodes import normalize_barcode
+from .usage_tracker import AGGREGATE_FIELDS, UsageTracker
+
+FORMAT_NAME = "ainventory-ndjson"
+FORMAT_VERSION = 1
+
+# Streaming sizes
+EXPORT_PAGE_SIZE = 500
+EXPORT_CHUNK_BYTES = 64 * 1024
+IMPORT_BATCH_LINES = 500
+MAX_LINE_BYTES = 1024 * 1024
+MAX_REPORTED_ERRORS = 20
+
+ITEM_FIELDS = tuple(schemas.ItemBase.model_fields)
+CATEGORY_FIELDS = ("name", "icon", "color")
+
+usage_tracker = UsageTracker()
+
+
+def _line(record: dict) -> bytes:
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode() + b"\n"
+
+
+def _iter_pages(db: Session, columns: list, id_column) -> Iterator[list]:
+    """
+    Yield pages of rows in id order, one short keyset query per page.
+
+    The read transaction ends before each page is handed out, so a slow
+    download holds no SQLite lock and writers aren't blocked meanwhile.
+    """
+    last_id = None
+    while True:
+        stmt = select(*columns).order_by(id_column).limit(EXPORT_PAGE_SIZE)
+        if last_id is not None:
+            stmt = stmt.where(id_column > last_id)
+        page = db.execute(stmt).all()
+        db.rollback()
+        if not page:
+            return
+        yield page
+        last_id = page[-1].id
+
+
+def iter_export_records(db: Session) -> Iterator[dict]:
+    """
+    Yield export records, reading categories and items page by page
+    (plain rows, no ORM identity map).
+    """
+    yield {
+        "type": "meta",
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "exported_at": datetime.utcnow().isoformat()
+    }
+
+    category_columns = [models.Category.id, *(getattr(models.Category, f) for f in CATEGORY_FIELDS)]
+    for page in _iter_pages(db, category_columns, models.Category.id):
+        for row in page:
+            yield {"type": "category", **row._asdict()}
+
+    item_columns = [models.Item.id, models.Item.created_at, models.Item.quantity_history]
+    item_columns += [getattr(models.Item, f) for f in ITEM_FIELDS]
+    for page in _iter_pages(db, item_columns, models.Item.id):
+        for row in page:
+            record = row._asdict()
+            history = record.pop("quantity_history")
+            created_at = record.get("created_at")
+            record["created_at"] = created_at.isoformat() if created_at else None
+            yield {"type": "item", **record}
+
+            for entry in usage_tracker.get_history_as_list(history):
+                yield {
+                    "type": "history",
+                    "item_id": row.id,
+                    "date": entry.get("date"),
+                    "quantity": entry.get("quantity"),
+                    "change": entry.get("change"),
+                    **{k: entry[k] for k in AGGREGATE_FIELDS if k in entry}
+                }
+
+
+def iter_export_chunks(db: Session, compress: bool = False) -> Iterator[bytes]:
+    """
+    Encode export records as NDJSON, grouped into ~64KB chunks (optionally gzip).
+    """
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    buffer = bytearray()
+
+    for record in iter_export_records(db):
+        buffer += _line(record)
+        if len(buffer) >= EXPORT_CHUNK_BYTES:
+            data = compressor.compress(bytes(buffer)) if compressor else bytes(buffer)
+            buffer.clear()
+            if data:
+                yield data
+
+    tail = compressor.compress(bytes(buffer)) + compressor.flush() if compressor else bytes(buffer)
+    if tail:
+        yield tail
+
+
+async def iter_line_batches(
+    chunks: AsyncIterator[bytes],
+    batch_lines: int = IMPORT_BATCH_LINES,
+    gzip: Optional[bool] = None
+) -> AsyncIterator[List[Tuple[int, bytes]]]:
+    """
+    Split a streamed (optionally gzipped) upload into batches of numbered lines.
+
+    Args:
+        chunks: Raw request body chunks
+        gzip: Force gzip decoding; None detects it from the magic bytes
+
+    Raises:
+        ValueError: if a single line exceeds MAX_LINE_BYTES
+    """
+    decompressor = None
+    buffer = b""
+    line_no = 0
+    batch: List[Tuple[int, bytes]] = []
+    first = True
+
+    def split(data: bytes):
+        nonlocal buffer, line_no, batch
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        if len(buffer) > MAX_LINE_BYTES:
+            raise ValueError(f"Line {line_no + 1} exceeds {MAX_LINE_BYTES} bytes")
+        for line in lines:
+            line_no += 1
+            if line.strip():
+                batch.append((line_no, line))
+
+    async for chunk in chunks:
+        if not chunk:
+            continue
+        if first:
+            first = False
+            if gzip or (gzip is None and chunk[:2] == b"\x1f\x8b"):
+                decompressor = zlib.decompressobj(wbits=31)
+        if decompressor:
+            # Bound each inflate step so a small chunk can't expand unchecked
+            data = decompressor.decompress(chunk, MAX_LINE_BYTES)
+            split(data)
+            while decompressor.unconsumed_tail:
+                split(decompressor.decompress(decompressor.unconsumed_tail, MAX_LINE_BYTES))
+        else:
+            split(chunk)
+
+        while len(batch) >= batch_lines:
+            yield batch[:batch_lines]
+            batch = batch[batch_lines:]
+
+    if decompressor:
+        split(decompressor.flush())
+    if buffer.strip():
+        line_no += 1
+        batch.append((line_no, buffer))
+        buffer = b""
+    if batch:
+        yield batch
+
+
+def _parse_datetime(value) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+
+class NDJSONImporter:
+    """
+    Applies batches of NDJSON lines, one transaction per batch.
+
+    Categories are upserted by name; items by barcode, then by id. Imported
+    items keep their id when it is free. An item's history is replaced by
+    the history lines that follow it.
+    """
+
+    def __init__(self):
+        self.category_map: Dict[int, int] = {}
+        self.item_map: Dict[int, int] = {}
+        self.stats = {
+            "batches": 0,
+            "lines": 0,
+            "categories_created": 0,
+            "categories_updated": 0,
+            "items_created": 0,
+            "items_updated": 0,
+            "history_records": 0,
+            "errors": 0,
+        }
+        self.errors: List[str] = []
+
+    def _error(self, line_no: int, message: str):
+        self.stats["errors"] += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"line {line_no}: {message}")
+
+    def apply_batch(self, db: Session, lines: List[Tuple[int, bytes]]):
+        """
+        Apply and commit one batch. If it fails it is rolled back, its
+        counts are dropped from the summary and the error is re-raised.
+        """
+        committed = dict(self.stats)
+        categories, items, history = [], [], []
+        for line_no, raw in lines:
+            self.stats["lines"] += 1
+            try:
+                record = json.loads(raw)
+            except ValueError:
+                self._error(line_no, "invalid JSON")
+                continue
+            kind = record.get("type") if isinstance(record, dict) else None
+            if kind == "category":
+                categories.append((line_no, record))
+            elif kind == "item":
+                items.append((line_no, record))
+            elif kind == "history":
+                history.append((line_no, record))
+            elif kind != "meta":
+                self._error(line_no, f"unknown record type {kind!r}")
+
+        try:
+            self._apply_categories(db, categories)
+            self._apply_items(db, items)
+            self._apply_history(db, history)
+            if categories:
+                versioning.bump_version(db, versioning.CATEGORIES)
+            if items or history:
+                versioning.bump_version(db, versioning.ITEMS)
+            db.commit()
+        except Exception:
+            db.rollback()
+            self.stats = committed
+            raise
+        self.stats["batches"] += 1
+
+    def _apply_categories(self, db: Session, records: List[Tuple[int, dict]]):
+        if not records:
+            return
+        names = [r.get("name") for _, r in records]
+        existing = {
+            c.name: c for c in db.query(models.Category).filter(models.Category.name.in_(names))
+        }
+        pending = []
+        for line_no, record in records:
+            if not record.get("name"):
+                self._error(line_no, "category without name")
+                continue
+            category = existing.get(record["name"])
+            values = {f: record.get(f) for f in CATEGORY_FIELDS}
+            if category is not None:
+                for key, value in values.items():
+                    setattr(category, key, value)
+                self.stats["categories_updated"] += 1
+            else:
+                category = models.Category(**values)
+                db.add(category)
+                existing[category.name] = category
+                self.stats["categories_created"] += 1
+            pending.append((record.get("id"), category))
+        db.flush()
+        for source_id, category in pending:
+            if source_id is not None:
+                self.category_map[source_id] = category.id
+
+    def _apply_items(self, db: Session, records: List[Tuple[int, dict]]):
+        if not records:
+            return
+        keys = [normalize_barcode(r.get("barcode")) for _, r in records]
+        keys = [k for k in keys if k]
+        ids = [r["id"] for _, r in records if r.get("id") is not None]
+        by_barcode = {
+            i.barcode_normalized: i
+            for i in db.query(models.Item).filter(models.Item.barcode_normalized.in_(keys))
+        } if keys else {}
+        by_id = {i.id: i for i in db.query(models.Item).filter(models.Item.id.in_(ids))} if ids else {}
+
+        explicit_ids, auto_ids = [], []
+        for line_no, record in records:
+            if not record.get("name"):
+                self._error(line_no, "item without name")
+                continue
+            values = {f: record[f] for f in ITEM_FIELDS if f in record}
+            if values.get("category_id") is not None:
+                values["category_id"] = self.category_map.get(values["category_id"], values["category_id"])
+
+            source_id = record.get("id")
+            key = normalize_barcode(record.get("barcode"))
+            target = by_barcode.get(key) if key else None
+            if target is None and source_id in by_id:
+                candidate = by_id[source_id]
+                # Same id but a different product: don't overwrite it
+                if not (candidate.barcode and key and normalize_barcode(candidate.barcode) != key):
+                    target = candidate
+
+            if target is not None:
+                for field, value in values.items():
+                    setattr(target, field, value)
+                target.quantity_history = None
+                analytics.forget_item(db, target.id)
+                target.last_checked_at = None
+                self.stats["items_updated"] += 1
+                if source_id is not None:
+                    self.item_map[source_id] = target.id
+                continue
+
+            item = models.Item(**values)
+            item.created_at = _parse_datetime(record.get("created_at")) or datetime.utcnow()
+            db.add(item)
+            self.stats["items_created"] += 1
+            if key:
+                by_barcode[key] = item
+            if source_id is not None and source_id not in by_id:
+                item.id = source_id
+                by_id[source_id] = item
+                explicit_ids.append((source_id, item))
+            else:
+                auto_ids.append((source_id, item))
+
+        # Explicit ids first so auto-assigned ids can't take them
+        for source_id, item in explicit_ids:
+            self.item_map[source_id] = source_id
+        db.flush()
+        for source_id, item in auto_ids:
+            if source_id is not None:
+                self.item_map[source_id] = item.id
+
+    def _apply_history(self, db: Session, records: List[Tuple[int, dict]]):
+        if not records:
+            return
+        grouped: Dict[int, list] = {}
+        for line_no, record in records:
+            source_id = record.get("item_id")
+            if source_id is None or not record.get("date"):
+                self._error(line_no, "history without item_id or date")
+                continue
+            # Only items imported by this run: a rejected item's history
+            # must not land on an unrelated local item with the same id
+            if source_id not in self.item_map:
+                self._error(line_no, f"history for unknown item {source_id}")
+                continue
+            target_id = self.item_map[source_id]
+            grouped.setdefault(target_id, []).append({
+                "date": record["date"],
+                "quantity": record.get("quantity"),
+                "change": record.get("change"),
+                **{k: record[k] for k in AGGREGATE_FIELDS if k in record}
+            })
+
+        items = {i.id: i for i in db.query(models.Item).filter(models.Item.id.in_(list(grouped)))}
+        for target_id, entries in grouped.items():
+            item = items.get(target_id)
+            if item is None:
+                self.stats["errors"] += len(entries)
+                if len(self.errors) < MAX_REPORTED_ERRORS:
+                    self.errors.append(f"history for unknown item {target_id}")
+                continue
+            item.quantity_history = usage_tracker.append_records(item.quantity_history, entries)
+            analytics.record_history(db, item.id, item.category_id, entries)
+            item.last_checked_at = _parse_datetime(entries[-1]["date"])
+            self.stats["history_records"] += len(entries)
+
+    def summary(self) -> dict:
+        return {**self.stats, "error_messages": self.errors}
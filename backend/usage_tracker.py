@@ -1,14 +1,193 @@
 """
 Usage tracking module for recording and managing quantity history.
 Provides data for ML-based predictions.
+
+History is stored as a JSON list, oldest first, in three tiers:
+
+- raw records ``{date, quantity, change}`` for the last ``RAW_DAYS``
+- daily aggregates for older data, up to ``DAILY_DAYS``
+- weekly aggregates beyond that, up to ``WEEKLY_DAYS``
+
+An aggregate keeps ``date``/``quantity`` (its last record) and ``change``
+(net), so it reads like a raw record, plus ``period`` ('day' or 'week'),
+``start``, ``min``, ``max``, ``consumed``, ``restocked`` and ``count``.
+Ages count back from the newest record, so an item nobody updates keeps
+its history. ``compact_history`` moves records down the tiers once they
+age out; it runs on every write (usually a no-op) and in the
+``recompute`` pass.
 """
-from datetime import datetime
-from typing import Optional
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
 import json
 
+from . import tracing
+
+
+# Retention tiers, in days before the newest record
+RAW_DAYS = 14
+DAILY_DAYS = 90
+WEEKLY_DAYS = 730
+
+# Raw records kept at most; older ones are folded into daily aggregates early
+MAX_RAW_RECORDS = 90
+
+# Upper bound on records across all tiers
+MAX_HISTORY_SIZE = MAX_RAW_RECORDS + (DAILY_DAYS + 1) + (WEEKLY_DAYS // 7 + 2)
+
+# Keys only aggregates have
+AGGREGATE_FIELDS = ("period", "start", "min", "max", "consumed", "restocked", "count")
+
+# Days since the last quantity check before a reminder is due
+CHECK_REMINDER_DAYS = 7
+
+
+def parse_record_date(date_str) -> Optional[datetime]:
+    """Naive UTC datetime of a record date, or None if missing or unparseable."""
+    if not isinstance(date_str, str):
+        return None
+    try:
+        date = datetime.fromisoformat(date_str.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if date.tzinfo is not None:
+        date = (date - date.utcoffset()).replace(tzinfo=None)
+    return date
+
+
+def consumed_in(record: Dict) -> float:
+    """Quantity consumed in a raw record or aggregate."""
+    if "period" in record:
+        return record.get("consumed") or 0.0
+    change = record.get("change") or 0.0
+    return -change if change < 0 else 0.0
+
+
+def _as_aggregate(record: Dict, period: str, start: str) -> Dict:
+    if "period" in record:
+        return {**record, "period": period, "start": start}
+    quantity = record.get("quantity")
+    change = record.get("change") or 0.0
+    return {
+        "date": record.get("date"),
+        "quantity": quantity,
+        "change": change,
+        "period": period,
+        "start": start,
+        "min": quantity,
+        "max": quantity,
+        "consumed": -change if change < 0 else 0.0,
+        "restocked": change if change > 0 else 0.0,
+        "count": 1,
+    }
+
+
+def _fold(buckets: Dict[str, Dict], record: Dict, period: str, start: str):
+    """Merge ``record`` (raw or aggregate, newer than the bucket's) into its bucket."""
+    incoming = _as_aggregate(record, period, start)
+    bucket = buckets.get(start)
+    if bucket is None:
+        buckets[start] = incoming
+        return
+    bucket["date"] = incoming["date"]
+    bucket["quantity"] = incoming["quantity"]
+    for key in ("change", "consumed", "restocked"):
+        bucket[key] = round(bucket[key] + incoming[key], 6)
+    bucket["count"] += incoming["count"]
+    lows = [v for v in (bucket["min"], incoming["min"]) if v is not None]
+    highs = [v for v in (bucket["max"], incoming["max"]) if v is not None]
+    bucket["min"] = min(lows) if lows else None
+    bucket["max"] = max(highs) if highs else None
+
+
+def _needs_compaction(history: List[Dict], reference: datetime) -> bool:
+    """Whether the oldest record of any tier has aged out (tiers are in order)."""
+    raw_start = 0
+    first_day = first_week = None
+    for raw_start, record in enumerate(history):
+        period = record.get("period")
+        if period is None:
+            break
+        if period == "week" and first_week is None:
+            first_week = record
+        elif period == "day" and first_day is None:
+            first_day = record
+    else:
+        raw_start = len(history)
+
+    raw_count = len(history) - raw_start
+    if raw_count > MAX_RAW_RECORDS:
+        return True
+    if raw_count:
+        first_raw = parse_record_date(history[raw_start].get("date"))
+        if first_raw is not None and first_raw < reference - timedelta(days=RAW_DAYS):
+            return True
+    if first_day is not None and first_day["start"] < (reference - timedelta(days=DAILY_DAYS)).date().isoformat():
+        return True
+    if first_week is not None and first_week["start"] < (reference - timedelta(days=WEEKLY_DAYS)).date().isoformat():
+        return True
+    return False
+
+
+def compact_history(history: List[Dict], now: Optional[datetime] = None) -> List[Dict]:
+    """
+    Move aged records down the retention tiers.
+
+    Ages are measured from the newest record, or from ``now`` (naive UTC)
+    if given. Records must be oldest first. Raw records with unparseable dates stay raw and are
+    dropped, oldest first, beyond ``MAX_RAW_RECORDS``.
+
+    Returns:
+        ``history`` itself if nothing aged out, else a new list
+    """
+    reference = now
+    if reference is None:
+        dates = (parse_record_date(r.get("date")) for r in reversed(history))
+        reference = next((d for d in dates if d is not None), None)
+        if reference is None:
+            return history[-MAX_RAW_RECORDS:]
+    if not _needs_compaction(history, reference):
+        return history
+
+    raw_cutoff = reference - timedelta(days=RAW_DAYS)
+    daily_cutoff = (reference - timedelta(days=DAILY_DAYS)).date()
+    weekly_cutoff = (reference - timedelta(days=WEEKLY_DAYS)).date()
+
+    raw_total = sum(1 for r in history if "period" not in r)
+    overflow = max(0, raw_total - MAX_RAW_RECORDS)
+
+    weeks: Dict[str, Dict] = {}
+    days: Dict[str, Dict] = {}
+    raw: List[Dict] = []
+    for record in history:
+        period = record.get("period")
+        if period == "week":
+            if record["start"] >= weekly_cutoff.isoformat():
+                _fold(weeks, record, "week", record["start"])
+            continue
+
+        if period == "day":
+            day = datetime.fromisoformat(record["start"]).date()
+        else:
+            date = parse_record_date(record.get("date"))
+            forced = overflow > 0
+            overflow -= 1
+            if date is None:
+                if not forced:
+                    raw.append(record)
+                continue
+            if date >= raw_cutoff and not forced:
+                raw.append(record)
+                continue
+            day = date.date()
+
+        if day >= daily_cutoff:
+            _fold(days, record, "day", day.isoformat())
+        else:
+            week = day - timedelta(days=day.weekday())
+            if week >= weekly_cutoff:
+                _fold(weeks, record, "week", week.isoformat())
 
-# Maximum number of history entries to keep (90 days)
-MAX_HISTORY_SIZE = 90
+    return list(weeks.values()) + list(days.values()) + raw
 
 
 class UsageTracker:
@@ -16,6 +195,7 @@ class UsageTracker:
     Tracks usage history for items to enable ML-based predictions.
     """
     
+    @tracing.traced()
     def add_quantity_record(
         self,
         current_history: Optional[str],
@@ -50,9 +230,26 @@ class UsageTracker:
         }
         history.append(record)
         
-        # Trim to max size (keep most recent)
-        if len(history) > MAX_HISTORY_SIZE:
-            history = history[-MAX_HISTORY_SIZE:]
+        # Age older records into daily/weekly aggregates
+        history = compact_history(history)
+        tracing.set_attribute("history.length", len(history))
+        
+        return json.dumps(history)
+    
+    def append_records(self, current_history: Optional[str], records: list) -> str:
+        """
+        Append already-built records (e.g. from an import) to the history.
+        
+        Args:
+            current_history: JSON string of existing history, or None
+            records: List of {date, quantity, change} dicts (or aggregates), oldest first
+        
+        Returns:
+            Updated history as JSON string
+        """
+        history = self.get_history_as_list(current_history)
+        history.extend(records)
+        history = compact_history(history)
         
         return json.dumps(history)
     
@@ -92,19 +289,16 @@ class UsageTracker:
         
         # Calculate time span
         try:
-            first_date = datetime.fromisoformat(history[0]["date"].replace("Z", "+00:00"))
-            last_date = datetime.fromisoformat(history[-1]["date"].replace("Z", "+00:00"))
+            # An aggregate's consumption starts with its period, not its last record
+            first_date = parse_record_date(history[0].get("start") or history[0]["date"])
+            last_date = parse_record_date(history[-1]["date"])
             days = (last_date - first_date).days
             
             if days <= 0:
                 return None
             
             # Calculate total consumption (only count decreases)
-            total_consumed = 0.0
-            for record in history:
-                change = record.get("change", 0)
-                if change < 0:  # Consumption (negative change)
-                    total_consumed += abs(change)
+            total_consumed = sum(consumed_in(record) for record in history)
             
             return total_consumed / days
         except Exception:
@@ -134,7 +328,7 @@ class UsageTracker:
     def needs_check_reminder(
         self,
         history_json: Optional[str],
-        days_threshold: int = 7
+        days_threshold: int = CHECK_REMINDER_DAYS
     ) -> bool:
         """
         Check if the item needs a quantity check reminder.
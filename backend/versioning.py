@@ -0,0 +1,131 @@
+"""
+Per-resource data versions and HTTP validators (ETag / Last-Modified).
+
+Every write to a resource bumps its counter in ``data_versions`` inside the
+same transaction. Read endpoints derive their validators from the counters
+they depend on, so a conditional GET can be answered with 304 after a
+single primary-key lookup, before any items are loaded or serialized.
+"""
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from fastapi import Request
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from . import metrics
+from .models import DataVersion
+
+# Resource names
+ITEMS = "items"
+CATEGORIES = "categories"
+
+# Bump when the serialized shape of responses changes
+ETAG_FORMAT = "v1"
+
+
+def bump_version(db: Session, *names: str):
+    """
+    Increment the version of each resource in the current transaction.
+    The caller commits.
+    """
+    now = datetime.utcnow()
+    for name in names:
+        stmt = sqlite_insert(DataVersion).values(name=name, version=1, updated_at=now)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[DataVersion.name],
+            set_={"version": DataVersion.version + 1, "updated_at": now}
+        )
+        db.execute(stmt)
+
+
+def get_versions(db: Session, names: Iterable[str]) -> Dict[str, Tuple[int, datetime]]:
+    """
+    Return {name: (version, updated_at)} for resources that have been written.
+    """
+    rows = db.query(DataVersion.name, DataVersion.version, DataVersion.updated_at).filter(
+        DataVersion.name.in_(list(names))
+    ).all()
+    return {row.name: (row.version, row.updated_at) for row in rows}
+
+
+def resource_validators(
+    db: Session,
+    names: Tuple[str, ...],
+    salt: str = ""
+) -> Tuple[str, Optional[datetime]]:
+    """
+    Build a strong ETag and Last-Modified date from resource versions.
+
+    Args:
+        names: Resources the response depends on
+        salt: Extra input for responses that also depend on something else
+              (e.g. the current date)
+
+    Returns:
+        (etag, last_modified) - last_modified is None if nothing was written
+    """
+    versions = get_versions(db, names)
+    parts = [ETAG_FORMAT]
+    for name in names:
+        version, updated_at = versions.get(name, (0, None))
+        # The timestamp keeps tags unique if a database is recreated or restored
+        stamp = updated_at.strftime("%Y%m%d%H%M%S%f") if updated_at else "0"
+        parts.append(f"{name}.{version}.{stamp}")
+    if salt:
+        parts.append(salt)
+    etag = '"' + ":".join(parts) + '"'
+
+    dates = [updated_at for _, updated_at in versions.values() if updated_at]
+    return etag, max(dates) if dates else None
+
+
+def http_date(value: datetime) -> str:
+    return format_datetime(value.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    """
+    Evaluate If-None-Match / If-Modified-Since (If-None-Match wins, RFC 9110).
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in candidates or any(
+            tag[2:] == etag if tag.startswith("W/") else tag == etag
+            for tag in candidates
+        )
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified.replace(tzinfo=timezone.utc, microsecond=0) <= since
+    return False
+
+
+def conditional_headers(
+    request: Request,
+    db: Session,
+    names: Tuple[str, ...],
+    salt: str = ""
+) -> Tuple[Dict[str, str], bool]:
+    """
+    Compute validator headers and evaluate the request's preconditions.
+
+    Returns:
+        (headers, not_modified)
+    """
+    etag, last_modified = resource_validators(db, names, salt)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if last_modified:
+        headers["Last-Modified"] = http_date(last_modified)
+    not_modified = is_not_modified(request, etag, last_modified)
+    if "if-none-match" in request.headers or "if-modified-since" in request.headers:
+        metrics.CACHE_LOOKUPS.inc("conditional", "not_modified" if not_modified else "modified")
+    return headers, not_modified
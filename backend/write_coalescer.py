@@ -0,0 +1,209 @@
+"""
+Group commit for small writes.
+
+Each SQLite commit waits for the disk (fsync), so bursts of tiny writes,
+such as quantity updates during a pantry audit, are limited by flush
+latency rather than by the work itself. ``WriteCoalescer`` collects
+operations that arrive within ``window_ms`` of each other, applies them in
+arrival order in one session and commits once. Operations that arrive
+while a batch is committing form the next batch. Every caller still gets
+its own result or exception.
+
+An operation is a pair of callables run in a worker thread:
+
+- ``apply(db)`` mutates the session and returns a value (no commit)
+- ``finish(value)`` runs after the commit (the session is still open, so
+  it can serialize refreshed objects); its return value is the result
+
+Each operation runs under its caller's trace span, and every caller's
+trace gets a ``db.commit`` span for the shared commit (``db.batch.size``).
+
+If the batch fails, it is rolled back and each operation is retried in its
+own transaction, so one bad write cannot fail its neighbours.
+
+Durability is SQLite's ``synchronous`` level for batch commits: ``full``
+(fsync on every commit, the default), ``normal`` (WAL databases may lose
+the last commits on power loss, never on an app crash) or ``off``.
+Callers are always answered after their batch has committed.
+"""
+import asyncio
+import contextvars
+import logging
+from contextlib import AbstractContextManager
+from typing import Any, Callable, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from . import metrics, tracing
+
+logger = logging.getLogger(__name__)
+
+DURABILITY_LEVELS = ("full", "normal", "off")
+DEFAULT_WINDOW_MS = 2.0
+DEFAULT_MAX_BATCH = 256
+
+# (apply, finish, caller's span) and the caller's future
+Operation = Tuple[Callable[[Session], Any], Optional[Callable[[Any], Any]], Optional[tracing.Span]]
+
+
+class WriteCoalescer:
+    """
+    Batches operations submitted from one event loop into group commits.
+    """
+
+    def __init__(
+        self,
+        session_scope: Callable[[], AbstractContextManager],
+        window_ms: float = DEFAULT_WINDOW_MS,
+        max_batch: int = DEFAULT_MAX_BATCH,
+        durability: str = "full",
+        before_commit: Optional[Callable[[Session], None]] = None
+    ):
+        """
+        Args:
+            session_scope: Returns a context manager yielding a Session
+            window_ms: How long the first operation of a batch waits for company
+            max_batch: Operations per transaction
+            durability: 'full', 'normal' or 'off' (SQLite synchronous level)
+            before_commit: Called once per batch before committing (e.g. version bumps)
+        """
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f"durability must be one of {DURABILITY_LEVELS}, got {durability!r}")
+        self.session_scope = session_scope
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.durability = durability
+        self.before_commit = before_commit
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            # First use, or a new event loop (server restarted in-process)
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            # A fresh context: the worker must not inherit the first caller's request state
+            self._worker = loop.create_task(self._run(), context=contextvars.Context())
+
+    async def submit(self, apply: Callable[[Session], Any], finish: Optional[Callable[[Any], Any]] = None) -> Any:
+        """Queue an operation and wait until its batch has committed."""
+        self._ensure_worker()
+        future = self._loop.create_future()
+        self._queue.put_nowait(((apply, finish, tracing.current_span.get()), future))
+        return await future
+
+    async def close(self):
+        """Commit everything queued, then stop the worker."""
+        if self._worker is None or self._worker.done() or self._loop is not asyncio.get_running_loop():
+            return
+        await self._queue.join()
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+    async def _collect(self) -> List[Tuple[Operation, asyncio.Future]]:
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.window
+        while len(batch) < self.max_batch:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            try:
+                outcomes = await run_in_threadpool(self._commit_batch, [operation for operation, _ in batch])
+            except Exception as e:
+                outcomes = [(None, e)] * len(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            for (_, future), (result, error) in zip(batch, outcomes):
+                if future.done():
+                    continue  # Caller went away
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+    def _commit_batch(self, operations: List[Operation]) -> List[tuple]:
+        """Apply and commit ``operations`` together; (result, error) per operation."""
+        metrics.COALESCED_BATCH_SIZE.observe(len(operations))
+        with self.session_scope() as db:
+            try:
+                return self._run_in_transaction(db, operations)
+            except Exception as e:
+                self._rollback(db)
+                if len(operations) == 1:
+                    return [(None, e)]
+                logger.warning(f"Group commit of {len(operations)} writes failed ({e}); retrying one by one")
+        outcomes = []
+        for operation in operations:
+            with self.session_scope() as db:
+                try:
+                    outcomes.extend(self._run_in_transaction(db, [operation]))
+                except Exception as e:
+                    self._rollback(db)
+                    outcomes.append((None, e))
+        return outcomes
+
+    def _relaxes_durability(self, db: Session) -> bool:
+        return self.durability != "full" and db.get_bind().dialect.name == "sqlite"
+
+    def _rollback(self, db: Session):
+        db.rollback()
+        if self._relaxes_durability(db):
+            db.execute(text("PRAGMA synchronous = FULL"))
+
+    def _run_in_transaction(self, db: Session, operations: List[Operation]) -> List[tuple]:
+        relaxed = self._relaxes_durability(db)
+        if relaxed:
+            # Before the first statement: pysqlite only opens the transaction on DML
+            db.execute(text(f"PRAGMA synchronous = {self.durability.upper()}"))
+        values = []
+        for apply, _, caller_span in operations:
+            token = tracing.current_span.set(caller_span)
+            try:
+                values.append(apply(db))
+            finally:
+                tracing.current_span.reset(token)
+        if self.before_commit is not None:
+            self.before_commit(db)
+
+        attributes = {"db.system": db.get_bind().dialect.name, "db.batch.size": len(operations)}
+        commit_spans = [
+            tracing.Span(caller_span.trace, "db.commit", caller_span.span_id, tracing.SPAN_KIND_CLIENT, attributes)
+            for _, _, caller_span in operations if caller_span is not None
+        ]
+        db.commit()
+        for commit_span in commit_spans:
+            commit_span.status_code = tracing.STATUS_OK
+            commit_span.end()
+
+        if relaxed:
+            # The connection goes back to the pool: restore the default for other requests
+            db.execute(text("PRAGMA synchronous = FULL"))
+        outcomes = []
+        for (_, finish, _), value in zip(operations, values):
+            try:
+                outcomes.append((finish(value) if finish else value, None))
+            except Exception as e:
+                outcomes.append((None, e))
+        return outcomes
@@ -9,6 +9,9 @@ if (!localStorage.getItem('access_token')) {
     window.location.href = 'login.html';
 }
 
+// Last validated body per GET url: { etag, lastModified, body }
+const conditionalCache = new Map();
+
 // Function to handle fetch with auth
 async function fetchWithAuth(url, options = {}) {
     const token = localStorage.getItem('access_token');
@@ -17,6 +20,14 @@ async function fetchWithAuth(url, options = {}) {
         'Authorization': `Bearer ${token}`
     };
 
+    // Send the validators we already have; the server answers 304 if unchanged
+    const isGet = !options.method || options.method.toUpperCase() === 'GET';
+    const cached = isGet ? conditionalCache.get(url) : null;
+    if (cached) {
+        if (cached.etag) headers['If-None-Match'] = cached.etag;
+        if (cached.lastModified) headers['If-Modified-Since'] = cached.lastModified;
+    }
+
     const response = await fetch(url, { ...options, headers });
 
     if (response.status === 401) {
@@ -24,6 +35,22 @@ async function fetchWithAuth(url, options = {}) {
         window.location.href = 'login.html';
         return null;
     }
+
+    if (response.status === 304 && cached) {
+        return new Response(cached.body, {
+            status: 200,
+            headers: { 'Content-Type': 'application/json' }
+        });
+    }
+
+    const etag = response.headers.get('ETag');
+    if (isGet && response.ok && etag) {
+        conditionalCache.set(url, {
+            etag,
+            lastModified: response.headers.get('Last-Modified'),
+            body: await response.clone().text()
+        });
+    }
     return response;
 }
 
@@ -716,15 +743,25 @@ document.getElementById('capture-btn').onclick = async () => {
     updateScannerStatus(t('status_identifying'), 'loading');
 
     try {
+        // Decode on the device when supported: known products then resolve
+        // from the inventory index without sending the image to Gemini
+        const barcode = await detectBarcode(canvas);
         const response = await fetchWithAuth(`${API_URL}/barcode/identify`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ image_base64: base64Data })
+            body: JSON.stringify({ image_base64: base64Data, barcode })
         });
 
         const result = await response.json();
 
-        if (result.success) {
+        if (result.success && result.item_id && items.some(i => i.id === result.item_id)) {
+            // Already in stock: jump straight to the item
+            updateScannerStatus(t('status_success', { name: result.product_name }), 'success');
+            setTimeout(() => {
+                stopScanner();
+                editItem(result.item_id);
+            }, 800);
+        } else if (result.success) {
             updateScannerStatus(t('status_success', { name: result.product_name }), 'success');
 
             // Auto-fill form
@@ -758,6 +795,17 @@ document.getElementById('capture-btn').onclick = async () => {
     }
 };
 
+async function detectBarcode(canvas) {
+    if (!('BarcodeDetector' in window)) return null;
+    try {
+        const detector = new BarcodeDetector();
+        const [code] = await detector.detect(canvas);
+        return code ? code.rawValue : null;
+    } catch (err) {
+        return null;
+    }
+}
+
 function updateScannerStatus(message, type) {
     const status = document.getElementById('scanner-status');
     status.textContent = message;
@@ -873,6 +921,72 @@ async function init() {
     renderCategories();
     renderItems();
     updateStats();
+    subscribeToChanges();
+}
+
+// ====== Live Updates (Server-Sent Events) ======
+
+let lastEventId = null;
+let refreshTimer = null;
+
+// Coalesce bursts of events into one refresh (conditional GETs, so cheap)
+function scheduleRefresh(includeCategories) {
+    clearTimeout(refreshTimer);
+    refreshTimer = setTimeout(async () => {
+        await Promise.all([includeCategories ? fetchCategories() : null, fetchItems()]);
+        if (includeCategories) renderCategories();
+        renderItems();
+        updateStats();
+    }, 300);
+}
+
+function handleChangeEvent(event) {
+    if (event.type === 'item.updated' || event.type === 'item.created') {
+        const index = items.findIndex(i => i.id === event.data.id);
+        if (index >= 0) {
+            items[index] = { ...items[index], ...event.data };
+            renderItems();
+            updateStats();
+            return;
+        }
+    }
+    if (event.type.startsWith('item.')) {
+        scheduleRefresh(false);
+    } else {
+        // category.*, items.bulk, resync
+        scheduleRefresh(true);
+    }
+}
+
+// fetch() instead of EventSource so the Authorization header can be sent
+async function subscribeToChanges() {
+    const token = localStorage.getItem('access_token');
+    const headers = { 'Authorization': `Bearer ${token}` };
+    if (lastEventId) headers['Last-Event-ID'] = lastEventId;
+
+    try {
+        const response = await fetch(`${API_URL}/events`, { headers });
+        if (response.status === 401) return;
+        const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += value;
+            const messages = buffer.split('\n\n');
+            buffer = messages.pop();
+            for (const message of messages) {
+                const data = message.split('\n').find(line => line.startsWith('data: '));
+                if (!data) continue;
+                const event = JSON.parse(data.slice(6));
+                if (event.id) lastEventId = event.id;
+                handleChangeEvent(event);
+            }
+        }
+    } catch (err) {
+        console.warn("Event stream interrupted:", err);
+    }
+    setTimeout(subscribeToChanges, 3000);
 }
 
 // Start the application